@@ -1,10 +1,16 @@
 import time
 import psutil
 import os
+import sys
 import numpy as np
 import rebound
 import reboundx
 
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../../../tools')))
+import cadence
+
 # initialize constants
 T0 = 12388.5e6          # Sun's age ~ 5 Myr pre-TRGB (sim start)
 M0 = 0.8868357536545315 # initial mass of star
@@ -68,14 +74,18 @@ G = 4*np.pi**2                      # units of AU, yr, and Msun
 for i,t_f in enumerate(t_fs):
     taus[i] = 2.*radii[i]**3/G/masses[i]/t_f
 
+# create Interpolator objects once for all sims
+tsim = rebound.Simulation()
+template = reboundx.Extras(tsim)
+starmass = reboundx.Interpolator(template, mtimes, masses, 'spline')
+starradius = reboundx.Interpolator(template, rtimes, radii, 'spline')
+startau = reboundx.Interpolator(template, ltimes, taus, 'spline')
+
 # main loop
 for i,interval in enumerate(intervals):
-    # initialize sim and create Interpolator objects
+    # initialize sim
     timer_start = time.perf_counter()
     sim, rebx, tides = makesim()
-    starmass = reboundx.Interpolator(rebx, mtimes, masses, 'spline')
-    starradius = reboundx.Interpolator(rebx, rtimes, radii, 'spline')
-    startau = reboundx.Interpolator(rebx, ltimes, taus, 'spline')
 
     # update Sun's mass and radius accordingly
     ps = sim.particles
@@ -88,23 +98,24 @@ for i,interval in enumerate(intervals):
     # initialize main sim
     tmax = 5e6                      # max sim integration time
     Nup = int(tmax/interval)        # no. of param updates
-    ts = np.linspace(0., tmax, Nup)
-    mem_psutil = np.zeros(Nup)      # mem usage tracking
+    Nout = min(Nup, 1000)           # no. of mem usage samples
+    rec = cadence.recorder(cadence.times('uniform', tmax, Nout))
     
     try:
-        for j,t in enumerate(ts):
+        for j,t in cadence.updates(tmax, Nup):
             sim.move_to_com()
             sim.integrate(t)
             ps[0].m = starmass.interpolate(rebx, t=T0+sim.t) # update params
             ps[0].r = starradius.interpolate(rebx, t=T0+sim.t)
             ps[0].params["tctl_tau"] = startau.interpolate(rebx, t=T0+sim.t)          
-            mem_psutil[j] = memory_usage_psutil() # record mem usage (MB)
+            if cadence.due(rec, t):
+                cadence.record(rec, t, mem=memory_usage_psutil()) # (MB)
     except rebound.Collision as error:
         finalas[i] = ps[1].a
     finalas[i] = ps[1].a
 
     # performance
-    max_mems[i] = np.amax(mem_psutil)
+    max_mems[i] = np.amax(cadence.series(rec, 'mem')[1])
     timer_stop = time.perf_counter() 
     runtime = timer_stop - timer_start
     runtimes[i] = runtime
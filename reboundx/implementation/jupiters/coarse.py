@@ -1,17 +1,18 @@
-import subprocess
+import os
+import sys
 import numpy as np
 
-pwd = '/home/barons2/github/sabaronett/cherry-creek/reboundx/implementation/jupiters/'
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(pwd), 'tools'))
+import submit
+
 init_as = np.arange(0.9, 3.2, 0.1) # in au
 
-for a in init_as:
-    rc = ['qsub',
-          '-j', 'oe',
-          '-l', 'select=1:ncpus=1:mem=1gb',
-          '-l', 'walltime=00:16:00',
-          '-m', 'abe',
-          '-M', 'barons2@unlv.nevada.edu',
-          '-N', '{:.2f}au'.format(a),
-          '-q', 'small',
-          '--', pwd+'run.sh', '{:.2f}'.format(a)]
-    subprocess.run(rc)
+# one job array, task i runs run.sh on the i-th grid point
+job = submit.job('coarse', os.path.join(pwd, 'run.sh'),
+                 ['{:.2f}'.format(a) for a in init_as],
+                 walltime='00:16:00', queue='small', scenario='jupiters',
+                 output='output/{}au.txt',
+                 code=[os.path.join(pwd, 'run.sh'),
+                       os.path.join(pwd, 'jupiters.py')])
+submit.cli(job)
@@ -6,6 +6,12 @@ import reboundx
 import sys
 import time
 
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(os.path.dirname(pwd), 'tools')))
+import checkpoint
+import unsafe
+
 # initialize constants
 a0 = float(sys.argv[1])                  # in au
 t0 = 1.2327372316208979E+10              # Sun's age ~50 Myr pre-TRGB
@@ -69,22 +75,32 @@ G = 4*np.pi**2                           # units of AU, yr, and Msun
 for i,t_f in enumerate(t_fs):
     taus[i] = 2.*radii[i]**3/G/masses[i]/t_f
 
+# checkpoint on TERM/USR1/USR2, resume from one if an earlier run left it
+guard = checkpoint.install()
+chk = '{:.2f}au'.format(a0)                # <a0>au.bin, .rebx, .npz
+resumed = checkpoint.load(chk)
+
 # initialize sim and create Interpolator objects
 timer_start = time.perf_counter()
-sim, rebx, tides = makesim(a0)
-sim.ri_whfast.safe_mode = 0  # boost WHFast performance (advanced)
-sim.ri_whfast.corrector = 11 # increase WHFast accuracy (advanced)
+if resumed is None:
+    sim, rebx, tides = makesim(a0)
+    unsafe.enable(sim)           # boost WHFast performance (advanced)
+    sim.ri_whfast.corrector = 11 # increase WHFast accuracy (advanced)
+else:
+    sim, rebx, state = resumed
+    print('resuming from %s at t = %.4e yr' % (chk, sim.t))
 starmass = reboundx.Interpolator(rebx, mtimes, masses, 'spline')
 starradius = reboundx.Interpolator(rebx, rtimes, radii, 'spline')
 startau = reboundx.Interpolator(rebx, ltimes, taus, 'spline')
 
 # update Sun's mass and radius accordingly
 ps = sim.particles
-ps[0].m = starmass.interpolate(rebx, t=t0)
-ps[0].r = starradius.interpolate(rebx, t=t0)
-ps[0].params["tctl_k2"] = 0.038 # ~ lambda_2, Schroder & Smith (2008)
-ps[0].params["tctl_tau"] = startau.interpolate(rebx, t=t0)
-ps[0].params["Omega"] = 0
+if resumed is None:
+    ps[0].m = starmass.interpolate(rebx, t=t0)
+    ps[0].r = starradius.interpolate(rebx, t=t0)
+    ps[0].params["tctl_k2"] = 0.038 # ~ lambda_2, Schroder & Smith (2008)
+    ps[0].params["tctl_tau"] = startau.interpolate(rebx, t=t0)
+    ps[0].params["Omega"] = 0
 
 # initialize main sim
 tmax = 60e6                              # max sim integration time
@@ -93,21 +109,36 @@ ts = np.linspace(0., tmax, Nup)
 # rs = np.zeros(Nup)                       # record Sun's radius
 a = np.zeros(Nup)                        # record semiaxis
 mem_psutil = np.zeros(Nup)               # mem usage tracking
+j0, walltime0 = -1, 0.                   # interrupted update, earlier runs
+if resumed is not None:
+    j0, walltime0 = state['j'], state['walltime']
+    a, mem_psutil = state['a'], state['mem_psutil']
 
 try:
     for j,t in enumerate(ts):
-        mem_psutil[i] = memory_usage_psutil()
-        sim.move_to_com()
-        # rs[j] = ps[0].r                  # record
-        a[j] = ps[1].a                   # record
-        ps[0].m = starmass.interpolate(rebx, t=t0+sim.t)
-        ps[0].r = starradius.interpolate(rebx, t=t0+sim.t)
-        ps[0].params["tctl_tau"] = startau.interpolate(rebx,t=t0+sim.t)
-        sim.ri_whfast.recalculate_coordinates_this_timestep = 1
-        sim.integrator_synchronize()     # corrector
-        sim.integrate(t)                 # til next Nup
+        if j < j0:                       # done before the checkpoint
+            continue
+        if j == j0:                      # finish the interrupted interval
+            if not checkpoint.integrate(guard, sim, t):
+                break
+            continue
+        mem_psutil[j] = memory_usage_psutil()
+        with unsafe.session(sim):        # synchronized, then recalculated
+            sim.move_to_com()
+            # rs[j] = ps[0].r              # record
+            a[j] = ps[1].a               # record
+            ps[0].m = starmass.interpolate(rebx, t=t0+sim.t)
+            ps[0].r = starradius.interpolate(rebx, t=t0+sim.t)
+            ps[0].params["tctl_tau"] = startau.interpolate(rebx,t=t0+sim.t)
+        if not checkpoint.integrate(guard, sim, t): # til next Nup
+            break
 except rebound.Collision as error:
     print(error)
+if guard['signum'] is not None:          # stopped by the batch system
+    checkpoint.save(chk, sim, rebx, j=j, a=a, mem_psutil=mem_psutil,
+                    walltime=walltime0 + time.perf_counter() - timer_start)
+    checkpoint.stop(guard)
+checkpoint.clear(chk)
 
 # write semiaxis vs sim.t
 makesubdir('output')  # create file output directory
@@ -116,7 +147,7 @@ writetxt(ts, a, path='output/{:.2f}au.txt'.format(a0))
 # performance metrics
 max_mem = np.amax(mem_psutil)
 timer_stop = time.perf_counter() 
-runtime = timer_stop - timer_start
+runtime = walltime0 + timer_stop - timer_start
 hh = runtime // 3600
 remainder = runtime - hh*3600
 mm = remainder // 60
@@ -1,4 +1,4 @@
 #!/usr/bin/bash
 
 cd $PBS_O_WORKDIR
-/home/barons2/.conda/envs/rebx-3.4.1/bin/python jupiters.py $1
+exec /home/barons2/.conda/envs/rebx-3.4.1/bin/python jupiters.py $1 # signals reach the driver
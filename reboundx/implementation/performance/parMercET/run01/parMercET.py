@@ -1,10 +1,16 @@
 import time
 import psutil
 import os
+import sys
 import numpy as np
 import rebound
 import reboundx
 
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../../tools')))
+import unsafe
+
 # initialize constants
 T0 = 12388.5e6          # Sun's age ~ 5 Myr pre-TRGB (sim start)
 M0 = 0.8868357536545315 # initial mass of star
@@ -28,6 +34,7 @@ def makesim():
     sim.add(m=3.e-6, a=1., hash=names[3])
     sim.add(m=0.323e-6, a=1.524, hash=names[4])
     sim.integrator = 'whfast'
+    unsafe.enable(sim) # boost WHFast performance (advanced)
     sim.dt = 0.1*sim.particles[1].P
     sim.move_to_com()
     rebx = reboundx.Extras(sim)
@@ -97,31 +104,32 @@ for k in range(Nloops):
 
     for i, t in enumerate(ts):
         sim.integrate(t)
-        d = ps[0] - ps[cp]             # componentwise difference to nearest planet
-        r = np.sqrt(d.x**2 + d.y**2 + d.z**2)
+        with unsafe.session(sim): # synchronized, then recalculated
+            d = ps[0] - ps[cp]             # componentwise difference to nearest planet
+            r = np.sqrt(d.x**2 + d.y**2 + d.z**2)
         
-        if r <= ps[0].r:               # nearest planet engulfed
-            emass += ps[cp].m          # add engulfed planet mass
-            ps[cp].m = 0               # zero planet mass and move to COM
-            ps[cp].x, ps[cp].y, ps[cp].z = 0, 0, 0
-            cp += 1                    # next closest surviving planet
-            sim.dt = 0.1*ps[cp].P      # adjust timestep accordingly
+            if r <= ps[0].r:               # nearest planet engulfed
+                emass += ps[cp].m          # add engulfed planet mass
+                ps[cp].m = 0               # zero planet mass and move to COM
+                ps[cp].x, ps[cp].y, ps[cp].z = 0, 0, 0
+                cp += 1                    # next closest surviving planet
+                sim.dt = 0.1*ps[cp].P      # adjust timestep accordingly
         
-        # evolve Sun, update tidal parameter, and recenter to COM
-        ps[0].m = starmass.interpolate(rebx, t=T0+sim.t) + emass
-        ps[0].r = starradius.interpolate(rebx, t=T0+sim.t)
-        ps[0].params["tctl_tau"] = startau.interpolate(rebx, t=T0+sim.t)
-        sim.move_to_com()
+            # evolve Sun, update tidal parameter, and recenter to COM
+            ps[0].m = starmass.interpolate(rebx, t=T0+sim.t) + emass
+            ps[0].r = starradius.interpolate(rebx, t=T0+sim.t)
+            ps[0].params["tctl_tau"] = startau.interpolate(rebx, t=T0+sim.t)
+            sim.move_to_com()
         
-        # record values for post-sim plots
-        mass[i] = sim.particles[0].m
-        radius[i] = sim.particles[0].r
-        for j in range(1, sim.N):
-            a[i, j] = ps[j].a
+            # record values for post-sim plots
+            mass[i] = sim.particles[0].m
+            radius[i] = sim.particles[0].r
+            for j in range(1, sim.N):
+                a[i, j] = ps[j].a
         
-        # record current memory usage (MB)
-        proc_time[i] = time.perf_counter() - timer_start
-        mem_psutil[i] = memory_usage_psutil()
+            # record current memory usage (MB)
+            proc_time[i] = time.perf_counter() - timer_start
+            mem_psutil[i] = memory_usage_psutil()
         
     writetxt(ts, mass, 'output/m.txt')
     writetxt(ts, radius, 'output/r.txt')
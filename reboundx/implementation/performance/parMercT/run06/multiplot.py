@@ -1,6 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+import os
+import sys
+
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../../tools')))
+import decimate
 
 # load REBOUND data
 data = np.loadtxt('output/m.txt') # return (N, 2) array
@@ -26,7 +33,7 @@ fig.subplots_adjust(hspace=0)
 
 ax1.set_ylabel("$M(t)$ / $M_{\odot}$", fontsize='large')
 ax1.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-ax1.plot(ts,mass, color='tab:orange')
+decimate.plot(ax1, ts,mass, color='tab:orange')
 ax1.grid()
 
 ax2.set_xlabel('Time / yr', fontsize='large')
@@ -34,10 +41,10 @@ ax2.ticklabel_format(axis='x', style='sci', scilimits=(0,0))
 ax2.xaxis.set_minor_locator(mticker.AutoMinorLocator())
 ax2.set_ylabel('Distance / AU', fontsize='large')
 ax2.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-ax2.plot(ts,radius, color='tab:orange', label='$R_{\odot}(t)$')
+decimate.plot(ax2, ts,radius, color='tab:orange', label='$R_{\odot}(t)$')
 for i in range(1, p):
     label = '$a_{%s}(t)$'%(symbols[i])
-    ax2.plot(ts,atides[:, i], '--', label=label)
+    decimate.plot(ax2, ts,atides[:, i], '--', label=label)
 ax2.legend(fontsize='large', loc='best')
 ax2.grid()
 
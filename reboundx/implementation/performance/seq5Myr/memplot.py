@@ -1,6 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.ticker import AutoMinorLocator
+import os
+import sys
+
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../tools')))
+import decimate
 
 # load memory output data
 data = np.loadtxt('output/mem.txt') # return (N, 2) array
@@ -12,7 +19,7 @@ ax1.set_xlabel('Process Time / s', fontsize='large')
 ax1.xaxis.set_minor_locator(AutoMinorLocator())
 ax1.set_ylabel('Memory Usage / MB', fontsize='large')
 ax1.yaxis.set_minor_locator(AutoMinorLocator())
-ax1.plot(step, mem)
+decimate.plot(ax1, step, mem)
 ax1.grid()
 plt.show()
 # plt.savefig('plot/mem.png')
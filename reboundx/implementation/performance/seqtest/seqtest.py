@@ -1,10 +1,16 @@
 import time
 import psutil
 import os
+import sys
 import numpy as np
 import rebound
 import reboundx
 
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../tools')))
+import unsafe
+
 # initialize constants
 M0 = 0.8646552426064663 # initial mass of star
 timer_start = time.perf_counter()
@@ -28,6 +34,7 @@ def makesim():
     sim.add(m=3.e-6, a=1., hash='Earth')
     sim.collision = 'direct' # check if RGB Sun engulfs planet
     sim.integrator = 'whfast'
+    unsafe.enable(sim) # boost WHFast performance (advanced)
     sim.dt = 0.1*sim.particles[1].P
     sim.move_to_com()
     rebx = reboundx.Extras(sim)
@@ -122,21 +129,23 @@ for j in range(Nloops):
         try:
             sim.integrate(t)
         except:
-            engulf(sim)
-        ps[0].m = starmass.interpolate(rebx, t=T0+sim.t)
-        ps[0].r = starradius.interpolate(rebx, t=T0+sim.t)
-        sim.move_to_com() # lost mass had momentum, thus recenter to COM frame
-        # record for post-sim plots
-        mass[i] = sim.particles[0].m
-        radius[i] = sim.particles[0].r
-        a[i] = sim.particles[1].a
-        # update tidal parameter
-        d = ps[0] - ps[1] # componentwise difference between particles
-        r = np.sqrt(d.x**2 + d.y**2 + d.z**2)
-        ps[0].params["tctl_tau"] = starptau.interpolate(rebx, t=T0+sim.t)*r # Eq. 2
-        # record current memory usage (MB)
-        proc_time[i] = time.perf_counter() - timer_start
-        mem_psutil[i] = memory_usage_psutil()
+            with unsafe.session(sim):
+                engulf(sim)
+        with unsafe.session(sim): # synchronized, then recalculated
+            ps[0].m = starmass.interpolate(rebx, t=T0+sim.t)
+            ps[0].r = starradius.interpolate(rebx, t=T0+sim.t)
+            sim.move_to_com() # lost mass had momentum, thus recenter to COM frame
+            # record for post-sim plots
+            mass[i] = sim.particles[0].m
+            radius[i] = sim.particles[0].r
+            a[i] = sim.particles[1].a
+            # update tidal parameter
+            d = ps[0] - ps[1] # componentwise difference between particles
+            r = np.sqrt(d.x**2 + d.y**2 + d.z**2)
+            ps[0].params["tctl_tau"] = starptau.interpolate(rebx, t=T0+sim.t)*r # Eq. 2
+            # record current memory usage (MB)
+            proc_time[i] = time.perf_counter() - timer_start
+            mem_psutil[i] = memory_usage_psutil()
         
     writetxt(ts, mass, 'output/m.txt')
     writetxt(ts, radius, 'output/r.txt')
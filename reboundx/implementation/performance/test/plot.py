@@ -1,6 +1,13 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+import os
+import sys
+
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../tools')))
+import decimate
 
 # load REBOUND data
 data = np.loadtxt('output/m.txt') # return (N, 2) array
@@ -21,7 +28,7 @@ fig.subplots_adjust(hspace=0)
 
 ax1.set_ylabel("$M(t)$ / $M_{\odot}$", fontsize='large')
 ax1.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-ax1.plot(ts,mass, color='tab:orange')
+decimate.plot(ax1, ts,mass, color='tab:orange')
 ax1.text(0.05, 0.1, '(a)', transform=ax1.transAxes, fontsize='xx-large',
         verticalalignment='top')
 ax1.grid()
@@ -30,9 +37,9 @@ ax2.set_xlabel('Time / yr', fontsize='large')
 ax2.ticklabel_format(axis='x', style='sci', scilimits=(0,0))
 ax2.set_ylabel('Distance / AU', fontsize='large')
 ax2.yaxis.set_minor_locator(mticker.AutoMinorLocator())
-ax2.plot(ts,radius, color='tab:orange', label='$R_{\odot}(t)$')
-ax2.plot(ts,a, '--', label='$a(t)$')
-ax2.plot(ts,radius, label='$R(t)$')
+decimate.plot(ax2, ts,radius, color='tab:orange', label='$R_{\odot}(t)$')
+decimate.plot(ax2, ts,a, '--', label='$a(t)$')
+decimate.plot(ax2, ts,radius, label='$R(t)$')
 ax2.legend(fontsize='large', loc='upper left')
 ax2.text(0.05, 0.1, '(b)', transform=ax2.transAxes, fontsize='xx-large',
         verticalalignment='top')
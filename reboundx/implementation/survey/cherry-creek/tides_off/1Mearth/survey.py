@@ -1,16 +1,23 @@
+import multiprocessing
 import time
 import psutil
 import os
+import sys
 import numpy as np
 import rebound
 import reboundx
 
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(pwd, '../../../../tools')))
+import cadence
+
 # initialize constants
 T0 = 12388.5e6                      # Sun's age ~ 5 Myr pre-TRGB (sim start)
 M0 = 0.8868357536545315             # initial mass of star
 init_as = np.arange(0.4, 1.51, 0.1) # in AU
-max_mems = np.zeros(init_as.size)
-runtimes = np.zeros(init_as.size)
+# no. of worker processes, one sim each (default: $NCPUS set by PBS)
+Nprocs = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.environ.get('NCPUS', 1))
 
 def memory_usage_psutil():
     process = psutil.Process(os.getpid())
@@ -67,14 +74,25 @@ G = 4*np.pi**2                      # units of AU, yr, and Msun
 for i,t_f in enumerate(t_fs):
     taus[i] = 2.*radii[i]**3/G/masses[i]/t_f
 
-# main loop
-for i,init_a in enumerate(init_as):
-    # initialize sim and create Interpolator objects
+# create Interpolator objects once for all sims
+tsim = rebound.Simulation()
+template = reboundx.Extras(tsim)
+starmass = reboundx.Interpolator(template, mtimes, masses, 'spline')
+starradius = reboundx.Interpolator(template, rtimes, radii, 'spline')
+startau = reboundx.Interpolator(template, ltimes, taus, 'spline')
+
+def simulate(init_a):
+    """
+    Integrate one survey planet and write its semiaxis vs sim.t.
+
+    Returns
+    -------
+    tuple of float
+        Peak memory usage (MB) and wall time (s) of the run.
+    """
+    # initialize sim
     timer_start = time.perf_counter()
     sim, rebx = makesim(init_a)
-    starmass = reboundx.Interpolator(rebx, mtimes, masses, 'spline')
-    starradius = reboundx.Interpolator(rebx, rtimes, radii, 'spline')
-    startau = reboundx.Interpolator(rebx, ltimes, taus, 'spline')
 
     # update Sun's mass and radius accordingly
     ps = sim.particles
@@ -87,41 +105,54 @@ for i,init_a in enumerate(init_as):
     # initialize main sim
     tmax = 5e6                      # max sim integration time
     Nup = int(tmax/1e2)             # 10²-yr param update interval
-    ts = np.linspace(0., tmax, Nup)
-    a = np.zeros(Nup)               # record semiaxis vs sim.t
-    mem_psutil = np.zeros(Nup)      # mem usage tracking
+    Nout = 5000                     # 10³-yr output interval
+    outs = cadence.times('uniform', tmax, Nout)
+    rec = cadence.recorder(outs, near=0.8, # + every update once R > 0.8a
+                           size=10000)     # min/max/mean buckets
     
     try:
-        for j,t in enumerate(ts):
+        for j,t in cadence.updates(tmax, Nup):
             sim.move_to_com()
             sim.integrate(t)
             ps[0].m = starmass.interpolate(rebx, t=T0+sim.t) # update params
             ps[0].r = starradius.interpolate(rebx, t=T0+sim.t)
             # ps[0].params["tctl_tau"] = startau.interpolate(rebx, t=T0+sim.t)     
-            a[j] = ps[1].a                        # record semiaxis
-            mem_psutil[j] = memory_usage_psutil() # record mem usage (MB)
+            if cadence.due(rec, t, ps[0].r, ps[1].a):
+                cadence.record(rec, t, a=ps[1].a, # record semiaxis
+                               mem=memory_usage_psutil()) # mem usage (MB)
     except rebound.Collision as error:
         print(error)
+        cadence.record(rec, sim.t, split=True, a=0.,
+                       mem=memory_usage_psutil())
 
     # write semiaxis vs sim.t
     fname = 'output/{:.1f}au.txt'.format(init_a)
-    writetxt(ts, a, path=fname)
+    cadence.write(rec, 'a', fname)  # t, mean, min, max
     # performance
-    max_mems[i] = np.amax(mem_psutil)
+    max_mem = np.amax(cadence.series(rec, 'mem', 'max')[1])
     timer_stop = time.perf_counter() 
     runtime = timer_stop - timer_start
-    runtimes[i] = runtime
     # cout
     h = runtime // 3600
     remainder = runtime - h*3600
     m = remainder // 60
     s = remainder - m*60
     if h != 0:
-        print('Wall time: %dh %dmin %ds'%(h, m, s))
+        print('%.1f au wall time: %dh %dmin %ds'%(init_a, h, m, s))
     elif m != 0:
-        print('Wall time: %dmin %ds'%(m, s))
+        print('%.1f au wall time: %dmin %ds'%(init_a, m, s))
+    else:
+        print('%.1f au wall time: %ds'%(init_a, s))
+    return max_mem, runtime
+
+# main loop
+if __name__ == '__main__':
+    if Nprocs > 1:
+        with multiprocessing.Pool(Nprocs) as pool:
+            results = pool.map(simulate, init_as, chunksize=1)
     else:
-        print('Wall time: %ds'%(s))
-# perf diag output
-writetxt(init_as, max_mems, 'output/maxmems.txt')
-writetxt(init_as, runtimes, 'output/runtimes.txt')
+        results = [simulate(init_a) for init_a in init_as]
+    max_mems, runtimes = np.array(results).T
+    # perf diag output
+    writetxt(init_as, max_mems, 'output/maxmems.txt')
+    writetxt(init_as, runtimes, 'output/runtimes.txt')
@@ -1,17 +1,15 @@
-import subprocess
+import os
+import sys
 import numpy as np
 
-pwd = '/home/barons2/github/sabaronett/cherry-creek/reboundx/implementation/test/'
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(pwd), 'tools'))
+import submit
+
 aus = np.arange(1, 1.2, 0.1) # in AU
 
-for au in aus:
-    rc = ['qsub',
-            '-j', 'oe',
-            '-l', 'select=1:ncpus=1:mem=1gb',
-            '-l', 'walltime=0:01:00',
-            '-m', 'abe',
-            '-M', 'barons2@unlv.nevada.edu',
-            '-N', 'test_{:.1f}au'.format(au),
-            '-q', 'small',
-            '--', pwd+'test.sh', '{:.1f}'.format(au)]
-    subprocess.run(rc)
+# one job array, task i runs test.sh on the i-th grid point
+job = submit.job('test', os.path.join(pwd, 'test.sh'),
+                 ['{:.1f}'.format(a) for a in aus],
+                 walltime='0:01:00', queue='small')
+submit.cli(job)
@@ -0,0 +1,265 @@
+"""
+Energy and angular momentum error monitoring for the REBOUNDx drivers.
+
+Mass loss, engulfment and move_to_com change the energy E and angular
+momentum L at every parameter update, and tides_constant_time_lag dissipates
+both continuously. The monitor measures the jump across each update and
+integrates the dissipative tidal power and torque of the star's tide between
+updates (trapezoid rule over --substeps samples within each update
+interval, as the power changes along the orbit), so that what remains,
+
+    dE = (E - E0 - jumps - tidal work) / |E0|,
+
+is the integration error. Use it via integrate() and sample() in place of
+sim.integrate() at every update, or from the command line:
+
+usage: python tools/accuracy.py scenario [--tmax T] [--every N] [--a0 AU]
+                                [--integrator NAME] [--dt DT] [--dtP F]
+                                [--corrector N] [--safe-mode 0|1]
+                                [--substeps N]
+"""
+import argparse
+import time
+import numpy as np
+import rebound
+import scenarios as scn
+
+SUBSTEPS = 10                           # tidal samples per update interval
+
+def param(p, names, default=0.):
+    """
+    Return the first REBOUNDx parameter in names that is set on particle p.
+    """
+    for name in names:
+        try:
+            value = p.params[name]
+        except (AttributeError, KeyError):
+            continue
+        if value is not None:
+            return value
+    return default
+
+def tides(sim):
+    """
+    Conservative potential, dissipative power and torque of the star's tide.
+
+    Mirrors tides_constant_time_lag for tides raised on particles[0] by each
+    massive planet, with the star's spin Omega = 0 as in all drivers.
+
+    Returns
+    -------
+    tuple
+        Tidal potential energy, power (rate of work of the dissipative
+        force) and torque (numpy.ndarray) in sim units.
+    """
+    ps = sim.particles
+    star = ps[0]
+    k2 = param(star, ['tctl_k2', 'tctl_k1'])
+    tau = param(star, ['tctl_tau'])
+    U, power, torque = 0., 0., np.zeros(3)
+    if k2 == 0. or star.r == 0. or star.m == 0.:
+        return U, power, torque
+    for p in ps[1:sim.N]:
+        if p.m == 0.:
+            continue
+        dr = np.array([star.x - p.x, star.y - p.y, star.z - p.z])
+        dv = np.array([star.vx - p.vx, star.vy - p.vy, star.vz - p.vz])
+        dr2 = dr @ dr
+        fac = p.m**2*k2*star.r**5       # (ms/mt) k2 Rt^5 times ms mt
+        U += -0.5*sim.G*fac/dr2**3
+        if tau == 0.:
+            continue
+        prefac = -3*sim.G*fac/dr2**4
+        h = np.cross(dr, dv)
+        thetadotcrossr = np.cross(h, dr)/dr2
+        force = prefac*3.*tau/dr2*(dr @ dv)*dr + prefac*tau*thetadotcrossr
+        power += force @ dv
+        torque += np.cross(dr, force)
+    return U, power, torque
+
+def energy(sim):
+    """
+    Total energy including the conservative tidal potential.
+    """
+    return sim.energy() + tides(sim)[0]
+
+def angmom(sim):
+    return np.array(sim.angular_momentum())
+
+def start(sim):
+    """
+    Start monitoring at the current sim time; call after the sim setup.
+
+    Returns
+    -------
+    dict
+        Monitor state for sample() and summary().
+    """
+    U, power, torque = tides(sim)
+    E, L = sim.energy() + U, angmom(sim)
+    return {'E0': E, 'L0': L, 'jumpE': 0., 'jumpL': np.zeros(3),
+            'work': 0., 'dL': np.zeros(3), 'power': power, 'torque': torque,
+            't': sim.t, 'ts': [], 'dEs': [], 'dLs': [], 'k': 0}
+
+def accrue(mon, sim):
+    """
+    Add the tidal work and torque since the last sample (trapezoid rule)
+    and return the tidal potential at the current sim time.
+    """
+    sim.integrator_synchronize()        # WHFast and MERCURIUS lag behind
+    U, power, torque = tides(sim)
+    dt = sim.t - mon['t']
+    mon['work'] += (mon['power'] + power)/2*dt
+    mon['dL'] += (mon['torque'] + torque)/2*dt
+    mon['power'], mon['torque'], mon['t'] = power, torque, sim.t
+    return U
+
+def integrate(mon, sim, t, substeps=1):
+    """
+    sim.integrate(t), sampling the tidal power and torque substeps - 1
+    times on the way for the work and torque integrals of sample().
+
+    The intermediate samples are taken wherever the step crossing each
+    substep time ends (exact_finish_time = 0), so only the update times
+    change the timestep, as in the drivers.
+
+    Returns
+    -------
+    float
+        Wall time (s) spent on the samples, the monitor's own cost.
+    """
+    t0, cost = sim.t, 0.
+    for k in range(1, substeps):
+        tk = t0 + (t - t0)*k/substeps
+        if tk + 2*abs(sim.dt) >= t:     # would reach t before the update
+            break
+        sim.integrate(tk, exact_finish_time=0)
+        start = time.perf_counter()
+        accrue(mon, sim)
+        cost += time.perf_counter() - start
+    sim.integrate(t)
+    return cost
+
+def sample(mon, sim, update=None, every=1):
+    """
+    Account for the interval since the last call, then apply an update.
+
+    Parameters
+    ----------
+    mon : dict
+        Monitor state from start().
+    sim : rebound.Simulation
+        Simulation just integrated up to the next update time.
+    update : callable
+        Parameter update (stellar evolution, engulfment, move_to_com);
+        its effect on E and L is booked as a jump.
+    every : int
+        Record the errors on every n-th call only; the bookkeeping itself
+        must run on every update.
+    """
+    U = accrue(mon, sim)
+    E, L = sim.energy() + U, angmom(sim)
+    if mon['k'] % every == 0:
+        mon['ts'].append(sim.t)
+        mon['dEs'].append((E - mon['E0'] - mon['jumpE'] - mon['work'])
+                          / abs(mon['E0']))
+        mon['dLs'].append(np.linalg.norm(L - mon['L0'] - mon['jumpL']
+                                         - mon['dL'])
+                          / np.linalg.norm(mon['L0']))
+    mon['k'] += 1
+    if update is not None:
+        update()
+        U, mon['power'], mon['torque'] = tides(sim)
+        mon['jumpE'] += sim.energy() + U - E
+        mon['jumpL'] += angmom(sim) - L
+
+def summary(mon):
+    """
+    Return the maximum absolute relative energy and angular momentum errors.
+    """
+    if not mon['ts']:
+        return 0., 0.
+    return np.max(np.abs(mon['dEs'])), np.max(mon['dLs'])
+
+def monitored(spec, track=None, every=1, substeps=SUBSTEPS):
+    """
+    Run a scenario to tmax with monitoring.
+
+    Returns
+    -------
+    tuple
+        (wall time / s, monitor state, collision message or None)
+    """
+    timer_start = time.perf_counter()
+    run = scn.makesim(spec, track)
+    mon = start(run['sim'])
+    ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    error = None
+    try:
+        for t in ts[1:]:
+            integrate(mon, run['sim'], t, substeps)
+            sample(mon, run['sim'], lambda: scn.update(run), every)
+    except rebound.Collision as err:
+        error = str(err)
+    return time.perf_counter() - timer_start, mon, error
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Report energy and angular '
+                                     'momentum errors with the runtime.')
+    parser.add_argument('name', metavar='scenario',
+                        help='one of: %s' % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--tmax', type=float, default=None,
+                        help='integrate only to this sim time (yr)')
+    parser.add_argument('--every', type=int, default=1,
+                        help='record the errors every N updates')
+    parser.add_argument('--a0', type=float, default=None)
+    parser.add_argument('--integrator', default=None)
+    parser.add_argument('--dt', type=float, default=None,
+                        help='fixed timestep (yr)')
+    parser.add_argument('--dtP', type=float, default=None,
+                        help='timestep as a fraction of the inner period')
+    parser.add_argument('--corrector', type=int, default=None)
+    parser.add_argument('--safe-mode', type=int, default=None)
+    parser.add_argument('--substeps', type=int, default=SUBSTEPS,
+                        help='tidal power samples per update interval')
+    parser.add_argument('--out', default=None,
+                        help='write t vs dE and dL to OUT_dE.txt, OUT_dL.txt')
+    args = parser.parse_args()
+
+    spec = scn.getspec(args.name, a0=args.a0)
+    if args.tmax is not None:           # keep the update interval
+        spec['Nup'] = max(int(spec['Nup']*args.tmax/spec['tmax']), 2)
+        spec['tmax'] = args.tmax
+    if args.integrator is not None:
+        spec['integrator'] = args.integrator
+    if args.dt is not None:
+        spec['dt'], spec['dtP'] = args.dt, None
+    if args.dtP is not None:
+        spec['dt'], spec['dtP'] = None, args.dtP
+    if args.corrector is not None:
+        spec['whfast']['corrector'] = args.corrector
+    if args.safe_mode is not None:
+        spec['whfast']['safe_mode'] = args.safe_mode
+
+    runtime, mon, error = monitored(spec, scn.gettrack(spec), args.every,
+                                    args.substeps)
+    maxdE, maxdL = summary(mon)
+    if error is not None:
+        print(error)
+    if args.out is not None:
+        ts = np.array(mon['ts'])
+        np.savetxt(args.out + '_dE.txt', np.c_[ts, mon['dEs']], fmt='%.16E',
+                   delimiter='\t')
+        np.savetxt(args.out + '_dL.txt', np.c_[ts, mon['dLs']], fmt='%.16E',
+                   delimiter='\t')
+    print('________________________________')
+    print('Accuracy vs cost: %s\n' % args.name)
+    print('    Integrator       : %s' % spec['integrator'])
+    print('    Sim time reached : %.4e yr' % (mon['t']))
+    print('    Max |dE/E0|      : %.3e' % maxdE)
+    print('    Max |dL/L0|      : %.3e' % maxdL)
+    print('    Tidal work       : %.3e' % (mon['work']/abs(mon['E0'])))
+    print('    Mass-loss jumps  : %.3e' % (mon['jumpE']/abs(mon['E0'])))
+    print('    Walltime Used    : %.2f s' % runtime)
+    print('________________________________')
@@ -0,0 +1,28 @@
+#!/usr/bin/bash
+# Array task wrapper: run SCRIPT on line i of GRID, with i the array index.
+# A WRAPPER (tools/stage.py) runs SCRIPT from node-local scratch. A task
+# that checkpointed (exit status 85, tools/checkpoint.py) is requeued; a
+# point of a bundle (ARRAY_INDEX set) leaves that to submit.py work.
+# usage: arraytask.sh GRID WORKDIR [WRAPPER] SCRIPT
+
+grid=$1
+workdir=$2
+shift 2
+i=${ARRAY_INDEX:-${PBS_ARRAY_INDEX:-$SLURM_ARRAY_TASK_ID}} # local first (bundles)
+arg=`sed -n "${i}p" $grid`
+export PBS_O_WORKDIR=$workdir           # run scripts cd here (Slurm, local)
+export REBX_TOOLS=${REBX_TOOLS:-$(dirname $(readlink -f $0))} # when staged
+cd $workdir
+echo Array task $i: $@ $arg
+trap : TERM USR1 USR2                   # outlive the script's checkpoint
+"$@" $arg
+code=$?
+if [ $code -eq 85 ] && [ -z "$ARRAY_INDEX" ]; then # bundle points: whole bundle
+    echo Array task $i checkpointed, requeueing
+    if [ -n "$SLURM_JOB_ID" ]; then
+        scontrol requeue ${SLURM_ARRAY_JOB_ID}_${SLURM_ARRAY_TASK_ID}
+    elif [ -n "$PBS_JOBID" ]; then
+        qrerun $PBS_JOBID
+    fi
+fi
+exit $code
@@ -0,0 +1,226 @@
+"""
+Batched single-planet survey: the whole a0 grid in one simulation.
+
+The survey planets don't interact across runs, so they can share one sim
+as non-interacting bodies: the star is the only active particle
+(N_active = 1, testparticle_type = 0), so the planets feel the star only.
+They keep their masses, which tides_constant_time_lag needs for the tide
+each raises on the star. A planet touching the star is removed on its own
+(custom collision_resolve) and the rest continue. The star's
+interpolation and the per-step overhead are paid once for the whole grid.
+
+Two approximations, both of order q = m/M: the star does not respond to
+the planets' gravity, and each planet's osculating a is measured against
+the star alone. Check them with --validate, which also runs each a0 as its
+own star-plus-planet sim.
+
+IAS15 steps every planet of a sim at the timestep of the innermost one, so
+a sim spanning a wide range of periods costs more steps than running the
+planets apart. The grid is therefore split into bands whose outer and inner
+initial periods differ by at most --band (default 1.5), and each band is
+one sim; --band inf puts the whole grid into one.
+
+usage: python tools/batch.py [scenario] [--grid START STOP STEP]
+                             [--band RATIO] [--tmax T] [--outdir DIR]
+                             [--validate]
+"""
+import argparse
+import copy
+import os
+import time
+import numpy as np
+import rebound
+import scenarios as scn
+
+def writetxt(times, values, path='data.txt'):
+    with open(path, 'w') as f: # will overwrite existing file
+        for i in range(times.size):
+            f.write('%.16E\t%.16E\n' % (times[i], values[i]))
+
+def label(a0):
+    return '{:.2f}au'.format(a0)
+
+def bands(a0s, ratio=1.5):
+    """
+    Split sorted a0s into consecutive bands whose initial period ratio
+    (a_outer/a_inner)**1.5 is at most ratio.
+    """
+    out = []
+    for a0 in a0s:
+        if out and (a0/out[-1][0])**1.5 <= ratio:
+            out[-1].append(a0)
+        else:
+            out.append([a0])
+    return [np.array(band) for band in out]
+
+def makebatch(spec, a0s, track=None):
+    """
+    Set up one sim holding the star and a test planet per a0.
+
+    Returns
+    -------
+    dict
+        Run state as from scenarios.makesim, plus 'removed': a list of
+        (sim time, hash) of the planets removed on contact with the star.
+
+    Raises
+    ------
+    ValueError
+        For scenarios whose star depends on a single planet (several
+        bodies, performance-style engulfment or tau scaled by a).
+    """
+    if len(spec['bodies']) != 1 or spec['engulf'] or spec['taur']:
+        raise ValueError('%s: only single-planet scenarios without engulf '
+                         'or taur can be batched' % spec['name'])
+    run = scn.makesim(dict(spec, bodies=[]), track)
+    sim = run['sim']
+    body = spec['bodies'][0]
+    for a0 in a0s:
+        kwargs = dict(body, a=a0, hash=label(a0))
+        sim.add(primary=sim.particles[0], **kwargs)
+    sim.N_active = 1
+    sim.testparticle_type = 0           # planets feel the star only
+    sim.testparticle_hidewarnings = 1   # their masses are kept on purpose
+    run['removed'] = []
+
+    def resolve(sim_pointer, collision):
+        ps = sim_pointer.contents.particles
+        if collision.p1 != 0 and collision.p2 != 0:
+            return 0                    # planet-planet: not in the survey
+        i = collision.p2 if collision.p1 == 0 else collision.p1
+        run['removed'].append((sim_pointer.contents.t, ps[i].hash.value))
+        return 2 if collision.p1 == 0 else 1 # remove the planet only
+    run['resolve'] = resolve            # keep a reference for the C callback
+    if spec['collision'] is not None:
+        sim.collision = spec['collision']
+        sim.collision_resolve = resolve
+    return run
+
+def semiaxes(sim):
+    """
+    Osculating semimajor axes of all planets against the star alone
+    (vectorized): the planets feel only the star, so mu = G M_star.
+    """
+    N = sim.N
+    xyz = np.zeros((N, 3))
+    vxvyvz = np.zeros((N, 3))
+    hashes = np.zeros(N, dtype='uint32')
+    sim.serialize_particle_data(xyz=xyz, vxvyvz=vxvyvz, hash=hashes)
+    dr = xyz[1:] - xyz[0]
+    dv = vxvyvz[1:] - vxvyvz[0]
+    mu = sim.G*sim.particles[0].m
+    a = 1./(2./np.linalg.norm(dr, axis=1) - np.sum(dv**2, axis=1)/mu)
+    return hashes[1:], a
+
+def batched(spec, a0s, track=None):
+    """
+    Run the survey grid in one sim, mirroring survey.py's update loop.
+
+    Returns
+    -------
+    tuple
+        Update times, semiaxes (one row per a0, 0 after removal like the
+        drivers' output) and the run state.
+    """
+    run = makebatch(spec, a0s, track)
+    sim = run['sim']
+    ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    a = np.zeros((len(a0s), ts.size))
+    row = {rebound.hash(label(a0)).value: i for i, a0 in enumerate(a0s)}
+    for j, t in enumerate(ts):
+        sim.integrate(t)
+        scn.update(run)
+        if sim.N == 1:                  # all planets removed
+            break
+        hashes, aj = semiaxes(sim)
+        a[[row[h] for h in hashes], j] = aj
+    return ts, a, run
+
+def individual(spec, a0, track=None):
+    """
+    Reference: one star-plus-planet sim, as in survey.py.
+    """
+    spec = copy.deepcopy(spec)          # keeps mass, tides, tmax, Nup
+    spec['bodies'][0]['a'] = a0
+    run = scn.makesim(spec, track)
+    sim, ps = run['sim'], run['sim'].particles
+    ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    a = np.zeros(ts.size)
+    try:
+        for j, t in enumerate(ts):
+            sim.integrate(t)
+            scn.update(run)
+            a[j] = ps[1].a
+    except rebound.Collision:
+        pass
+    return a
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a single-planet '
+                                     'survey grid in one simulation.')
+    parser.add_argument('name', nargs='?', default='survey',
+                        metavar='scenario',
+                        help='single-planet scenario (default: survey)')
+    parser.add_argument('--grid', type=float, nargs=3,
+                        default=[0.4, 1.51, 0.1],
+                        metavar=('START', 'STOP', 'STEP'),
+                        help='np.arange grid of a0 in AU')
+    parser.add_argument('--band', type=float, default=1.5,
+                        help='max period ratio within one sim (inf: one sim)')
+    parser.add_argument('--mass', type=float, default=None,
+                        help='planet mass (Msun)')
+    parser.add_argument('--no-tides', action='store_true')
+    parser.add_argument('--tmax', type=float, default=None,
+                        help='integrate only to this sim time (yr)')
+    parser.add_argument('--outdir', default=None,
+                        help='write <a0>au.txt semiaxis files like the drivers')
+    parser.add_argument('--validate', action='store_true',
+                        help='also run each a0 separately and compare')
+    args = parser.parse_args()
+
+    spec = scn.getspec(args.name)
+    if args.mass is not None:
+        spec['bodies'][0]['m'] = args.mass
+    if args.no_tides:
+        spec['tides'] = False
+    if args.tmax is not None:           # keep the update interval
+        spec['Nup'] = max(int(spec['Nup']*args.tmax/spec['tmax']), 2)
+        spec['tmax'] = args.tmax
+    track = scn.gettrack(spec)
+    a0s = np.arange(*args.grid)
+
+    timer_start = time.perf_counter()
+    a, removed, steps = [], [], 0
+    for band in bands(a0s, args.band):
+        ts, aband, run = batched(spec, band, track)
+        a.extend(aband)
+        removed.extend(run['removed'])
+        steps += run['sim'].steps_done
+    runtime = time.perf_counter() - timer_start
+    if args.outdir is not None:
+        os.makedirs(args.outdir, exist_ok=True)
+        for a0, ai in zip(a0s, a):
+            writetxt(ts, ai, os.path.join(args.outdir, label(a0) + '.txt'))
+    print('________________________________')
+    print('Batched survey: %s, %d planets in %d sims\n'
+          % (args.name, a0s.size, len(bands(a0s, args.band))))
+    for t, h in removed:
+        name = next(label(a0) for a0 in a0s
+                    if rebound.hash(label(a0)).value == h)
+        print('    Removed %s   : t = %.4e yr' % (name, t))
+    print('    Steps            : %d' % steps)
+    print('    Walltime Used    : %.2f s' % runtime)
+    if args.validate:
+        timer_start = time.perf_counter()
+        print('\n    a0/au  t_end/yr (batch/single)  max |da/a|')
+        for a0, ai in zip(a0s, a):
+            ref = individual(spec, a0, track)
+            both = (ai > 0) & (ref > 0)
+            tend = [ts[x > 0][-1] if (x > 0).any() else 0. for x in (ai, ref)]
+            print('    %.2f   %.4e / %.4e  %.2e'
+                  % (a0, tend[0], tend[1],
+                     np.max(np.abs(ai[both]/ref[both] - 1))))
+        print('    Individual runs  : %.2f s'
+              % (time.perf_counter() - timer_start))
+    print('________________________________')
@@ -0,0 +1,196 @@
+"""
+Adaptive search for the critical initial semimajor axis of engulfment.
+
+Replaces the coarse/semifine/fine grid passes of the jupiters study: each
+round runs a batch of simulations in parallel inside the current bracket
+[lo, hi] (engulfed at lo, survived at hi), keeps the sub-interval where the
+outcome flips and stops once it is no wider than the target resolution.
+With a batch of n simulations per round the bracket shrinks by a factor
+n + 1, so the boundary costs about n log(width/resolution)/log(n + 1)
+simulations instead of a full grid at that resolution.
+
+Trial points are snapped to multiples of the resolution, so they coincide
+with the grid points of the manual passes (and their output file names).
+Outcomes are obtained either in-process from the scenario registry or by
+running a production driver that takes a0 as its argument and writes
+output/<a0>au.txt, in which an engulfed planet's semiaxis is 0 from the
+collision onwards. Each driver run works in a scratch directory linking
+the driver directory's inputs, so probes neither overwrite the study's
+output/ nor each other's files, and the one file it wrote is read back
+whatever precision the driver names it with.
+
+usage: python tools/boundary.py [scenario] [--lo AU] [--hi AU]
+                                [--resolution AU] [--nprocs N] [--batch N]
+                                [--driver SCRIPT] [--out FILE]
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import rebound
+import scenarios as scn
+
+def outcome(spec, track=None):
+    """
+    Integrate a scenario and report whether the planet was engulfed.
+
+    Returns
+    -------
+    tuple
+        (engulfed, sim time at which the run stopped)
+    """
+    run = scn.makesim(spec, track)
+    try:
+        for t in np.linspace(0., spec['tmax'], spec['Nup'])[1:]:
+            scn.advance(run, t)
+    except rebound.Collision:
+        return True, run['sim'].t
+    return False, run['sim'].t
+
+def _scenario(item):
+    name, a0 = item
+    spec = scn.getspec(name, a0=a0)
+    return outcome(spec, scn.gettrack(spec))
+
+def _driver(item):
+    script, fmt, a0 = item
+    script = os.path.abspath(script)
+    workdir = os.path.dirname(script)
+    with tempfile.TemporaryDirectory(prefix='boundary-') as scratch:
+        for entry in os.listdir(workdir): # inputs, not the study's output/
+            if entry != 'output':
+                os.symlink(os.path.join(workdir, entry),
+                           os.path.join(scratch, entry))
+        subprocess.run([sys.executable, script, fmt.format(a0)],
+                       cwd=scratch, stdout=subprocess.DEVNULL, check=True)
+        outputs = os.listdir(os.path.join(scratch, 'output'))
+        if len(outputs) != 1:
+            raise RuntimeError('%s %s wrote %d output files, expected one'
+                               % (script, fmt.format(a0), len(outputs)))
+        data = np.loadtxt(os.path.join(scratch, 'output', outputs[0]))
+    alive = data[:, 1] != 0.
+    return not alive[-1], data[alive, 0][-1] if alive.any() else 0.
+
+def evaluator(name=None, driver=None, fmt='{:.2f}', nprocs=1):
+    """
+    Return a function mapping a list of a0 to their (engulfed, t) outcomes,
+    run on nprocs processes.
+    """
+    if driver is not None:
+        work, items = _driver, lambda a0s: [(driver, fmt, a) for a in a0s]
+    else:
+        work, items = _scenario, lambda a0s: [(name, a) for a in a0s]
+    def evaluate(a0s):
+        if nprocs > 1 and len(a0s) > 1:
+            with multiprocessing.Pool(min(nprocs, len(a0s))) as pool:
+                return pool.map(work, items(a0s), chunksize=1)
+        return [work(item) for item in items(a0s)]
+    return evaluate
+
+def trials(lo, hi, n, resolution):
+    """
+    Return up to n points strictly inside (lo, hi), evenly spaced and
+    snapped to multiples of resolution.
+    """
+    a0s = np.round(np.linspace(lo, hi, n+2)[1:-1]/resolution)*resolution
+    a0s = np.unique(a0s)
+    return a0s[(a0s > lo + resolution/2) & (a0s < hi - resolution/2)]
+
+def search(evaluate, lo, hi, resolution=0.01, batch=1, verbose=True):
+    """
+    Narrow the engulfment boundary down to the target resolution.
+
+    Parameters
+    ----------
+    evaluate : callable
+        Maps a list of a0 to a list of (engulfed, t) tuples.
+    lo, hi : float
+        Initial bracket; both ends are simulated first to confirm it.
+    resolution : float
+        Stop once hi - lo is no larger than this.
+    batch : int
+        Simulations per round (run in parallel by evaluate).
+
+    Returns
+    -------
+    tuple
+        Final (lo, hi) and a dict of every outcome keyed by a0.
+
+    Raises
+    ------
+    ValueError
+        If lo survives or hi is engulfed.
+    """
+    lo, hi = round(lo/resolution)*resolution, round(hi/resolution)*resolution
+    results = dict(zip([lo, hi], evaluate([lo, hi])))
+    if not results[lo][0] or results[hi][0]:
+        raise ValueError('[%.4g, %.4g] au does not bracket the boundary '
+                         '(engulfed: %s, %s)' % (lo, hi, results[lo][0],
+                                                 results[hi][0]))
+    k = 0
+    while hi - lo > resolution*(1 + 1e-9):
+        k += 1
+        a0s = trials(lo, hi, batch, resolution)
+        results.update(zip(a0s, evaluate(list(a0s))))
+        points = [lo] + list(a0s) + [hi]
+        engulfed = [results[a][0] for a in points]
+        first = engulfed.index(False)   # first survivor above lo
+        if any(engulfed[first:]):
+            print('warning: outcome not monotonic in a0 in [%.4g, %.4g] au;'
+                  ' following the innermost transition' % (lo, hi))
+        lo, hi = points[first-1], points[first]
+        if verbose:
+            print('round %d: %s -> [%.4f, %.4f] au'
+                  % (k, ' '.join('%.4g%s' % (a, 'E' if results[a][0]
+                                             else 'S') for a in a0s), lo, hi))
+    return lo, hi, results
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find the critical a0 of '
+                                     'engulfment by adaptive bisection.')
+    parser.add_argument('name', nargs='?', default='jupiters',
+                        metavar='scenario',
+                        help='one of: %s (default: jupiters)'
+                             % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--lo', type=float, default=0.9,
+                        help='a0 known to be engulfed (au)')
+    parser.add_argument('--hi', type=float, default=3.1,
+                        help='a0 known to survive (au)')
+    parser.add_argument('--resolution', type=float, default=0.01,
+                        help='target width of the bracket (au)')
+    parser.add_argument('--nprocs', type=int,
+                        default=int(os.environ.get('NCPUS', 1)),
+                        help='parallel simulations')
+    parser.add_argument('--batch', type=int, default=None,
+                        help='simulations per round (default: nprocs)')
+    parser.add_argument('--driver', default=None,
+                        help='run this production driver instead, e.g. '
+                             'jupiters/jupiters.py')
+    parser.add_argument('--out', default=None,
+                        help='write a0, engulfed, t_stop of every run')
+    args = parser.parse_args()
+
+    decimals = max(int(np.ceil(-np.log10(args.resolution))), 0)
+    evaluate = evaluator(args.name, args.driver, '{:.%df}' % decimals,
+                         args.nprocs)
+    timer_start = time.perf_counter()
+    lo, hi, results = search(evaluate, args.lo, args.hi, args.resolution,
+                             args.batch or args.nprocs)
+    if args.out is not None:
+        a0s = np.array(sorted(results))
+        np.savetxt(args.out, np.c_[a0s, [results[a][0] for a in a0s],
+                                   [results[a][1] for a in a0s]],
+                   fmt=['%.6f', '%d', '%.16E'], delimiter='\t')
+    print('________________________________')
+    print('Engulfment boundary: %s\n' % (args.driver or args.name))
+    print('    Engulfed at      : %.*f au' % (decimals, lo))
+    print('    Survives at      : %.*f au' % (decimals, hi))
+    print('    Simulations      : %d (grid: %d)'
+          % (len(results), round((args.hi - args.lo)/args.resolution) + 1))
+    print('    Walltime Used    : %.2f s' % (time.perf_counter() - timer_start))
+    print('________________________________')
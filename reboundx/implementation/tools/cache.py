@@ -0,0 +1,164 @@
+"""
+Content-addressed cache of finished sweep points.
+
+A point is keyed on the SHA-256 of everything that determines its result:
+the contents of the MESA track files, the scenario settings (T0, M0, a0,
+planet mass and radius, integrator, timestep, WHFast flags, tides, tmax,
+Nup, ...) and a code version, the hash of the driver and run scripts (the
+latter pins the conda env). Entries live in <cache>/<key[:2]>/<key>/ and
+hold the a(t) output as written by the driver plus its outcome in
+meta.json. The cache directory defaults to implementation/cache and can be
+moved with $REBX_CACHE.
+
+Sweeps submitted with a scenario use it automatically: points with a hit
+get their output copied into place instead of being submitted, the others
+are listed in <workdir>/<name>.keys and stored by the next collect() once
+their output appears.
+
+usage: python tools/cache.py collect DIR     # store finished points
+       python tools/cache.py stats
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+CACHE = os.environ.get('REBX_CACHE',
+                       os.path.join(os.path.dirname(TOOLS), 'cache'))
+SETTINGS = ('T0', 'M0', 'R0', 'bodies', 'integrator', 'dt', 'dtP', 'whfast',
+            'collision', 'engulf', 'evolve', 'tides', 'k2key', 'tau', 'taur',
+            'tmax', 'Nup')
+
+def filehash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def trackhash(indir):
+    """
+    Hash of the m.txt, r.txt and l.txt files of a MESA track directory.
+    """
+    return filehash(os.path.join(indir, 'm.txt')) + \
+           filehash(os.path.join(indir, 'r.txt')) + \
+           filehash(os.path.join(indir, 'l.txt'))
+
+def key(spec, code=(), root=None):
+    """
+    Return the cache key of a scenario point.
+
+    Parameters
+    ----------
+    spec : dict
+        Scenario from scenarios.getspec, with the point's a0.
+    code : list of str
+        Files whose contents make up the code version, e.g. the driver.
+    root : str
+        Directory spec['input'] is relative to (default: implementation).
+    """
+    root = root or os.path.dirname(TOOLS)
+    content = {name: spec[name] for name in SETTINGS}
+    if spec['input'] is not None:
+        content['track'] = trackhash(os.path.join(root, spec['input']))
+    content['code'] = [filehash(path) for path in code]
+    blob = json.dumps(content, sort_keys=True, default=repr)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def entry(k):
+    return os.path.join(CACHE, k[:2], k)
+
+def lookup(k):
+    """
+    Return the cached (output path, meta dict) of key k, or None.
+    """
+    meta = os.path.join(entry(k), 'meta.json')
+    if not os.path.exists(meta):
+        return None
+    with open(meta) as f:
+        return os.path.join(entry(k), 'output.txt'), json.load(f)
+
+def store(k, path, **meta):
+    """
+    Copy a finished output file into the cache under key k.
+
+    The semiaxis in the last row tells the outcome: the drivers record 0
+    from an engulfment onwards.
+    """
+    os.makedirs(entry(k), exist_ok=True)
+    tmp = os.path.join(entry(k), 'output.txt.tmp')
+    shutil.copyfile(path, tmp)
+    os.replace(tmp, os.path.join(entry(k), 'output.txt'))
+    with open(path) as f:
+        last = f.read().split()[-1]
+    meta.update(key=k, engulfed=float(last) == 0., stored=time.time())
+    with open(os.path.join(entry(k), 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1, sort_keys=True)
+
+def restore(k, output):
+    """
+    Copy the cached output of key k to path output; return its meta.
+    """
+    path, meta = lookup(k)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    shutil.copyfile(path, output)
+    return meta
+
+def pending(workdir, name, rows):
+    """
+    Record submitted points as (arg, key, output path) rows in
+    <workdir>/<name>.keys, stamped with the submission time.
+    """
+    with open(os.path.join(workdir, name + '.keys'), 'a') as f:
+        for arg, k, output in rows:
+            f.write('%s\t%s\t%s\t%.3f\n' % (arg, k, output, time.time()))
+
+def collect(workdir):
+    """
+    Store every pending point of workdir whose output has appeared since
+    its submission, and drop it from the .keys files.
+
+    Returns
+    -------
+    int
+        Number of points stored.
+    """
+    n = 0
+    for fname in sorted(os.listdir(workdir)):
+        if not fname.endswith('.keys'):
+            continue
+        path = os.path.join(workdir, fname)
+        with open(path) as f:
+            rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+        left = []
+        for arg, k, output, stamp in rows:
+            out = os.path.join(workdir, output)
+            if os.path.exists(out) and os.path.getmtime(out) > float(stamp):
+                store(k, out, arg=arg, output=output)
+                n += 1
+            elif lookup(k) is None:
+                left.append('\t'.join([arg, k, output, stamp]) + '\n')
+        if left:
+            with open(path, 'w') as f:
+                f.writelines(left)
+        else:
+            os.remove(path)
+    return n
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the sweep result '
+                                     'cache (%s).' % CACHE)
+    parser.add_argument('command', choices=['collect', 'stats'])
+    parser.add_argument('workdir', nargs='?', default='.')
+    args = parser.parse_args()
+    if args.command == 'collect':
+        print('Stored %d points' % collect(args.workdir))
+        sys.exit(0)
+    entries = [d for sub in (os.listdir(CACHE) if os.path.isdir(CACHE) else [])
+               for d in os.listdir(os.path.join(CACHE, sub))]
+    print('%d cached points in %s' % (len(entries), CACHE))
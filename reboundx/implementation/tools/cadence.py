@@ -0,0 +1,207 @@
+"""
+Output schedules independent of the parameter-update cadence.
+
+The drivers used to record a sample at every stellar parameter update, so
+memory and output size grew with the update rate (5e7 samples at a 1e-1-yr
+interval over 5 Myr). Here the updates are generated on the fly and a
+recorder keeps only the samples due on a separate output schedule:
+
+    rec = cadence.recorder(cadence.times('uniform', tmax, 5000), near=0.8)
+    for j, t in cadence.updates(tmax, Nup):
+        sim.integrate(t)
+        ...                                 # update the star
+        if cadence.due(rec, t, ps[0].r, ps[1].a):
+            cadence.record(rec, t, a=ps[1].a)
+    ts, a = cadence.series(rec, 'a')
+
+Output schedules are 'uniform' or 'log' in sim time; with near set, every
+update where the star's radius exceeds near times the planet's semiaxis
+is recorded too, to resolve the approach to engulfment.
+
+With size set the recorder's memory is bounded as well: each series is a
+buffer of at most size buckets holding the min, max and mean of adjacent
+samples. Buckets start with one sample each; when the buffer is full,
+neighbouring buckets are merged pairwise and new buckets take twice as
+many samples. Extremes such as the final plunge survive in the min and
+max, and a sample recorded with split=True (e.g. the a = 0 after a
+collision) always gets its own bucket: later samples start a new one and
+compaction never merges it.
+"""
+import numpy as np
+
+def updates(tmax, Nup):
+    """
+    Yield (j, t) of np.linspace(0., tmax, Nup) without storing them.
+    """
+    step = tmax/(Nup - 1) if Nup > 1 else 0.
+    for j in range(Nup - 1):
+        yield j, j*step
+    yield Nup - 1, tmax if Nup > 1 else 0.
+
+def times(kind, tmax, n, tmin=None):
+    """
+    Return n output times from 0 to tmax.
+
+    Parameters
+    ----------
+    kind : str
+        'uniform' (linear spacing) or 'log' (0, then logarithmic from tmin).
+    tmin : float
+        First nonzero output time of 'log' (default: tmax/n).
+    """
+    if kind == 'uniform':
+        return np.linspace(0., tmax, n)
+    if kind == 'log':
+        return np.r_[0., np.geomspace(tmin or tmax/n, tmax, n - 1)]
+    raise ValueError('unknown output schedule %r (uniform or log)' % kind)
+
+def recorder(times, near=None, size=None):
+    """
+    Return a recorder for due() and record() with the given output times.
+
+    Parameters
+    ----------
+    near : float
+        Also record every update with star radius > near * semiaxis
+        (None: schedule only).
+    size : int
+        Keep each series in a min/max/mean buffer() of this many buckets
+        (None: keep every sample).
+    """
+    return {'times': np.asarray(times, dtype=float), 'next': 0, 'near': near,
+            'size': size, 't': [], 'values': {}}
+
+def due(rec, t, R=None, a=None):
+    """
+    Return True if an output is due at sim time t: t has reached the next
+    scheduled time, or the planet at semiaxis a is near engulfment by the
+    star of radius R.
+    """
+    if rec['next'] < rec['times'].size and t >= rec['times'][rec['next']]:
+        return True
+    return (rec['near'] is not None and a is not None
+            and 0. < a < R/rec['near'])
+
+def record(rec, t, split=False, **values):
+    """
+    Record the values at sim time t and move past the outputs due by then.
+
+    split starts a new bucket in bounded recorders.
+    """
+    times = rec['times']
+    while rec['next'] < times.size and times[rec['next']] <= t:
+        rec['next'] += 1
+    if rec['size'] is None:
+        rec['t'].append(t)
+        for key, value in values.items():
+            rec['values'].setdefault(key, []).append(value)
+        return
+    for key, value in values.items():
+        if key not in rec['values']:
+            rec['values'][key] = buffer(rec['size'])
+        add(rec['values'][key], t, value, split)
+
+def series(rec, key, stat='mean'):
+    """
+    Return the recorded output times and values of key as arrays; stat
+    'min', 'max' or 'mean' picks the bucket statistic of bounded recorders
+    (all equal for single samples).
+    """
+    if rec['size'] is None:
+        return np.array(rec['t']), np.array(rec['values'].get(key, []))
+    b = buckets(rec['values'][key])
+    return b['t'], b[stat]
+
+def write(rec, key, path):
+    """
+    Write key's series as columns t, mean, min, max in the drivers' format
+    (the first two columns read like their writetxt files).
+    """
+    ts, mean = series(rec, key)
+    lo, hi = series(rec, key, 'min')[1], series(rec, key, 'max')[1]
+    with open(path, 'w') as f: # will overwrite existing file
+        for row in zip(ts, mean, lo, hi):
+            f.write('%.16E\t%.16E\t%.16E\t%.16E\n' % row)
+
+def buffer(size):
+    """
+    Return an empty min/max/mean buffer of at most size buckets.
+    """
+    if size < 2:
+        raise ValueError('buffer size must be at least 2, not %d' % size)
+    return {'size': size, 'width': 1, 'n': 0, 't0': np.zeros(size),
+            't1': np.zeros(size), 'count': np.zeros(size, dtype=int),
+            'split': np.zeros(size, dtype=bool), 'lo': None, 'hi': None,
+            'sum': None}
+
+def compact(buf):
+    """
+    Merge neighbouring buckets pairwise and double the bucket width.
+
+    Split buckets are never merged; a bucket next to one moves down
+    unmerged.
+    """
+    n, split = buf['n'], buf['split']
+    j = k = 0                           # read and write positions
+    while j < n:
+        if j + 1 < n and not split[j] and not split[j+1]:
+            buf['t0'][k] = buf['t0'][j]
+            buf['t1'][k] = buf['t1'][j+1]
+            buf['count'][k] = buf['count'][j] + buf['count'][j+1]
+            buf['lo'][k] = np.minimum(buf['lo'][j], buf['lo'][j+1])
+            buf['hi'][k] = np.maximum(buf['hi'][j], buf['hi'][j+1])
+            buf['sum'][k] = buf['sum'][j] + buf['sum'][j+1]
+            split[k] = False
+            j += 2
+        else:                           # split or odd one out
+            for key in ('t0', 't1', 'count', 'lo', 'hi', 'sum', 'split'):
+                buf[key][k] = buf[key][j]
+            j += 1
+        k += 1
+    if k == n:
+        raise ValueError('cannot compact a buffer of %d buckets without '
+                         'two neighbouring unsplit ones' % n)
+    buf['n'] = k
+    buf['width'] *= 2
+
+def add(buf, t, value, split=False):
+    """
+    Add a sample (scalar or array, e.g. a of every planet) at time t.
+    """
+    value = np.asarray(value, dtype=float)
+    if buf['lo'] is None:               # shape known from the first sample
+        for key in ('lo', 'hi', 'sum'):
+            buf[key] = np.zeros((buf['size'],) + value.shape)
+    i = buf['n'] - 1
+    if (i >= 0 and not split and not buf['split'][i]
+            and buf['count'][i] < buf['width']):
+        buf['t1'][i] = t
+        buf['count'][i] += 1
+        buf['lo'][i] = np.minimum(buf['lo'][i], value)
+        buf['hi'][i] = np.maximum(buf['hi'][i], value)
+        buf['sum'][i] += value
+        return
+    if buf['n'] == buf['size']:
+        compact(buf)
+    i = buf['n']
+    buf['t0'][i] = buf['t1'][i] = t
+    buf['count'][i] = 1
+    buf['split'][i] = split
+    buf['lo'][i] = buf['hi'][i] = buf['sum'][i] = value
+    buf['n'] += 1
+
+def buckets(buf):
+    """
+    Return the buckets of a buffer as arrays: 't' (middle of each bucket's
+    time span), 't0', 't1', 'count', 'min', 'max' and 'mean'.
+    """
+    n = buf['n']
+    if n == 0:
+        empty = np.zeros(0)
+        return dict.fromkeys(('t', 't0', 't1', 'count', 'min', 'max',
+                              'mean'), empty)
+    count = buf['count'][:n].reshape((n,) + (1,)*(buf['sum'].ndim - 1))
+    return {'t': 0.5*(buf['t0'][:n] + buf['t1'][:n]),
+            't0': buf['t0'][:n].copy(), 't1': buf['t1'][:n].copy(),
+            'count': buf['count'][:n].copy(), 'min': buf['lo'][:n].copy(),
+            'max': buf['hi'][:n].copy(), 'mean': buf['sum'][:n]/count}
@@ -0,0 +1,158 @@
+"""
+Checkpoint a driver run when the batch system asks it to stop.
+
+PBS sends TERM at the walltime (and Slurm USR1 ahead of it with
+--signal), then KILL after a short delay. A driver that dies inside
+sim.integrate loses its recorded series, so with a guard installed
+
+    guard = checkpoint.install(grace=60)
+    state = checkpoint.load('output/1.70au')   # None on the first run
+    ...
+    for j, t in enumerate(ts):
+        if not checkpoint.integrate(guard, sim, t):
+            checkpoint.save('output/1.70au', sim, rebx, j=j, a=a)
+            checkpoint.stop(guard)
+        ...
+    checkpoint.clear('output/1.70au')
+
+TERM, USR1 and USR2 stop the integration after the step in flight (through
+REBOUND's own SIGINT handling, which ends sim.integrate cleanly), the
+driver writes a SimulationArchive snapshot, the REBOUNDx effects and its
+own state (loop index, recorded arrays), and exits with status RESUME.
+Running the same command again resumes from the checkpoint; submit.py
+re-runs local tasks that exit with RESUME. If the checkpoint is not
+written within the grace period the process exits with 128 + the signal
+number instead; every file is replaced atomically, so the previous
+checkpoint stays intact.
+
+Only save() and load() import numpy, rebound and reboundx, so the
+submission tools can use RESUME without them.
+"""
+import os
+import signal
+import threading
+import warnings
+
+RESUME = 85                             # exit status of a checkpointed run
+SIGNALS = (signal.SIGTERM, signal.SIGUSR1, signal.SIGUSR2)
+
+def install(grace=None, signals=SIGNALS):
+    """
+    Route the stop signals to a watcher thread; must be called from the
+    main thread before any other thread is started.
+
+    Parameters
+    ----------
+    grace : float
+        Seconds from the signal until the checkpoint must be written
+        (default: $REBX_GRACE, else 60). Keep it below the scheduler's
+        kill delay.
+
+    Returns
+    -------
+    dict
+        Guard for integrate() and stop(): 'signum' is the signal received
+        (None until then).
+    """
+    if grace is None:
+        grace = float(os.environ.get('REBX_GRACE', 60.))
+    guard = {'signum': None, 'grace': grace, 'integrating': False,
+             'main': threading.main_thread().ident,
+             'lock': threading.Lock(), 'done': threading.Event()}
+    signal.pthread_sigmask(signal.SIG_BLOCK, signals)
+    def watch():
+        signum = signal.sigwait(signals)
+        print('received signal %d, checkpointing' % signum, flush=True)
+        with guard['lock']:
+            guard['signum'] = signum
+            if guard['integrating']:    # stop after the current step
+                signal.pthread_kill(guard['main'], signal.SIGINT)
+        if not guard['done'].wait(grace):
+            print('no checkpoint after %g s, giving up' % grace, flush=True)
+            os._exit(128 + signum)
+    threading.Thread(target=watch, daemon=True).start()
+    return guard
+
+def integrate(guard, sim, t):
+    """
+    sim.integrate(t) unless a stop signal arrives.
+
+    Returns
+    -------
+    bool
+        False if the run was stopped and should checkpoint; sim.t is then
+        anywhere up to t.
+    """
+    try:
+        with guard['lock']:             # the watcher sees one or the other
+            guard['integrating'] = True
+            stopped = guard['signum'] is not None
+        if not stopped:
+            sim.integrate(t)
+        with guard['lock']:
+            guard['integrating'] = False
+    except KeyboardInterrupt:           # the watcher's SIGINT, at most once
+        guard['integrating'] = False
+        if guard['signum'] is None:     # a real Ctrl-C
+            raise
+    return guard['signum'] is None
+
+def save(path, sim, rebx, **state):
+    """
+    Write path.bin (SimulationArchive snapshot), path.rebx (REBOUNDx
+    effects and particle parameters) and path.npz (driver state: numbers
+    and arrays).
+
+    All three are written under temporary names first and only then
+    renamed into place.
+    """
+    import numpy as np
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    sim.simulationarchive_snapshot(path + '.bin.tmp', deletefile=True)
+    rebx.save(path + '.rebx.tmp')
+    with open(path + '.npz.tmp', 'wb') as f:
+        np.savez(f, **state)
+    for ext in ('.bin', '.rebx', '.npz'):
+        os.replace(path + ext + '.tmp', path + ext)
+
+def load(path):
+    """
+    Load a checkpoint written by save().
+
+    Returns
+    -------
+    tuple or None
+        (sim, rebx, state dict), or None if there is no checkpoint. The
+        Interpolators and any collision_resolve callback are not part of
+        it and must be set up again.
+    """
+    import numpy as np
+    import rebound
+    import reboundx
+    if not all(os.path.exists(path + ext) for ext in ('.bin', '.rebx',
+                                                      '.npz')):
+        return None
+    with warnings.catch_warnings():     # function pointers: set by Extras
+        warnings.simplefilter('ignore', RuntimeWarning)
+        sim = rebound.Simulation(path + '.bin')
+    rebx = reboundx.Extras(sim, path + '.rebx')
+    with np.load(path + '.npz') as data:
+        state = {key: data[key][()] if data[key].ndim == 0 else data[key]
+                 for key in data.files}
+    return sim, rebx, state
+
+def clear(path):
+    """
+    Remove a checkpoint once the run has finished.
+    """
+    for ext in ('.bin', '.rebx', '.npz'):
+        if os.path.exists(path + ext):
+            os.remove(path + ext)
+
+def stop(guard):
+    """
+    Exit with RESUME after a checkpoint was saved.
+    """
+    guard['done'].set()
+    print('checkpoint written, exiting with status %d' % RESUME, flush=True)
+    raise SystemExit(RESUME)
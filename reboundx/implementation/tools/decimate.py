@@ -0,0 +1,118 @@
+"""
+Decimated line plots of long time series.
+
+The survey, convergence and performance outputs hold 5e4 to 5e7 samples
+per series, far more than the few thousand pixel columns of a figure, and
+handing all of them to ax.plot makes rendering take minutes. plot() draws
+only a shape-preserving subset sized to the axes' width in pixels:
+
+    import decimate
+    decimate.plot(ax, ts, a, '--', label='$a(t)$')   # as ax.plot(ts, a, ...)
+
+Two selections are offered:
+
+    minmax   (default) the first, last, minimum and maximum sample of
+             each pixel column, so spikes, plunges and the a = 0 after an
+             engulfment are drawn exactly as the full series would be
+    lttb     largest-triangle-three-buckets (Steinarsson 2013), one sample
+             per bucket chosen for the largest triangle with its
+             neighbours; smoother, but may drop isolated extremes
+
+The decimation factor of every series is printed. Zooming in an
+interactive window re-decimates the visible range of x, so the detail
+comes back at full resolution.
+"""
+import numpy as np
+
+def pixels(ax):
+    """
+    Return the width of an axes in pixels.
+    """
+    return max(int(ax.get_window_extent().width), 1)
+
+def minmax(x, y, n):
+    """
+    Indices of the first, last, min and max samples of n equal-count
+    buckets, in order.
+    """
+    N = len(y)
+    if N <= 4*n:
+        return np.arange(N)
+    edges = np.linspace(0, N, n + 1).astype(int)
+    keep = np.zeros(N, dtype=bool)
+    keep[edges[:-1]] = keep[edges[1:] - 1] = True
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        seg = y[lo:hi]
+        if np.isnan(seg).all():
+            continue
+        keep[lo + np.nanargmin(seg)] = keep[lo + np.nanargmax(seg)] = True
+    return np.flatnonzero(keep)
+
+def lttb(x, y, n):
+    """
+    Indices of n samples picked by largest-triangle-three-buckets: the
+    first and last sample plus, in each of n - 2 buckets, the one spanning
+    the largest triangle with the previous pick and the next bucket's mean.
+    """
+    N = len(y)
+    if N <= n or n < 3:
+        return np.arange(N)
+    edges = np.linspace(1, N - 1, n - 1).astype(int)
+    out = np.zeros(n, dtype=int)
+    out[-1] = N - 1
+    a = 0
+    for k in range(n - 2):
+        lo, hi = edges[k], edges[k+1]
+        nlo, nhi = hi, edges[k+2] if k + 2 < n - 1 else N
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx)*(y[lo:hi] - y[a])
+                      - (x[a] - x[lo:hi])*(cy - y[a]))
+        a = lo + int(np.nanargmax(area))
+        out[k+1] = a
+    return out
+
+METHODS = ('minmax', 'lttb')
+
+def select(x, y, n, method='minmax'):
+    """
+    Return the indices of a decimated series for n pixel columns.
+    """
+    if method == 'minmax':
+        return minmax(x, y, n)
+    if method == 'lttb':
+        return lttb(x, y, 2*n)
+    raise ValueError('unknown decimation %r (choose from %s)'
+                     % (method, ', '.join(METHODS)))
+
+def plot(ax, x, y, *args, n=None, method='minmax', **kwargs):
+    """
+    ax.plot(x, y, *args, **kwargs) of a decimated series.
+
+    Parameters
+    ----------
+    n : int
+        Pixel columns to decimate to (default: the axes' width).
+    method : str
+        'minmax' or 'lttb'.
+
+    Returns
+    -------
+    list of matplotlib.lines.Line2D
+        As ax.plot.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = n or pixels(ax)
+    i = select(x, y, n, method)
+    print('decimate: %s %d -> %d points (factor %.1f)'
+          % (kwargs.get('label', 'series'), len(y), len(i),
+             len(y)/max(len(i), 1)))
+    lines = ax.plot(x[i], y[i], *args, **kwargs)
+    if len(i) < len(y) and np.all(np.diff(x) >= 0):
+        def zoom(ax):                   # re-decimate the visible range
+            lo, hi = np.searchsorted(x, ax.get_xlim())
+            lo, hi = max(lo - 1, 0), min(hi + 1, len(x))
+            j = lo + select(x[lo:hi], y[lo:hi], n, method)
+            lines[0].set_data(x[j], y[j])
+        ax.callbacks.connect('xlim_changed', zoom)
+    return lines
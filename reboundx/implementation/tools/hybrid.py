@@ -0,0 +1,152 @@
+"""
+Hybrid secular/N-body driver for single-planet runs.
+
+The orbit is evolved with the secular engine while it is quiet, i.e. the
+tidal decay time a/|da/dt| is longer than `ratio` times the mass-loss time
+M/|dM/dt| and R/a is below `xmax`. At the first update time where either
+condition fails, a fully set-up REBOUND sim (scenarios.makesim) takes over
+from the secular a and e; it hands the state back to the secular engine
+once the orbit is quiet again by a factor `hysteresis`, e.g. after the
+TRGB. N-body accuracy is kept where the tides matter while the long
+adiabatic stretches cost no integrator steps.
+
+usage: python tools/hybrid.py [scenario] [--a0 AU] [--ratio F] [--xmax X]
+                              [--compare DIR]
+"""
+import argparse
+import os
+import time
+import numpy as np
+import rebound
+import scenarios as scn
+import secular as sec
+
+def timescales(spec, track, t, a, e=0.):
+    """
+    Tidal decay and mass-loss timescales and R/a at sim time(s) t.
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        (a/|da/dt|tide, M/|dM/dt|, R/a)
+    """
+    M, R, tau = sec.star(spec, track, t)
+    m = spec['bodies'][0]['m']
+    if spec['taur']:
+        tau = tau*a
+    dadt = sec.rates(a, e, M, m, R, tau)[0] if spec['tides'] else 0.*a
+    with np.errstate(divide='ignore'):
+        ttide = a/np.abs(dadt)
+        if spec['evolve']:
+            dMdt = np.gradient(track['masses'], track['mtimes'])
+            tml = M/np.abs(np.interp(spec['T0'] + t, track['mtimes'], dMdt))
+        else:
+            tml = np.full(np.shape(t), np.inf)
+    return ttide, tml, R/a
+
+def quiet(spec, track, t, a, e=0., ratio=10., xmax=0.25):
+    ttide, tml, x = timescales(spec, track, t, a, e)
+    return (ttide > ratio*tml) & (x < xmax)
+
+def hybrid(spec, track=None, ratio=10., xmax=0.25, hysteresis=2.):
+    """
+    Run a single-planet scenario in hybrid secular/N-body mode.
+
+    Returns
+    -------
+    dict
+        'ts', 'a' (semiaxis at each update time, 0 after engulfment like
+        the drivers' output), 'nbody' (True where the update interval was
+        integrated with REBOUND), 'steps' (N-body steps taken) and
+        'tengulf' (nan for survivors).
+    """
+    ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    a = np.zeros(ts.size)
+    nbody = np.zeros(ts.size, dtype=bool)
+    steps, tengulf = 0, np.nan
+    j, aj, ej = 0, spec['bodies'][0]['a'], 0.
+    while j < ts.size - 1:
+        # secular stretch up to the first update that is not quiet
+        res = sec.evolve(spec, [aj], track, ts[j:], e0=ej)
+        alive = res['a'][0] > 0
+        calm = quiet(spec, track, ts[j:], np.where(alive, res['a'][0], 1.),
+                     res['e'][0], ratio, xmax) & alive
+        k = ts.size - j if calm.all() else np.argmin(calm)
+        a[j:j+k] = res['a'][0][:k]
+        if k == ts.size - j:
+            tengulf = res['tengulf'][0]
+            break
+        if k > 0:
+            j += k - 1
+            aj, ej = res['a'][0][k-1], res['e'][0][k-1]
+        # N-body stretch from the secular state until quiet again
+        run = scn.makesim(spec, track, ts[j], orbits=[{'a': aj, 'e': ej}])
+        sim, ps = run['sim'], run['sim'].particles
+        s0 = sim.steps_done
+        try:
+            while j < ts.size - 1:
+                a[j], nbody[j] = ps[1].a, True
+                scn.advance(run, ts[j+1])
+                j += 1
+                aj, ej = ps[1].a, ps[1].e
+                if quiet(spec, track, sim.t, aj, ej, ratio*hysteresis,
+                         xmax/hysteresis):
+                    break
+            a[j] = aj
+        except rebound.Collision:
+            a[j:] = 0.
+            tengulf = sim.t
+            j = ts.size
+        steps += sim.steps_done - s0
+    return {'ts': ts, 'a': a, 'nbody': nbody, 'steps': steps,
+            'tengulf': tengulf}
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Hybrid secular/N-body '
+                                     'run of a single-planet scenario.')
+    parser.add_argument('name', nargs='?', default='jupiters',
+                        metavar='scenario',
+                        help='single-planet scenario (default: jupiters)')
+    parser.add_argument('--a0', type=float, default=None)
+    parser.add_argument('--ratio', type=float, default=10.,
+                        help='min. tidal/mass-loss timescale ratio to stay '
+                             'secular')
+    parser.add_argument('--xmax', type=float, default=0.25,
+                        help='max. R/a to stay secular')
+    parser.add_argument('--hysteresis', type=float, default=2.,
+                        help='tighten both thresholds by this factor to '
+                             'return to secular')
+    parser.add_argument('--compare', default=None, metavar='DIR',
+                        help='compare with the N-body <a0>au.txt in DIR')
+    args = parser.parse_args()
+    spec = scn.getspec(args.name, a0=args.a0)
+    track = scn.gettrack(spec)
+
+    timer_start = time.perf_counter()
+    res = hybrid(spec, track, args.ratio, args.xmax, args.hysteresis)
+    runtime = time.perf_counter() - timer_start
+    full = spec['tmax']/spec['dt'] if spec['dt'] else np.nan
+    print('________________________________')
+    print('Hybrid run: %s, a0 = %.2f au\n' % (args.name,
+                                              spec['bodies'][0]['a']))
+    print('    N-body updates   : %d/%d' % (res['nbody'].sum(),
+                                            res['ts'].size - 1))
+    print('    N-body steps     : %.3e (full run: %.3e)' % (res['steps'],
+                                                            full))
+    if np.isnan(res['tengulf']):
+        print('    Final a          : %.6f au' % res['a'][-1])
+    else:
+        print('    Engulfed at      : %.6e yr' % res['tengulf'])
+    if args.compare is not None:
+        fname = os.path.join(args.compare, '{:.2f}au.txt'.format(
+            spec['bodies'][0]['a']))
+        anb = np.loadtxt(fname)[:, 1]
+        trec = np.concatenate([[0.], res['ts'][:-1]]) # recorded before integrate
+        if anb[-1] == 0.:
+            print('    N-body engulfed  : %.6e yr (last alive)'
+                  % trec[anb > 0][-1])
+        else:
+            print('    N-body final a   : %.6f au' % anb[-1])
+    print('    Walltime Used    : %.2f s' % runtime)
+    print('________________________________')
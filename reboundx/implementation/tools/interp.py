@@ -0,0 +1,151 @@
+"""
+Accuracy and speed of the track interpolation schemes per scenario.
+
+Every driver interpolates the MESA track with the REBOUNDx natural cubic
+spline. track.py also offers piecewise 'linear' and monotone cubic Hermite
+'pchip' (no overshoot between knots), selected per scenario with
+spec['interp']. For each scheme and quantity (mass, radius, tau) this
+reports, over the scenario's window [T0, T0 + tmax] of the track:
+
+    error      max and rms relative error at the raw MESA knots, each
+               interpolated from a track with every other knot held out
+               (twice the knot spacing, so an upper bound on the error of
+               the full track)
+    overshoot  largest excursion of the full-track interpolant beyond its
+               two bracketing knots, relative to the value
+    cost       wall time per interpolate() call, queried in sequence at
+               the scenario's update times as in scenarios.update
+
+and recommends the fastest scheme whose rms errors are all within --tol.
+
+usage: python tools/interp.py scenario [--tol TOL] [--queries N]
+"""
+import argparse
+import time
+import numpy as np
+import rebound
+import reboundx
+import scenarios as scn
+import track as trk
+
+QUANTITIES = (('mass', 'mtimes', 'masses'), ('radius', 'rtimes', 'radii'),
+              ('tau', 'ltimes', 'taus'))
+
+def holdout(rebx, times, values, scheme, lo, hi):
+    """
+    Relative errors at the odd knots in [lo, hi] of an interpolant built
+    from the even knots (and the last one).
+    """
+    keep = np.ones(len(times), dtype=bool)
+    keep[1:-1:2] = False
+    test = np.flatnonzero(~keep & (times >= lo) & (times <= hi))
+    interp = trk.interpolator(rebx, times[keep], values[keep], scheme)
+    y = np.array([interp.interpolate(rebx, t=t)
+                  for t in times[test].tolist()])
+    return np.abs(y/values[test] - 1.)
+
+def overshoot(rebx, times, values, scheme, lo, hi, n=8):
+    """
+    Largest relative excursion of the interpolant beyond the bracketing
+    knots of the intervals in [lo, hi], sampled n times per interval.
+    """
+    interp = trk.interpolator(rebx, times, values, scheme)
+    k = np.flatnonzero((times[1:] >= lo) & (times[:-1] <= hi))
+    if k.size == 0:
+        return 0.
+    f = np.arange(1, n)/n
+    ts = times[k, None] + f*(times[k+1] - times[k])[:, None]
+    y = np.array([interp.interpolate(rebx, t=t)
+                  for t in ts.ravel().tolist()]).reshape(ts.shape)
+    top = np.maximum(values[k], values[k+1])[:, None]
+    bottom = np.minimum(values[k], values[k+1])[:, None]
+    excess = np.maximum(y - top, bottom - y).clip(0.)
+    return float((excess/np.abs(values[k, None])).max())
+
+def cost(rebx, interp, ages, repeat=3):
+    """
+    Best wall time per interpolate() call over repeat passes through ages.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for age in ages:
+            interp.interpolate(rebx, t=age)
+        best = min(best, time.perf_counter() - start)
+    return best/len(ages)
+
+def bench(spec, track=None, queries=10000):
+    """
+    Benchmark every scheme in track.SCHEMES on a scenario's window.
+
+    Returns
+    -------
+    dict
+        {scheme: {'cost': s per call (mean over the quantities), quantity:
+        {'max', 'rms' (held-out errors), 'overshoot'}}}.
+    """
+    track = track if track is not None else scn.gettrack(spec)
+    if track is None:
+        raise ValueError('scenario %r has a static star, nothing to '
+                         'interpolate' % spec['name'])
+    sim = rebound.Simulation()
+    rebx = reboundx.Extras(sim)
+    lo, hi = spec['T0'], spec['T0'] + spec['tmax']
+    ages = np.linspace(lo, hi, min(spec['Nup'], queries)).tolist()
+    results = {}
+    for scheme in trk.SCHEMES:
+        costs = []
+        results[scheme] = {}
+        for name, tkey, vkey in QUANTITIES:
+            x, y = track[tkey], track[vkey]
+            err = holdout(rebx, x, y, scheme, lo, hi)
+            results[scheme][name] = {
+                'max': float(err.max()) if err.size else 0.,
+                'rms': float(np.sqrt(np.mean(err**2))) if err.size else 0.,
+                'overshoot': overshoot(rebx, x, y, scheme, lo, hi)}
+            costs.append(cost(rebx, trk.interpolator(rebx, x, y, scheme),
+                              ages))
+        results[scheme]['cost'] = float(np.mean(costs))
+    return results
+
+def pick(results, tol):
+    """
+    Return the fastest scheme whose rms errors are all <= tol, or the one
+    with the smallest worst rms error if none is.
+    """
+    def worst(scheme):
+        return max(results[scheme][name]['rms'] for name, _, _ in QUANTITIES)
+    ok = [s for s in results if worst(s) <= tol]
+    if not ok:
+        return min(results, key=worst)
+    return min(ok, key=lambda s: results[s]['cost'])
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the track '
+                                     'interpolation schemes of a scenario.')
+    parser.add_argument('name', metavar='scenario',
+                        help='one of: %s' % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--tol', type=float, default=1e-3,
+                        help='max rms relative error of every quantity')
+    parser.add_argument('--queries', type=int, default=10000,
+                        help='timed calls per interpolator and pass')
+    args = parser.parse_args()
+    spec = scn.getspec(args.name)
+    results = bench(spec, queries=args.queries)
+    print('________________________________')
+    print('Interpolation schemes: %s, t = %.6g to %.6g yr\n'
+          % (args.name, spec['T0'], spec['T0'] + spec['tmax']))
+    print('    %-8s %9s   %-29s %-29s %s'
+          % ('scheme', 'us/call', 'mass max/rms/overshoot',
+             'radius max/rms/overshoot', 'tau max/rms/overshoot'))
+    for scheme, res in results.items():
+        print('    %-8s %9.3f   ' % (scheme, 1e6*res['cost'])
+              + ' '.join('%8.1e %8.1e %8.1e   ' % (res[name]['max'],
+                                                    res[name]['rms'],
+                                                    res[name]['overshoot'])
+                         for name, _, _ in QUANTITIES).rstrip())
+    print('\n    Current          : %s' % spec['interp'])
+    print('    Fastest in tol   : %s (rms <= %g)'
+          % (pick(results, args.tol), args.tol))
+    print('________________________________')
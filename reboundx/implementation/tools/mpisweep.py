@@ -0,0 +1,194 @@
+"""
+MPI sweep runner: a master/worker work queue over the grid points of a
+scenario, scaling one sweep across nodes instead of one qsub job per point.
+
+Rank 0 hands out grid points one at a time as workers ask for them, so
+long and short points balance themselves, and collects every result into
+one consolidated table (and optionally the a(t) files of the drivers).
+Each worker loads the scenario's MESA track and builds its Interpolators
+once (scenarios.template) and reuses them for all its points. The grid runs
+over a0 (survey, jupiters) or over the parameter update interval (the
+convergence bodies: engulfment, expansion). A point that raises is reported back as
+{'error': ...} and the sweep goes on; its row of the table is nan.
+
+Runs the same on one machine for testing, e.g.
+
+usage: mpirun -n 4 python tools/mpisweep.py [scenario] [--grid START STOP STEP]
+                                            [--param a0|interval]
+                                            [--tmax T] [--out FILE]
+                                            [--outdir DIR]
+"""
+import argparse
+import os
+import time
+import numpy as np
+from mpi4py import MPI
+import scenarios as scn
+
+READY, WORK, STOP = 1, 2, 3             # message tags
+
+def getpoint(name, param, value, overrides):
+    """
+    Spec of grid point value of param ('a0' or 'interval' in sim years).
+    """
+    spec = scn.getspec(name, **overrides)
+    if param == 'a0':
+        spec['bodies'][0]['a'] = value
+    else:
+        spec['Nup'] = max(int(spec['tmax']/value), 2)
+    return spec
+
+def runone(tmpls, name, param, value, overrides):
+    """
+    Run one grid point; a point that raises returns {'error': repr}.
+    """
+    try:
+        spec = getpoint(name, param, value, overrides)
+        if spec['input'] not in tmpls:
+            tmpls[spec['input']] = scn.template(spec, scn.gettrack(spec))
+        tmpl = tmpls[spec['input']]
+        res = scn.runpoint(spec, tmpl['track'], tmpl['interps'])
+    except Exception as error:
+        res = {'error': repr(error)}
+    res['host'] = MPI.Get_processor_name()
+    return res
+
+def worker(comm, name, param, overrides):
+    tmpls = {}                          # track and Interpolators, built once
+    comm.send(None, dest=0, tag=READY)
+    status = MPI.Status()
+    while True:
+        item = comm.recv(source=0, tag=MPI.ANY_TAG, status=status)
+        if status.Get_tag() == STOP:
+            return
+        i, value = item
+        comm.send((i, runone(tmpls, name, param, value, overrides)), dest=0,
+                  tag=READY)
+
+def report(param, value, res):
+    if 'error' in res:
+        print('%s = %.4g: failed on %s: %s'
+              % (param, value, res['host'], res['error']), flush=True)
+        return
+    print('%s = %.4g: %s at t = %.4e yr (%.1f s on %s)'
+          % (param, value, 'engulfed' if res['engulfed'] else 'survived',
+             res['tstop'], res['walltime'], res['host']), flush=True)
+
+def master(comm, values, name=None, param='a0', overrides=None):
+    """
+    Hand out grid points to the workers and gather their results.
+
+    With a single rank the points are run in-process instead.
+
+    Returns
+    -------
+    list of dict
+        Results of scenarios.runpoint in grid order, {'error': ...} for the
+        points that failed.
+    """
+    results = [None]*len(values)
+    if comm.Get_size() == 1:
+        tmpls = {}
+        for i, value in enumerate(values):
+            results[i] = runone(tmpls, name, param, value, overrides or {})
+            report(param, values[i], results[i])
+        return results
+    queue = list(enumerate(values))
+    active = comm.Get_size() - 1
+    status = MPI.Status()
+    while active:
+        msg = comm.recv(source=MPI.ANY_SOURCE, tag=READY, status=status)
+        if msg is not None:
+            i, res = msg
+            results[i] = res
+            report(param, values[i], res)
+        if queue:
+            comm.send(queue.pop(0), dest=status.Get_source(), tag=WORK)
+        else:
+            comm.send(None, dest=status.Get_source(), tag=STOP)
+            active -= 1
+    return results
+
+def writetxt(times, values, path='data.txt'):
+    with open(path, 'w') as f: # will overwrite existing file
+        for i in range(times.size):
+            f.write('%.16E\t%.16E\n' % (times[i], values[i]))
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a sweep with a '
+                                     'master/worker queue over MPI ranks.')
+    parser.add_argument('name', nargs='?', default=None,
+                        metavar='scenario',
+                        help='single-planet scenario (default: survey, or '
+                             'engulfment with --param interval)')
+    parser.add_argument('--grid', type=float, nargs=3,
+                        default=[0.4, 1.51, 0.1],
+                        metavar=('START', 'STOP', 'STEP'),
+                        help='np.arange grid of param')
+    parser.add_argument('--values', type=float, nargs='+', default=None,
+                        help='explicit grid instead of --grid, e.g. '
+                             'update intervals 1e0 1e1 1e2')
+    parser.add_argument('--param', choices=['a0', 'interval'], default='a0',
+                        help='swept quantity (interval: years between '
+                             'parameter updates)')
+    parser.add_argument('--tmax', type=float, default=None,
+                        help='integrate only to this sim time (yr)')
+    parser.add_argument('--out', default='sweep.txt',
+                        help='consolidated table: param, engulfed, t_stop, '
+                             'final a, walltime')
+    parser.add_argument('--outdir', default=None,
+                        help='also write <a0>au.txt (or <interval>yr.txt) '
+                             'semiaxis files like the drivers')
+    args = parser.parse_args()
+
+    if args.name is None:
+        args.name = 'survey' if args.param == 'a0' else 'engulfment'
+    comm = MPI.COMM_WORLD
+    overrides = {}
+    if args.tmax is not None:           # keep the update interval
+        spec = scn.getspec(args.name)
+        overrides['Nup'] = max(int(spec['Nup']*args.tmax/spec['tmax']), 2)
+        overrides['tmax'] = args.tmax
+    if comm.Get_rank() > 0:
+        worker(comm, args.name, args.param, overrides)
+    else:
+        values = np.array(args.values if args.values is not None
+                          else np.arange(*args.grid))
+        timer_start = time.perf_counter()
+        results = master(comm, values, args.name, args.param, overrides)
+        runtime = time.perf_counter() - timer_start
+        ok = [r for r in results if 'error' not in r]
+        nan = {'engulfed': np.nan, 'tstop': np.nan, 'a': [np.nan],
+               'walltime': np.nan}
+        rows = [nan if 'error' in r else r for r in results]
+        np.savetxt(args.out, np.c_[values,
+                                   [r['engulfed'] for r in rows],
+                                   [r['tstop'] for r in rows],
+                                   [r['a'][-1] for r in rows],
+                                   [r['walltime'] for r in rows]],
+                   fmt=['%.6f', '%g', '%.16E', '%.16E', '%.3f'],
+                   delimiter='\t')
+        if args.outdir is not None:
+            os.makedirs(args.outdir, exist_ok=True)
+            fmt = '{:.2f}au.txt' if args.param == 'a0' else '{:g}yr.txt'
+            for value, res in zip(values, results):
+                if 'error' not in res:
+                    writetxt(res['ts'], res['a'],
+                             os.path.join(args.outdir, fmt.format(value)))
+        cpu = sum(r['walltime'] for r in ok)
+        print('________________________________')
+        print('MPI sweep: %s over %s, %d points\n' % (args.name, args.param,
+                                                      values.size))
+        print('    Ranks            : %d (%d workers)'
+              % (comm.Get_size(), max(comm.Get_size() - 1, 1)))
+        print('    Hosts            : %s' % ', '.join(sorted(
+            {r['host'] for r in results})))
+        print('    Engulfed         : %d/%d' % (sum(r['engulfed']
+                                                    for r in ok),
+                                                values.size))
+        print('    Failed           : %d/%d' % (values.size - len(ok),
+                                                values.size))
+        print('    Sum of runs      : %.2f s' % cpu)
+        print('    Walltime Used    : %.2f s' % runtime)
+        print('________________________________')
@@ -0,0 +1,250 @@
+"""
+Performance regression gate against stored benchmark baselines.
+
+Baselines are two-column text files (wall time / s, peak memory / MB), one
+row per trial, stored under tools/baselines/ as <scenario>_<env>.txt (with
+the grid point appended to the scenario name when --a0 is given). The
+environment defaults to the installed REBOUND and REBOUNDx versions.
+
+Each trial is a smoke benchmark (tools/smoke.py) run in its own process:
+its wall time is the smoke prediction of the production run and its memory
+the peak resident set size of that process. A header line records how the
+trials were made ('# smoke steps=N'), and compare only gates against a
+baseline made the same way. import stores the recorded production runs
+('# production'), measured wall times and memories of whole runs, for
+reference; they are not comparable with smoke trials.
+
+usage: python tools/regress.py record  scenario [--trials N] [--env NAME]
+       python tools/regress.py compare scenario [--trials N] [--env NAME]
+                                       [--results FILE] [--alpha P]
+                                       [--tolerance F]
+       python tools/regress.py import  scenario
+
+compare exits with 0 if no regression is found, 1 on a significant slowdown
+or memory growth and 2 if there is no usable baseline to compare against.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import numpy as np
+import rebound
+import reboundx
+import scenarios as scn
+import smoke
+
+BASEDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+def writetxt(times, values, path='data.txt', header=None):
+    with open(path, 'w') as f: # will overwrite existing file
+        if header is not None:
+            f.write('# %s\n' % header)
+        for i in range(times.size):
+            f.write('%.16E\t%.16E\n' % (times[i], values[i]))
+
+def envname():
+    """
+    Default environment key: REBOUND and REBOUNDx versions.
+    """
+    return 'rebound-%s_rebx-%s' % (rebound.__version__, reboundx.__version__)
+
+def basepath(name, env):
+    return os.path.join(BASEDIR, '%s_%s.txt' % (name, env))
+
+def loadtrials(path):
+    """
+    Return (wall times, peak memories) of a two-column results file.
+    """
+    data = np.loadtxt(path, ndmin=2).reshape(-1, 2)
+    return data[:, 0], data[:, 1]
+
+def method(steps):
+    """
+    Header of trials made by trials(spec, steps=steps).
+    """
+    return 'smoke steps=%d' % steps
+
+def loadmethod(path):
+    """
+    Return the header of a results file (None if it has none).
+    """
+    with open(path) as f:
+        line = f.readline()
+    return line[1:].strip() if line.startswith('#') else None
+
+def trial(spec, steps=100000):
+    """
+    Run one smoke benchmark in this process.
+
+    Returns
+    -------
+    tuple
+        (predicted wall time / s, peak memory of this process / MB)
+    """
+    predict = smoke.smoke(spec, steps=steps)['predict']
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024. # kB
+    return predict, peak
+
+def trials(spec, n=5, steps=100000):
+    """
+    Run n smoke benchmarks, each in a fresh process, and return their
+    predicted wall times and peak memory usage.
+    """
+    runtimes, mems = np.zeros(n), np.zeros(n)
+    for k in range(n):
+        out = subprocess.run([sys.executable, os.path.abspath(__file__),
+                              'trial', spec['name'], '--steps', str(steps)],
+                             input=json.dumps(spec), capture_output=True,
+                             text=True, check=True).stdout
+        runtimes[k], mems[k] = map(float, out.split()[-2:])
+    return runtimes, mems
+
+def permtest(base, new, nperm=10000, seed=0):
+    """
+    One-sided permutation test for mean(new) > mean(base).
+
+    Returns
+    -------
+    float
+        p-value: fraction of random relabellings of the pooled trials whose
+        difference of means is at least the observed one.
+    """
+    base, new = np.asarray(base, float), np.asarray(new, float)
+    pooled = np.concatenate([base, new])
+    observed = new.mean() - base.mean()
+    rng = np.random.default_rng(seed)
+    perms = pooled[np.argsort(rng.random((nperm, pooled.size)), axis=1)]
+    diffs = perms[:, base.size:].mean(axis=1) - perms[:, :base.size].mean(axis=1)
+    return (np.sum(diffs >= observed) + 1)/(nperm + 1)
+
+def compare(base, new, alpha=0.01, tolerance=0.05):
+    """
+    Flag a regression between two trial distributions.
+
+    A metric regresses if its mean grew by more than tolerance (relative)
+    and the growth is significant at level alpha. With fewer than two trials
+    on either side only the tolerance is applied. Raises ValueError for an
+    empty baseline or one whose mean is not positive.
+
+    Returns
+    -------
+    tuple
+        (regressed, relative change, p-value)
+    """
+    if np.size(base) == 0 or not np.mean(base) > 0:
+        raise ValueError('baseline is empty or has a non-positive mean')
+    change = np.mean(new)/np.mean(base) - 1.
+    if np.size(base) < 2 or np.size(new) < 2:
+        return change > tolerance, change, np.nan
+    p = permtest(base, new)
+    return (change > tolerance and p < alpha), change, p
+
+def production(spec):
+    """
+    Collect recorded production trials of a scenario.
+
+    Returns
+    -------
+    tuple
+        (wall times, peak memories, environment) where the environment is
+        the conda env activated in the runs' run.pbs.
+    """
+    runtimes, mems, envs = [], [], set()
+    for fname in sorted(glob.glob(os.path.join(scn.ROOT, spec['ref']))):
+        outdir = os.path.dirname(fname)
+        rundir = os.path.dirname(outdir)
+        key, runtime = loadtrials(fname)
+        if os.path.exists(os.path.join(outdir, 'maxmems.txt')):
+            keep = np.isclose(key, spec['bodies'][0]['a']) # runtimes.txt
+            runtimes.extend(runtime[keep])
+            mems.extend(loadtrials(os.path.join(outdir, 'maxmems.txt'))[1][keep])
+        else:                           # one seqtimes.txt row per trial
+            mem = loadtrials(os.path.join(outdir, 'mem.txt'))[1]
+            runtimes.extend(runtime)
+            mems.extend([mem.max()]*runtime.size)
+        with open(os.path.join(rundir, 'run.pbs')) as f:
+            envs.update(re.findall(r'source activate (\S+)', f.read()))
+    env = 'cherry-creek_' + '+'.join(sorted(envs))
+    return np.array(runtimes), np.array(mems), env
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Record benchmark '
+                                     'baselines and gate regressions.')
+    parser.add_argument('command', choices=['record', 'compare', 'import',
+                                            'trial'])
+    parser.add_argument('name', metavar='scenario',
+                        help='one of: %s' % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--env', default=None,
+                        help='environment key (default: %s)' % envname())
+    parser.add_argument('--trials', type=int, default=5,
+                        help='smoke benchmark trials to run')
+    parser.add_argument('--steps', type=int, default=100000,
+                        help='integrator steps timed per window')
+    parser.add_argument('--results', default=None,
+                        help='compare this results file instead of running')
+    parser.add_argument('--alpha', type=float, default=0.01,
+                        help='significance level of the permutation test')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='relative growth tolerated before flagging')
+    parser.add_argument('--a0', type=float, default=None,
+                        help='initial semimajor axis of the first planet')
+    args = parser.parse_args()
+    if args.command == 'trial':         # one of trials(), spec on stdin
+        print('%.16E %.16E' % trial(json.load(sys.stdin), args.steps))
+        sys.exit(0)
+    spec = scn.getspec(args.name, a0=args.a0)
+    env = args.env or envname()
+    key = args.name if args.a0 is None else '%s-%.2fau' % (args.name, args.a0)
+
+    if args.command == 'import':
+        if spec['ref'] is None:
+            sys.exit('%s: no recorded production runs' % args.name)
+        runtimes, mems, env = production(spec)
+        os.makedirs(BASEDIR, exist_ok=True)
+        writetxt(runtimes, mems, basepath(key, env), 'production')
+        print('Imported %d trials as %s' % (runtimes.size,
+                                            basepath(key, env)))
+        sys.exit(0)
+
+    if args.results is not None:
+        runtimes, mems = loadtrials(args.results)
+    else:
+        runtimes, mems = trials(spec, args.trials, args.steps)
+
+    if args.command == 'record':
+        os.makedirs(BASEDIR, exist_ok=True)
+        writetxt(runtimes, mems, basepath(key, env), method(args.steps))
+        print('Recorded %d trials as %s' % (runtimes.size,
+                                            basepath(key, env)))
+        sys.exit(0)
+
+    if not os.path.exists(basepath(key, env)):
+        print('No baseline %s' % basepath(key, env))
+        sys.exit(2)
+    made = loadmethod(basepath(key, env))
+    if made != method(args.steps):
+        print('Baseline %s was made by %s, not %s'
+              % (basepath(key, env), made, method(args.steps)))
+        sys.exit(2)
+    baseruns, basemems = loadtrials(basepath(key, env))
+    try:
+        checks = [(label, compare(base, new, args.alpha, args.tolerance))
+                  for label, base, new in (('Walltime', baseruns, runtimes),
+                                           ('Memory  ', basemems, mems))]
+    except ValueError as e:
+        print('Baseline %s: %s' % (basepath(key, env), e))
+        sys.exit(2)
+    failed = False
+    print('________________________________')
+    print('Regression check: %s (%s)\n' % (args.name, env))
+    for label, (regressed, change, p) in checks:
+        failed = failed or regressed
+        print('    %s: %+.1f%% (p = %.3g) %s'
+              % (label, 100*change, p, 'REGRESSION' if regressed else 'ok'))
+    print('________________________________')
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,233 @@
+"""
+Runtime and peak memory model for right-sizing scheduler requests.
+
+Fitted to the run telemetry in the results index (tools/resultsdb.py):
+every indexed run whose directory maps onto a scenario (survey variants,
+convergence intervals, jupiters, performance runs) contributes its wall
+time and peak RSS with the scenario's settings. The wall time is modelled
+as a cost per integrator step plus a cost per parameter update,
+
+    T = (c1 ias15 + c2 ias15 tides + c3 fixed + c4 fixed tides) N n_steps
+        + c5 Nup
+
+with n_steps = t / dt for fixed timesteps and t / P_inner for IAS15 (its
+steps per orbit are absorbed in c1, c2), N the number of particles and t
+the sim time reached (engulfed runs stop early). The peak memory is a base
+plus the recorded outputs the driver holds, M = m0 + m1 n_out. For an
+indexed run n_out is the number of rows in its series file. Runs without
+one count one output per update, as the drivers recorded before the
+cadence recorders. Predictions use the registry's bound Nout, the
+recorder's schedule or buffer size, so they do not grow with Nup. Both fits
+minimize relative residuals. What the shared coefficients miss per
+integrator and scenario (safe_mode, correctors, the switching of
+MERCURIUS-like setups) is taken out as the mean log residual of each such
+class. The requests add a safety margin of two standard deviations of the
+remaining log residuals (at least 20%). Engulfment is not predicted, so
+every point is sized for a run to tmax.
+
+The model only predicts scenarios it has seen: a scenario with no indexed
+run of the same integrator and scenario class is refused (ValueError, and
+submit.py keeps its default requests) rather than extrapolated.
+
+usage: python tools/resources.py [scenario] [--a0 AU ...]
+"""
+import argparse
+import os
+import re
+import numpy as np
+import resultsdb
+import scenarios as scn
+
+SURVEY = r'survey/cherry-creek/tides_(on|off)/(\d+)Mearth'
+CONVERGENCE = r'convergence/(engulfment|expansion)/cherry-creek/(1e-?\d)'
+PERFORMANCE = r'performance/par(100Myr|Merc\w*)/run\d+'
+
+def configspec(config, param, value):
+    """
+    Return the scenario spec a run directory of the index was made with,
+    or None if it maps onto no registered scenario.
+    """
+    m = re.fullmatch(SURVEY, config)
+    if m and param == 'a0':
+        spec = scn.getspec('survey', a0=value, tides=m.group(1) == 'on')
+        spec['bodies'][0]['m'] = 3e-6*int(m.group(2))
+        return spec
+    m = re.fullmatch(CONVERGENCE, config)
+    if m and param == 'interval':
+        return scn.getspec(m.group(1), Nup=int(5e6/value))
+    if config == 'jupiters' and param == 'a0':
+        return scn.getspec('jupiters', a0=value)
+    m = re.fullmatch(PERFORMANCE, config)
+    if m and m.group(1) in scn.SCENARIOS:
+        return scn.getspec(m.group(1))
+    return None
+
+def scenarioclass(spec):
+    """
+    Key of the runs that can train predictions for spec: its integrator
+    and scenario.
+    """
+    return spec['integrator'], spec['name']
+
+def features(spec, t=None):
+    """
+    Regressors of the runtime model for a run reaching sim time t.
+    """
+    t = spec['tmax'] if t is None else t
+    a = min(body['a'] for body in spec['bodies'])
+    period = a**1.5/np.sqrt(spec['M0'])  # yr, with G = 4 pi^2
+    ias15 = spec['integrator'] == 'ias15'
+    if ias15:
+        steps = t/period
+    elif spec['dtP'] is not None:
+        steps = t/(spec['dtP']*period)
+    else:
+        steps = t/spec['dt']
+    work = (len(spec['bodies']) + 1)*steps
+    tides = float(spec['tides'])
+    return np.array([ias15*work, ias15*tides*work, (not ias15)*work,
+                     (not ias15)*tides*work, spec['Nup']*t/spec['tmax']])
+
+def outputs(spec):
+    """
+    Number of recorded outputs a run of spec holds in memory.
+    """
+    if spec['Nout'] is None:
+        return spec['Nup']
+    return min(spec['Nup'], spec['Nout'])
+
+def recorded(spec, series):
+    """
+    Number of outputs an indexed run of spec recorded: the rows of its
+    series file, else one per update.
+    """
+    if series is None or not os.path.isfile(os.path.join(resultsdb.ROOT,
+                                                         series)):
+        return spec['Nup']
+    with open(os.path.join(resultsdb.ROOT, series)) as f:
+        return sum(1 for line in f if line.strip())
+
+def history(path=resultsdb.DB):
+    """
+    Return the training set: regressors, wall times (s), peak memories
+    (MB, nan where unknown), the recorded output counts and the scenario
+    classes of the indexed runs.
+    """
+    rows = resultsdb.query('SELECT config, param, value, engulfed, tengulf, '
+                           'runtime, maxmem, series FROM runs '
+                           'WHERE runtime > 0', path=path)
+    X, T, M, Nout, classes = [], [], [], [], []
+    for config, param, value, engulfed, tengulf, runtime, maxmem, series \
+            in rows:
+        spec = configspec(config, param, value)
+        if spec is None:
+            continue
+        X.append(features(spec, tengulf if engulfed and tengulf else None))
+        T.append(runtime)
+        M.append(np.nan if maxmem is None else maxmem)
+        Nout.append(recorded(spec, series))
+        classes.append(scenarioclass(spec))
+    return (np.array(X), np.array(T), np.array(M), np.array(Nout, float),
+            classes)
+
+def fit(path=resultsdb.DB):
+    """
+    Fit the runtime and memory models to the results index.
+
+    Returns
+    -------
+    dict
+        'time' and 'mem' coefficients, the standard deviations of their
+        log residuals 'dtime', 'dmem', the number of runs 'n' and the
+        mean log runtime residual of each scenario class fitted,
+        'classes'.
+
+    Raises
+    ------
+    ValueError
+        If the index holds too few runs to fit (run resultsdb.py ingest).
+    """
+    X, T, M, Nout, classes = history(path)
+    if len(T) < 10:                     # twice the runtime coefficients
+        raise ValueError('%d indexed runs are too few to fit the resource '
+                         'model; run tools/resultsdb.py ingest' % len(T))
+    # relative residuals: scale each row by its runtime; costs are >= 0,
+    # so drop the most negative term and refit until none is left
+    c = np.zeros(X.shape[1])
+    active = np.ones(X.shape[1], dtype=bool)
+    while active.any():
+        c[:] = 0.
+        c[active] = np.linalg.lstsq(X[:, active]/T[:, None], np.ones(len(T)),
+                                    rcond=None)[0]
+        if (c >= 0).all():
+            break
+        active[np.argmin(c)] = False
+    resid = np.log(X.dot(c)/T)
+    bias = {k: resid[[i for i, ki in enumerate(classes) if ki == k]].mean()
+            for k in set(classes)}
+    dtime = np.std(resid - [bias[k] for k in classes])
+    ok = ~np.isnan(M)
+    A = np.c_[np.ones(ok.sum()), Nout[ok]]
+    m = np.linalg.lstsq(A/M[ok, None], np.ones(ok.sum()), rcond=None)[0]
+    dmem = np.std(np.log(A.dot(m)/M[ok]))
+    return {'time': c, 'mem': m, 'dtime': dtime, 'dmem': dmem, 'n': len(T),
+            'classes': bias}
+
+def predict(spec, model, margin=True):
+    """
+    Predict the wall time (s) and peak memory (MB) of a scenario point,
+    with the safety margin unless margin is False.
+
+    Raises
+    ------
+    ValueError
+        If no run of the point's integrator and scenario was fitted.
+    """
+    if scenarioclass(spec) not in model['classes']:
+        raise ValueError('no indexed %s runs of scenario %s to predict from'
+                         % scenarioclass(spec))
+    walltime = (features(spec).dot(model['time'])
+                /np.exp(model['classes'][scenarioclass(spec)]))
+    mem = model['mem'][0] + model['mem'][1]*outputs(spec)
+    if margin:
+        walltime *= max(np.exp(2*model['dtime']), 1.2)
+        mem *= max(np.exp(2*model['dmem']), 1.2)
+    return walltime, mem
+
+def request(specs, model=None):
+    """
+    Return PBS-style ('HH:MM:SS', '<n>mb') requests covering every point
+    of a sweep, with the safety margin.
+    """
+    model = model or fit()
+    walltime, mem = np.max([predict(spec, model) for spec in specs], axis=0)
+    walltime = 60*np.ceil(walltime/60)  # whole minutes
+    mem = 100*np.ceil(mem/100)           # whole 100 MB
+    h, m = divmod(int(walltime)//60, 60)
+    return '%02d:%02d:00' % (h, m), '%dmb' % mem
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Predict wall time and '
+                                     'peak memory from the results index.')
+    parser.add_argument('name', nargs='?', default=None, metavar='scenario',
+                        help='one of: %s (default: report the fit)'
+                             % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--a0', type=float, nargs='+', default=[None])
+    args = parser.parse_args()
+    model = fit()
+    print('________________________________')
+    print('Resource model: %d runs in %s\n' % (model['n'], resultsdb.DB))
+    print('    Runtime scatter  : %.0f%% (1 sigma)'
+          % (100*(np.exp(model['dtime']) - 1)))
+    print('    Memory scatter   : %.0f%% (1 sigma)'
+          % (100*(np.exp(model['dmem']) - 1)))
+    if args.name is not None:
+        specs = [scn.getspec(args.name, a0=a0) for a0 in args.a0]
+        for spec in specs:
+            walltime, mem = predict(spec, model, margin=False)
+            print('    a0 = %.2f au     : %.0f s, %.0f MB'
+                  % (spec['bodies'][0]['a'], walltime, mem))
+        print('    Request          : walltime=%s mem=%s' % request(specs,
+                                                                   model))
+    print('________________________________')
@@ -0,0 +1,274 @@
+"""
+Sweep-wide results database: one SQLite index over every run's outputs.
+
+The results sit in hundreds of small text files: the drivers' <a0>au.txt
+series and runtimes/maxmems tables in survey and jupiters output/, the
+engulftimes/finalas tables of convergence/*/output, the seqtimes and mem
+series of performance/*/run*/output and the PBS .o logs beside them.
+`ingest` walks the tree once and records per run the configuration
+(directory), grid parameter and value, outcome, engulfment time, final a,
+runtime, peak memory and the path of its series. Later ingests only re-read
+directories that changed. Analyses then query the index instead of
+re-parsing the tree, e.g.
+
+    import resultsdb
+    rows = resultsdb.query("SELECT value, tengulf FROM runs WHERE config "
+                           "LIKE 'survey/%/tides_on/1Mearth' AND engulfed")
+
+The database defaults to implementation/results.sqlite and can be moved
+with $REBX_RESULTS.
+
+usage: python tools/resultsdb.py ingest [DIR]
+       python tools/resultsdb.py query SQL
+       python tools/resultsdb.py show [--config PATTERN]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import numpy as np
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(TOOLS)
+DB = os.environ.get('REBX_RESULTS', os.path.join(ROOT, 'results.sqlite'))
+SKIP = {'tools', 'cache', 'queue', 'input', 'baselines', '__pycache__'}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    config TEXT,        -- run directory relative to implementation/
+    param TEXT,         -- grid parameter: a0, interval or loop
+    value REAL,
+    engulfed INTEGER,   -- NULL where the run does not tell
+    tengulf REAL,       -- engulfment sim time (last recorded alive) / yr
+    final_a REAL,       -- last semiaxis of the planet while alive / AU
+    runtime REAL,       -- wall time / s
+    maxmem REAL,        -- peak memory / MB
+    series TEXT,        -- time series file relative to implementation/
+    PRIMARY KEY (config, param, value)
+);
+CREATE TABLE IF NOT EXISTS logs (
+    path TEXT PRIMARY KEY,
+    config TEXT,
+    jobid INTEGER,
+    value REAL,         -- grid value for per-point logs (<a0>au.o<jobid>)
+    node TEXT,
+    walltime REAL,      -- / s
+    mem REAL            -- / MB, where PBS reports it
+);
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    mtime REAL
+);
+"""
+
+def connect(path=DB):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    return db
+
+def query(sql, params=(), path=DB):
+    """
+    Run a query against the index and return all rows.
+    """
+    with connect(path) as db:
+        return db.execute(sql, params).fetchall()
+
+def load(series):
+    """
+    Load a run's time series (path as stored in runs.series).
+    """
+    return np.loadtxt(os.path.join(ROOT, series), ndmin=2)
+
+def table(path):
+    """
+    Return a {first column: second column} dict of a writetxt table.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return {}
+    data = np.loadtxt(path, ndmin=2)
+    return dict(zip(np.round(data[:, 0], 10), data[:, 1]))
+
+def seconds(text):
+    """
+    Parse the drivers' 'Wall time: 1h 2min 3s' or PBS' '01:02:03'.
+    """
+    if ':' in text:
+        h, m, s = text.strip().split(':')
+        return 3600*int(h) + 60*int(m) + int(s)
+    units = {'h': 3600, 'min': 60, 's': 1}
+    return sum(int(n)*units[u] for n, u in re.findall(r'(\d+)(h|min|s)\b',
+                                                        text))
+
+def parselog(path):
+    """
+    Return (node, walltime / s, memory / MB) of a PBS .o log, None where
+    the log does not say.
+    """
+    with open(path, errors='replace') as f:
+        text = f.read()
+    node = re.search(r'Working on compute node (\S+)', text)
+    wall = re.search(r'Walltime Used\s*:\s*(\S+)', text)
+    if wall is None:
+        wall = re.findall(r'[Ww]all time: ([^\n]+)', text)
+        walltime = sum(seconds(w) for w in wall) if wall else None
+    else:
+        walltime = seconds(wall.group(1))
+    mem = re.search(r'Real Memory Used\s*:\s*([\d.]+)\s*(kb|mb|gb)', text,
+                    re.I)
+    if mem is not None:
+        mem = float(mem.group(1))*{'kb': 1/1024, 'mb': 1, 'gb': 1024}[
+            mem.group(2).lower()]
+    return node and node.group(1), walltime, mem
+
+def outcome(data):
+    """
+    (engulfed, last time alive, final a) of a driver's a(t) series, which
+    records 0 from a collision onwards.
+    """
+    alive = data[:, 1] != 0.
+    if not alive.any():
+        return True, None, None
+    last = np.flatnonzero(alive)[-1]
+    return bool(not alive[-1]), float(data[last, 0]), float(data[last, 1])
+
+def scandir(outdir):
+    """
+    Return the runs of one output directory as rows of the runs table.
+    """
+    config = os.path.relpath(os.path.dirname(outdir), ROOT)
+    files = os.listdir(outdir)
+    runtimes = table(os.path.join(outdir, 'runtimes.txt'))
+    maxmems = table(os.path.join(outdir, 'maxmems.txt'))
+    rows = []
+    series = [f for f in files if re.fullmatch(r'[\d.]+au\.txt', f)]
+    for fname in series:                # survey and jupiters: <a0>au.txt
+        a0 = round(float(fname[:-len('au.txt')]), 10)
+        path = os.path.join(outdir, fname)
+        if os.path.getsize(path) == 0:
+            continue
+        engulfed, tlast, final = outcome(np.loadtxt(path, ndmin=2))
+        rows.append((config, 'a0', a0, engulfed, tlast if engulfed else None,
+                     final, runtimes.get(a0), maxmems.get(a0),
+                     os.path.relpath(path, ROOT)))
+    if 'engulftimes.txt' in files or 'finalas.txt' in files:
+        engulftimes = table(os.path.join(outdir, 'engulftimes.txt'))
+        finalas = table(os.path.join(outdir, 'finalas.txt'))
+        for value in sorted(set(engulftimes) | set(finalas)):
+            tengulf = engulftimes.get(value)
+            rows.append((config, 'interval', value,
+                         None if tengulf is None else bool(tengulf > 0),
+                         tengulf or None, finalas.get(value),
+                         runtimes.get(value), maxmems.get(value), None))
+    if 'seqtimes.txt' in files:         # performance runs
+        seqtimes = table(os.path.join(outdir, 'seqtimes.txt'))
+        mem = os.path.join(outdir, 'mem.txt')
+        maxmem = np.loadtxt(mem, ndmin=2)[:, 1].max() \
+            if os.path.exists(mem) and os.path.getsize(mem) else None
+        for loop, runtime in seqtimes.items():
+            rows.append((config, 'loop', loop, None, None, None, runtime,
+                         maxmem, os.path.relpath(outdir, ROOT)))
+    return rows
+
+def scanlogs(logdir):
+    """
+    Return the PBS .o logs in logdir as rows of the logs table.
+    """
+    rows = []
+    for fname in os.listdir(logdir):
+        match = re.fullmatch(r'(.*)\.o(\d+)', fname)
+        if match is None:
+            continue
+        path = os.path.join(logdir, fname)
+        config = os.path.relpath(logdir, ROOT)
+        if os.path.basename(logdir) == 'pbs':    # per-point logs
+            config = os.path.dirname(config)
+        value = re.fullmatch(r'([\d.]+)au', match.group(1))
+        value = value and round(float(value.group(1)), 10)
+        rows.append((os.path.relpath(path, ROOT), config,
+                     int(match.group(2)), value) + parselog(path))
+    return rows
+
+def ingest(root=ROOT, path=DB, force=False):
+    """
+    Index every output and log directory below root.
+
+    Directories whose newest file is unchanged since the last ingest are
+    skipped unless force.
+
+    Returns
+    -------
+    tuple of int
+        Directories (re)read and runs stored.
+    """
+    ndirs = nruns = 0
+    with connect(path) as db:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if d not in SKIP
+                                 and not d.startswith('.'))
+            isout = os.path.basename(dirpath) == 'output'
+            logs = any(re.search(r'\.o\d+$', f) for f in filenames)
+            if not (isout or logs):
+                continue
+            rel = os.path.relpath(dirpath, ROOT)
+            mtime = max([os.path.getmtime(os.path.join(dirpath, f))
+                         for f in filenames] + [os.path.getmtime(dirpath)])
+            seen = db.execute('SELECT mtime FROM dirs WHERE path = ?',
+                              (rel,)).fetchone()
+            if not force and seen is not None and seen[0] >= mtime:
+                continue
+            if isout:
+                rows = scandir(dirpath)
+                config = os.path.dirname(rel)
+                db.execute('DELETE FROM runs WHERE config = ?', (config,))
+                db.executemany('INSERT OR REPLACE INTO runs VALUES '
+                               '(?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                nruns += len(rows)
+            if logs:
+                db.executemany('INSERT OR REPLACE INTO logs VALUES '
+                               '(?, ?, ?, ?, ?, ?, ?)', scanlogs(dirpath))
+            db.execute('INSERT OR REPLACE INTO dirs VALUES (?, ?)',
+                       (rel, mtime))
+            ndirs += 1
+        # per-point PBS logs fill in what the output tables lack
+        for column, field in (('runtime', 'walltime'), ('maxmem', 'mem')):
+            db.execute('UPDATE runs SET %s = (SELECT %s FROM logs WHERE '
+                       'logs.config = runs.config AND logs.value = runs.value '
+                       'ORDER BY jobid DESC LIMIT 1) WHERE %s IS NULL'
+                       % (column, field, column))
+    return ndirs, nruns
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Index sweep results in a '
+                                     'SQLite database (%s).' % DB)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('ingest', help='index new or changed results')
+    p.add_argument('root', nargs='?', default=ROOT)
+    p.add_argument('--force', action='store_true',
+                   help='re-read unchanged directories too')
+    p = sub.add_parser('query', help='run an SQL query')
+    p.add_argument('sql')
+    p = sub.add_parser('show', help='list indexed runs')
+    p.add_argument('--config', default='%',
+                   help='SQL LIKE pattern of run directories')
+    args = parser.parse_args()
+
+    if args.command == 'ingest':
+        ndirs, nruns = ingest(os.path.abspath(args.root), force=args.force)
+        total = query('SELECT COUNT(*) FROM runs')[0][0]
+        print('Read %d directories, %d runs (%d indexed in %s)'
+              % (ndirs, nruns, total, DB))
+    elif args.command == 'query':
+        for row in query(args.sql):
+            print('\t'.join(str(x) for x in row))
+    else:
+        rows = query('SELECT config, param, value, engulfed, tengulf, '
+                     'final_a, runtime, maxmem FROM runs WHERE config LIKE ? '
+                     'ORDER BY config, value', (args.config,))
+        print('%-44s %-8s %10s %3s %12s %10s %10s %8s'
+              % ('config', 'param', 'value', 'E', 't_engulf/yr', 'a_f/au',
+                 'runtime/s', 'mem/MB'))
+        fmt = lambda x, f: '-' if x is None else f % x
+        for r in rows:
+            print('%-44s %-8s %10.4g %3s %12s %10s %10s %8s'
+                  % (r[0], r[1], r[2], fmt(r[3], '%d'), fmt(r[4], '%.4e'),
+                     fmt(r[5], '%.4f'), fmt(r[6], '%.1f'), fmt(r[7], '%.1f')))
@@ -0,0 +1,379 @@
+"""
+Registry of the production configurations and a shared sim setup.
+
+Each driver directory hard-codes its star, planets, integrator, timestep,
+effects and update cadence. SCENARIOS holds the same settings as data
+(100Myr, MercNone/E/T/ET, survey, the engulfment and expansion convergence
+bodies, jupiters), overlaid on DEFAULTS, so that the tools can run,
+benchmark and sweep any of them without copying a driver:
+
+    spec = scn.getspec('survey', a0=1.2)    # a copy, overrides as kwargs
+    run = scn.makesim(spec, scn.gettrack(spec))
+    for t in np.linspace(0., spec['tmax'], spec['Nup'])[1:]:
+        run['sim'].integrate(t)
+        scn.update(run)                     # the drivers' parameter update
+
+A sweep builds the track's Interpolators once with template() and sets up
+each point with clone(); runpoint() integrates one point to tmax.
+
+usage: import scenarios as scn; scn.runpoint(scn.getspec(NAME, a0=AU))
+"""
+import copy
+import os
+import time
+import numpy as np
+import rebound
+import reboundx
+import track as trk
+import unsafe
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INNER = [{'m': 0.166e-6, 'a': 0.39, 'hash': 'Mercury'},
+         {'m': 2.45e-6, 'a': 0.723, 'hash': 'Venus'},
+         {'m': 3.e-6, 'a': 1., 'hash': 'Earth'},
+         {'m': 0.323e-6, 'a': 1.524, 'hash': 'Mars'}]
+K2 = 0.038                              # ~ lambda_2, Schroder & Smith (2008)
+
+# production configurations, mirroring the driver scripts they are named for
+DEFAULTS = {
+    'input': None,        # MESA track dir (rel. to ROOT), None for static star
+    'T0': 0.,             # star's age at sim start
+    'M0': 1.,             # initial mass of star
+    'R0': 0.,             # initial radius of star (static star only)
+    'bodies': [],         # kwargs passed to sim.add for each planet
+    'integrator': 'ias15',
+    'dt': None,           # fixed timestep / yr
+    'dtP': None,          # fixed timestep as a fraction of the inner period
+    'whfast': {},         # sim.ri_whfast attributes, e.g. safe_mode
+    'collision': None,    # 'direct' to stop at the first star-planet contact
+    'engulf': False,      # driver-side engulfment of the closest planet
+    'evolve': False,      # interpolate the star's mass and radius
+    'interp': 'spline',   # track interpolation: linear, pchip or spline
+    'tides': False,       # tides_constant_time_lag
+    'k2key': 'tctl_k1',   # renamed 'tctl_k2' in later REBOUNDx releases
+    'tau': None,          # fixed tctl_tau, None to interpolate the track
+    'taur': False,        # scale tau by the distance to the closest planet
+    'tmax': 0.,           # max sim integration time
+    'Nup': 1,             # no. of param updates
+    'Nout': None,         # outputs the driver holds (None: one per update)
+    'ref': None,          # glob of recorded runtimes (rel. to ROOT)
+}
+SCENARIOS = {
+    '100Myr': {'input': 'performance/par100Myr/run01/input',
+               'T0': 12293.5e6, 'M0': 0.98506175042481, 'bodies': INNER,
+               'integrator': 'whfast', 'dtP': 0.1,
+               'whfast': {'safe_mode': 0}, 'engulf': True,
+               'evolve': True, 'tides': True, 'taur': True,
+               'tmax': 100.e6, 'Nup': 1000,
+               'ref': 'performance/par100Myr/run*/output/seqtimes.txt'},
+    'MercNone': {'M0': 0.8868357536545315, 'R0': 0.33436215847158252,
+                 'bodies': INNER, 'integrator': 'whfast', 'dtP': 0.1,
+                 'whfast': {'safe_mode': 0},
+                 'engulf': True, 'tmax': 9.2e5, 'Nup': 1000,
+                 'ref': 'performance/parMercNone/run*/output/seqtimes.txt'},
+    'MercE': {'input': 'performance/parMercE/run01/input',
+              'T0': 12388.5e6, 'M0': 0.8868357536545315, 'bodies': INNER,
+              'integrator': 'whfast', 'dtP': 0.1,
+              'whfast': {'safe_mode': 0}, 'engulf': True,
+              'evolve': True, 'tmax': 9.2e5, 'Nup': 1000,
+              'ref': 'performance/parMercE/run*/output/seqtimes.txt'},
+    'MercT': {'M0': 0.8868357536545315, 'R0': 0.33436215847158252,
+              'bodies': INNER, 'integrator': 'whfast', 'dtP': 0.1,
+              'whfast': {'safe_mode': 0},
+              'engulf': True, 'tides': True, 'tau': 0.002643238893883989,
+              'tmax': 9.2e5, 'Nup': 1000,
+              'ref': 'performance/parMercT/run*/output/seqtimes.txt'},
+    'MercET': {'input': 'performance/parMercET/run01/input',
+               'T0': 12388.5e6, 'M0': 0.8868357536545315, 'bodies': INNER,
+               'integrator': 'whfast', 'dtP': 0.1,
+               'whfast': {'safe_mode': 0}, 'engulf': True,
+               'evolve': True, 'tides': True, 'tmax': 9.2e5, 'Nup': 1000,
+               'ref': 'performance/parMercET/run*/output/seqtimes.txt'},
+    'survey': {'input': 'survey/cherry-creek/tides_on/1Mearth/input',
+               'T0': 12388.5e6, 'M0': 0.8868357536545315,
+               'bodies': [{'m': 3e-6, 'a': 1.}], 'collision': 'direct',
+               'evolve': True, 'tides': True, 'tmax': 5e6, 'Nup': 50000,
+               'Nout': 10000,
+               'ref': 'survey/cherry-creek/tides_on/1Mearth/output/runtimes.txt'},
+    'engulfment': {'input': 'convergence/engulfment/cherry-creek/input',
+                   'T0': 12388.5e6, 'M0': 0.8868357536545315,
+                   'bodies': [{'m': 3e-6, 'a': 0.7, 'r': 4e-5}],
+                   'collision': 'direct', 'evolve': True, 'tides': True,
+                   'tmax': 5e6, 'Nup': 5000, 'Nout': 1000,
+                   'ref': 'convergence/engulfment/cherry-creek/1e3/output/'
+                          'runtimes.txt'},
+    'expansion': {'input': 'convergence/expansion/cherry-creek/input',
+                  'T0': 12388.5e6, 'M0': 0.8868357536545315,
+                  'bodies': [{'m': 1e-3, 'a': 5.}], 'collision': 'direct',
+                  'evolve': True, 'tides': True, 'tmax': 5e6, 'Nup': 5000,
+                  'Nout': 1000,
+                  'ref': 'convergence/expansion/cherry-creek/1e3/output/'
+                         'runtimes.txt'},
+    'jupiters': {'input': 'jupiters/input/eta_0.5',
+                 'T0': 1.2327372316208979E+10, 'M0': 9.8948880934062655E-01,
+                 'bodies': [{'m': 9.547919e-4, 'a': 1.7, 'r': 5.11347118e-9,
+                             'hash': 'Jupiter'}],
+                 'integrator': 'whfast', 'dt': 0.05,
+                 'whfast': {'safe_mode': 0, 'corrector': 11},
+                 'collision': 'direct', 'evolve': True, 'tides': True,
+                 'k2key': 'tctl_k2', 'tmax': 60e6, 'Nup': 10000},
+}
+
+def getspec(name, a0=None, **kwargs):
+    """
+    Return a copy of a registered scenario with optional overrides.
+
+    Parameters
+    ----------
+    name : str
+        Key of SCENARIOS.
+    a0 : float
+        Initial semimajor axis of the first planet (grid point of the
+        single-planet survey and jupiters sweeps).
+    **kwargs
+        Any other DEFAULTS key to override.
+    """
+    if name not in SCENARIOS:
+        raise KeyError('unknown scenario %r (choose from %s)'
+                       % (name, ', '.join(SCENARIOS)))
+    spec = copy.deepcopy(DEFAULTS)
+    spec.update(copy.deepcopy(SCENARIOS[name]))
+    spec.update(copy.deepcopy(kwargs))
+    spec['name'] = name
+    if a0 is not None:
+        spec['bodies'][0]['a'] = a0
+    return spec
+
+def gettrack(spec):
+    """
+    Load the scenario's MESA track, or return None for a static star.
+    """
+    if spec['input'] is None:
+        return None
+    return trk.loadtrack(os.path.join(ROOT, spec['input']))
+
+def makesim(spec, track=None, t=0., orbits=None, interps=None):
+    """
+    Main REBOUND sim setup for a scenario.
+
+    Parameters
+    ----------
+    spec : dict
+        Scenario from getspec.
+    track : dict
+        Output of gettrack (required if spec['evolve'] or the tides use
+        an interpolated tau).
+    t : float
+        Sim time to start at. Planets are placed on adiabatically expanded
+        orbits and those already inside the star are engulfed, so short
+        windows late in the track see the same system the full run would.
+    orbits : list of dict
+        Orbital elements at t (e.g. {'a': 1.8, 'e': 0.}) replacing those
+        of the first planets instead of the adiabatic expansion, to hand
+        over a state evolved elsewhere.
+    interps : tuple of reboundx.Interpolator
+        Mass, radius and tau Interpolators to reuse, e.g. from template(),
+        instead of building them from the track.
+
+    Returns
+    -------
+    dict
+        Run state: 'spec', 'sim', 'rebx', 'interps' (mass, radius, tau
+        Interpolators or None), 'cp' (index of closest surviving planet),
+        'alive' (mask of surviving planets, index 0 the star), 'emass'
+        (mass of engulfed planets), 'r' (distance to cp) and 'xyz' (the
+        position buffer of engulf()).
+    """
+    scale = 1.
+    sim = rebound.Simulation()
+    sim.units = ('yr', 'AU', 'Msun')
+    sim.integrator = spec['integrator']
+    if spec['evolve'] and t > 0.:
+        mt, ms = track['mtimes'], track['masses']
+        scale = np.interp(spec['T0'], mt, ms)/np.interp(spec['T0']+t, mt, ms)
+    sim.add(m=spec['M0']/scale, r=spec['R0'], hash='Sun')
+    for i, body in enumerate(spec['bodies']):
+        kwargs = dict(body)
+        kwargs['a'] = body['a']*scale
+        if orbits is not None and i < len(orbits):
+            kwargs.update(orbits[i])
+        sim.add(**kwargs)
+    sim.move_to_com()
+    sim.t = t
+    if spec['collision'] is not None:
+        sim.collision = spec['collision']
+    for key, value in spec['whfast'].items():
+        setattr(sim.ri_whfast, key, value)
+
+    rebx = reboundx.Extras(sim)
+    if spec['tides']:
+        tides = rebx.load_force("tides_constant_time_lag")
+        rebx.add_force(tides)
+    run = {'spec': spec, 'sim': sim, 'rebx': rebx, 'interps': None,
+           'cp': 1, 'alive': np.arange(sim.N) > 0, 'emass': 0., 'r': 1.,
+           'xyz': np.zeros((sim.N, 3))}
+    if spec['evolve'] or (spec['tides'] and spec['tau'] is None):
+        run['interps'] = interps or trk.interpolators(rebx, track,
+                                                      spec['interp'])
+
+    # update Sun's mass and radius accordingly, and set tidal parameters
+    ps = sim.particles
+    if spec['tides']:
+        try:
+            ps[0].params[spec['k2key']] = K2
+        except AttributeError:          # unregistered name in REBOUNDx >= 3.2
+            ps[0].params['tctl_k2'] = K2
+        # Omega is left at its default of 0 (a vector in newer REBOUNDx)
+        if spec['tau'] is not None:
+            ps[0].params["tctl_tau"] = spec['tau']
+    update(run)
+    if spec['engulf']:                  # against the star's radius at t
+        with unsafe.session(sim):
+            engulf(run)
+    if spec['dtP'] is not None:
+        sim.dt = spec['dtP']*ps[run['cp']].P
+    elif spec['dt'] is not None:
+        sim.dt = spec['dt']
+    return run
+
+def template(spec, track=None):
+    """
+    Build the parts of makesim shared by every point of a sweep once.
+
+    Building the three Interpolators (a spline over the whole track) is
+    most of makesim's cost. They don't depend on the sim: the Extras they
+    are created with only reports errors, so one set serves every clone.
+
+    Returns
+    -------
+    dict
+        'spec', 'track', 'interps' (None for a static star with fixed
+        tau) and the 'sim' and 'rebx' kept alive for them.
+    """
+    sim = rebound.Simulation()
+    rebx = reboundx.Extras(sim)
+    interps = None
+    if spec['evolve'] or (spec['tides'] and spec['tau'] is None):
+        interps = trk.interpolators(rebx, track, spec['interp'])
+    return {'spec': spec, 'track': track, 'sim': sim, 'rebx': rebx,
+            'interps': interps}
+
+def clone(tmpl, a0=None, t=0., orbits=None, **kwargs):
+    """
+    Set up one sweep point from a template: a fresh Simulation and Extras
+    with the template's Interpolators, differing only in the planets.
+
+    Parameters
+    ----------
+    tmpl : dict
+        Output of template().
+    a0 : float
+        Initial semimajor axis of the first planet.
+    **kwargs
+        Any other DEFAULTS key to override (not 'input' or 'interp').
+    """
+    spec = copy.deepcopy(tmpl['spec'])
+    spec.update(copy.deepcopy(kwargs))
+    if a0 is not None:
+        spec['bodies'][0]['a'] = a0
+    return makesim(spec, tmpl['track'], t, orbits, tmpl['interps'])
+
+def separations(run):
+    """
+    Return the distances of all particles from the star (index 0 is 0),
+    from one bulk copy of the positions into run['xyz'].
+    """
+    xyz = run['xyz']
+    run['sim'].serialize_particle_data(xyz=xyz)
+    return np.sqrt(np.sum((xyz - xyz[0])**2, axis=1))
+
+def engulf(run):
+    """
+    Engulf every surviving planet inside the star.
+
+    All star-planet separations are computed in one vectorized pass, so
+    crossing or scattered orbits and simultaneous engulfments are caught.
+    Follows the performance drivers otherwise: an engulfed planet's mass is
+    zeroed and added to the star and it is moved to the origin. The closest
+    survivor becomes run['cp'] and the timestep is adjusted to it.
+
+    Returns
+    -------
+    int
+        Number of planets engulfed.
+    """
+    sim, alive = run['sim'], run['alive']
+    ps = sim.particles
+    d = separations(run)
+    inside = np.flatnonzero(alive & (d <= ps[0].r))
+    for i in inside.tolist():
+        run['emass'] += ps[i].m         # add engulfed planet mass
+        ps[i].m = 0                     # zero planet mass and move to COM
+        ps[i].x, ps[i].y, ps[i].z = 0, 0, 0
+    alive[inside] = False
+    if alive.any():                     # closest survivor
+        run['cp'] = int(np.flatnonzero(alive)[np.argmin(d[alive])])
+        run['r'] = d[run['cp']]
+        if inside.size and run['spec']['dtP'] is not None:
+            sim.dt = run['spec']['dtP']*ps[run['cp']].P # adjust timestep
+    else:                               # no planets left to raise tides
+        run['r'] = 0.
+    return inside.size
+
+def update(run):
+    """
+    Evolve the star to the current sim time and recenter to COM.
+
+    Runs in an unsafe.session, so WHFast may run with safe_mode = 0.
+    """
+    spec, sim, rebx = run['spec'], run['sim'], run['rebx']
+    ps = sim.particles
+    with unsafe.session(sim):
+        if spec['engulf']:
+            engulf(run)
+        if run['interps'] is not None:
+            starmass, starradius, startau = run['interps']
+            age = spec['T0'] + sim.t
+            if spec['evolve']:
+                ps[0].m = starmass.interpolate(rebx, t=age) + run['emass']
+                ps[0].r = starradius.interpolate(rebx, t=age)
+            if spec['tides'] and spec['tau'] is None:
+                tau = startau.interpolate(rebx, t=age)
+                if spec['taur']:
+                    tau *= run['r']     # Eq. 2
+                ps[0].params["tctl_tau"] = tau
+        sim.move_to_com()
+
+def advance(run, t):
+    """
+    Integrate to sim time t and apply one parameter update.
+
+    Raises rebound.Collision like the drivers when spec['collision'] is set.
+    """
+    run['sim'].integrate(t)
+    update(run)
+
+def runpoint(spec, track=None, interps=None):
+    """
+    Integrate one grid point like the drivers.
+
+    Returns
+    -------
+    dict
+        'engulfed', 'tstop' (sim time the run stopped), 'ts' and 'a'
+        (semiaxis at each update time, 0 after a collision), 'walltime'.
+    """
+    timer_start = time.perf_counter()
+    run = makesim(spec, track, interps=interps)
+    ps = run['sim'].particles
+    ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    a = np.zeros(ts.size)
+    engulfed = False
+    try:
+        for j, t in enumerate(ts):
+            advance(run, t)
+            a[j] = ps[1].a
+    except rebound.Collision:
+        engulfed = True
+    return {'engulfed': engulfed, 'tstop': run['sim'].t, 'ts': ts, 'a': a,
+            'walltime': time.perf_counter() - timer_start}
@@ -0,0 +1,269 @@
+"""
+Orbit-averaged (secular) engine for tidal decay plus adiabatic mass loss.
+
+Instead of integrating every orbit, the semimajor axis and eccentricity of
+a single planet follow the orbit-averaged equations of the constant time
+lag model (Hut 1981) with the star's spin Omega = 0, as in the drivers,
+
+    da/dt|tide = -6 (k2/T) q (1+q) (R/a)^8 a f1(e^2)/(1-e^2)^(15/2)
+    de/dt      = -27 (k2/T) q (1+q) (R/a)^8 e f3(e^2)/(1-e^2)^(13/2)
+
+with k2/T = k2 tau G M/R^3 and q = m/M, plus adiabatic mass loss, which
+conserves a (M + m). The star's M, R and tau come from the same MESA
+track and Eq. 2 as the drivers (tau scaled by a where spec['taur']).
+A whole grid of a0 is integrated at once with a vectorized adaptive
+Dormand-Prince 5(4) scheme, each grid point with its own step size; the
+planet is engulfed once its pericenter reaches the stellar surface.
+
+usage: python tools/secular.py [scenario] [--grid START STOP STEP]
+                               [--rtol R] [--outdir DIR] [--validate DIR]
+"""
+import argparse
+import glob
+import os
+import re
+import time
+import numpy as np
+import scenarios as scn
+import track as trk
+
+# Dormand-Prince 5(4) tableau
+C = np.array([0., 1/5, 3/10, 4/5, 8/9, 1., 1.])
+A = [[],
+     [1/5],
+     [3/40, 9/40],
+     [44/45, -56/15, 32/9],
+     [19372/6561, -25360/2187, 64448/6561, -212/729],
+     [9017/3168, -355/33, 46732/5247, 49/176, -5103/18656],
+     [35/384, 0., 500/1113, 125/192, -2187/6784, 11/84]]
+B5 = np.array(A[6] + [0.])
+B4 = np.array([5179/57600, 0., 7571/16695, 393/640, -92097/339200,
+               187/2100, 1/40])
+
+def star(spec, track, t):
+    """
+    Return the star's mass, radius and tidal time lag at sim time(s) t.
+    """
+    t = np.asarray(t, float)
+    if spec['evolve']:
+        age = spec['T0'] + t
+        M = np.interp(age, track['mtimes'], track['masses'])
+        R = np.interp(age, track['rtimes'], track['radii'])
+    else:
+        M = np.full(t.shape, spec['M0'])
+        R = np.full(t.shape, spec['R0'])
+    if spec['tau'] is not None:
+        tau = np.full(t.shape, spec['tau'])
+    else:
+        tau = np.interp(spec['T0'] + t, track['ltimes'], track['taus'])
+    return M, R, tau
+
+def rates(a, e, M, m, R, tau, k2=scn.K2):
+    """
+    Orbit-averaged tidal da/dt and de/dt (Hut 1981) for a non-rotating star.
+    """
+    e2 = e**2
+    f1 = 1 + 31/2*e2 + 255/8*e2**2 + 185/16*e2**3 + 25/64*e2**4
+    f3 = 1 + 15/4*e2 + 15/8*e2**2 + 5/64*e2**3
+    q = m/M
+    fac = k2*tau*trk.G*M/R**3*q*(1 + q)*(R/a)**8
+    dadt = -6*fac*a*f1/(1 - e2)**7.5
+    dedt = -27*fac*e*f3/(1 - e2)**6.5
+    return dadt, dedt
+
+def evolve(spec, a0s, track=None, ts=None, e0=0., rtol=1e-8, atol=1e-12):
+    """
+    Integrate the secular equations for a grid of initial semimajor axes.
+
+    Parameters
+    ----------
+    spec : dict
+        Single-planet scenario from scenarios.getspec.
+    a0s : array_like
+        Initial semimajor axes (AU).
+    track : dict
+        Output of scenarios.gettrack.
+    ts : array_like
+        Output times (default: the scenario's Nup update times).
+    e0 : float or array_like
+        Initial eccentricity.
+
+    Returns
+    -------
+    dict
+        'ts', 'a' and 'e' (one row per a0, 0 after engulfment like the
+        drivers' output), 'tengulf' (sim time of engulfment, nan for
+        survivors) and 'steps' (accepted steps per a0).
+    """
+    if len(spec['bodies']) != 1:
+        raise ValueError('%s: the secular engine supports single-planet '
+                         'scenarios only' % spec['name'])
+    body = spec['bodies'][0]
+    m, rp = body['m'], body.get('r', 0.)
+    if ts is None:
+        ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    ts = np.asarray(ts, float)
+    a0s = np.atleast_1d(np.asarray(a0s, float))
+    n = a0s.size
+    M = star(spec, track, np.full(n, ts[0]))[0]
+
+    def deriv(t, y):                    # y = (a (M + m), e)
+        M, R, tau = star(spec, track, t)
+        if not spec['tides']:
+            tau = np.zeros_like(t)
+        a = y[0]/(M + m)
+        if spec['taur']:
+            tau = tau*a                 # Eq. 2
+        dadt, dedt = rates(a, y[1], M, m, R, tau)
+        return np.array([(M + m)*dadt, dedt])
+
+    y = np.array([a0s*(M + m), np.broadcast_to(e0, n).astype(float)])
+    t = np.full(n, ts[0])
+    h = np.full(n, (ts[-1] - ts[0])/max(ts.size - 1, 1))
+    alive = np.ones(n, dtype=bool)
+    tengulf = np.full(n, np.nan)
+    steps = np.zeros(n, dtype=int)
+    a = np.zeros((n, ts.size))
+    e = np.zeros((n, ts.size))
+    for j, tout in enumerate(ts):
+        while True:
+            act = alive & (t < tout)
+            if not act.any():
+                break
+            ti, yi = t[act], y[:, act]
+            hi = np.minimum(h[act], tout - ti)
+            k = []
+            for s in range(7):
+                ys = yi + hi*sum(A[s][r]*k[r] for r in range(s)) if s else yi
+                k.append(deriv(ti + C[s]*hi, ys))
+            y5 = yi + hi*sum(B5[s]*k[s] for s in range(7))
+            err = hi*sum((B5[s] - B4[s])*k[s] for s in range(7))
+            scale = atol + rtol*np.maximum(np.abs(yi), np.abs(y5))
+            norm = np.max(np.abs(err)/scale, axis=0)
+            ok = norm <= 1.
+            grow = np.clip(0.9*np.maximum(norm, 1e-10)**-0.2, 0.2, 5.)
+            idx = np.flatnonzero(act)
+            clipped = ok & (hi < h[idx])  # step cut short at tout
+            h[idx] = np.where(clipped, np.maximum(h[idx], hi*grow), hi*grow)
+            acc = idx[ok]
+            t[acc] = ti[ok] + hi[ok]
+            y[:, acc] = y5[:, ok]
+            steps[acc] += 1
+            # engulfment: pericenter at the stellar surface
+            Mj, Rj, _ = star(spec, track, t[acc])
+            aj = y[0, acc]/(Mj + m)
+            gone = aj*(1 - y[1, acc]) <= Rj + rp
+            alive[acc[gone]] = False
+            tengulf[acc[gone]] = t[acc[gone]]
+        Mj = star(spec, track, np.full(n, tout))[0]
+        a[:, j] = np.where(alive, y[0]/(Mj + m), 0.)
+        e[:, j] = np.where(alive, y[1], 0.)
+    return {'ts': ts, 'a': a, 'e': e, 'tengulf': tengulf, 'steps': steps}
+
+def writetxt(times, values, path='data.txt'):
+    with open(path, 'w') as f: # will overwrite existing file
+        for i in range(times.size):
+            f.write('%.16E\t%.16E\n' % (times[i], values[i]))
+
+def loadoutput(outdir):
+    """
+    Load the drivers' '<a0>au.txt' outputs (sim time vs semiaxis).
+
+    Returns
+    -------
+    dict
+        (times, semiaxes) keyed by a0.
+    """
+    runs = {}
+    for fname in glob.glob(os.path.join(outdir, '*au.txt')):
+        match = re.fullmatch(r'([\d.]+)au\.txt', os.path.basename(fname))
+        if match is None:
+            continue
+        data = np.loadtxt(fname)
+        runs[float(match.group(1))] = (data[:, 0], data[:, 1])
+    return runs
+
+def validate(spec, outdir, track=None, rtol=1e-8):
+    """
+    Cross-validate the secular engine against recorded N-body outputs.
+
+    The drivers record a at the top of each update loop, i.e. row j holds
+    a at ts[j-1]; runs stopped by a collision are 0 from then on.
+
+    Returns
+    -------
+    list of tuple
+        (a0, engulfed N-body, engulfed secular, last N-body time alive,
+        secular engulfment time, max relative a difference while both are
+        alive) per recorded run, sorted by a0.
+    """
+    runs = loadoutput(outdir)
+    a0s = np.array(sorted(runs))
+    ts = runs[a0s[0]][0]
+    trec = np.concatenate([[ts[0]], ts[:-1]])
+    res = evolve(spec, a0s, track, trec, rtol=rtol)
+    rows = []
+    for i, a0 in enumerate(a0s):
+        anb = runs[a0][1]
+        both = (anb > 0) & (res['a'][i] > 0)
+        dmax = np.max(np.abs(res['a'][i][both]/anb[both] - 1))
+        rows.append((a0, anb[-1] == 0, res['a'][i][-1] == 0,
+                     trec[anb > 0][-1], res['tengulf'][i], dmax))
+    return rows
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Orbit-averaged tidal decay '
+                                     'and mass loss over a grid of a0.')
+    parser.add_argument('name', nargs='?', default='jupiters',
+                        metavar='scenario',
+                        help='single-planet scenario (default: jupiters)')
+    parser.add_argument('--grid', type=float, nargs=3, default=None,
+                        metavar=('START', 'STOP', 'STEP'),
+                        help='np.arange grid of a0 in AU')
+    parser.add_argument('--rtol', type=float, default=1e-8)
+    parser.add_argument('--outdir', default=None,
+                        help='write <a0>au.txt semiaxis files like the drivers')
+    parser.add_argument('--validate', default=None, metavar='DIR',
+                        help='compare against N-body outputs in DIR, e.g. '
+                             'jupiters/output')
+    args = parser.parse_args()
+    spec = scn.getspec(args.name)
+    track = scn.gettrack(spec)
+
+    if args.validate is not None:
+        timer_start = time.perf_counter()
+        rows = validate(spec, args.validate, track, args.rtol)
+        print('________________________________')
+        print('Secular vs N-body: %s\n' % args.validate)
+        print('    a0/au  engulfed (N-body/secular)  t_end/yr (N-body/'
+              'secular)  max |da/a|')
+        for a0, enb, esec, tnb, tsec, dmax in rows:
+            print('    %.2f   %-5s / %-5s  %.4e / %.4e  %.2e'
+                  % (a0, enb, esec, tnb if enb else np.nan, tsec, dmax))
+        agree = sum(r[1] == r[2] for r in rows)
+        print('\n    Outcomes agree   : %d/%d' % (agree, len(rows)))
+        print('    Walltime Used    : %.2f s' % (time.perf_counter()
+                                                 - timer_start))
+        print('________________________________')
+    else:
+        a0s = (np.arange(*args.grid) if args.grid is not None
+               else np.array([spec['bodies'][0]['a']]))
+        timer_start = time.perf_counter()
+        res = evolve(spec, a0s, track, rtol=args.rtol)
+        runtime = time.perf_counter() - timer_start
+        if args.outdir is not None:
+            os.makedirs(args.outdir, exist_ok=True)
+            for a0, a in zip(a0s, res['a']):
+                writetxt(res['ts'], a, os.path.join(args.outdir,
+                                                    '{:.2f}au.txt'.format(a0)))
+        engulfed = ~np.isnan(res['tengulf'])
+        print('________________________________')
+        print('Secular run: %s, %d grid points\n' % (args.name, a0s.size))
+        if engulfed.any():
+            print('    Largest engulfed : %.4f au' % a0s[engulfed].max())
+        if (~engulfed).any():
+            print('    Smallest survivor: %.4f au' % a0s[~engulfed].min())
+        print('    Steps (max)      : %d' % res['steps'].max())
+        print('    Walltime Used    : %.2f s' % runtime)
+        print('________________________________')
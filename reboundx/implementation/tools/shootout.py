@@ -0,0 +1,257 @@
+"""
+Integrator shoot-out: one scenario under several integrators and settings.
+
+Each configuration (the scenario's own production settings; IAS15;
+MERCURIUS at each timestep fraction dtP of the inner period; WHFast at
+each dtP, symplectic corrector order and safe_mode) integrates the same
+scenario with the energy monitor of accuracy.py and reports
+
+    t_engulf   sim time of the first engulfment (collision or driver-side
+               engulf), '-' if every planet survives
+    a_final    semiaxis of the first planet at the end (0 once engulfed)
+    max |dE|   integration error net of mass-loss jumps and tidal work
+    walltime   time spent in sim.integrate and the parameter updates (the
+               monitor's own cost is excluded)
+
+The configurations no other one beats in both wall time and energy error
+form the Pareto front, marked '*' in the table and joined in the plot of
+walltime against max |dE| (--plot, needs matplotlib). The reference is
+the most accurate of the configurations that ran longest (a run stopped
+early by a collision has accumulated less error), and a configuration
+reaches the same outcome if it engulfs or spares the planet like the
+reference and its t_engulf and a_final agree with the reference's to a
+relative --tol.
+
+usage: python tools/shootout.py scenario [--tmax T] [--a0 AU]
+                                [--integrators NAME ...] [--dtP F ...]
+                                [--corrector N ...] [--safe-mode 0|1 ...]
+                                [--tol F] [--every N] [--substeps N]
+                                [--plot FILE] [--out FILE]
+"""
+import argparse
+import copy
+import itertools
+import time
+import numpy as np
+import rebound
+import accuracy as acc
+import scenarios as scn
+
+INTEGRATORS = ('ias15', 'mercurius', 'whfast')
+
+def configs(spec, integrators=INTEGRATORS, dtPs=(0.1, 0.05),
+            correctors=(0, 11), safemodes=(0, 1), production=True):
+    """
+    Return (label, spec) for every configuration of the shoot-out.
+
+    The scenario's own settings come first if production; IAS15 is
+    adaptive and run once; MERCURIUS once per dtP; WHFast for every
+    combination of dtP, corrector and safe_mode (the updates run in an
+    unsafe.session, so safe_mode 0 is safe).
+    """
+    out = []
+    if production:
+        out.append(('%s production' % spec['integrator'],
+                    copy.deepcopy(spec)))
+    for name in integrators:
+        if name == 'ias15':
+            grid = [((), {})]
+        elif name == 'mercurius':
+            grid = [(('dtP=%g' % f,), {'dtP': f}) for f in dtPs]
+        elif name == 'whfast':
+            grid = [(('dtP=%g' % f, 'corr=%d' % c, 'safe=%d' % s),
+                     {'dtP': f, 'whfast': {'corrector': c, 'safe_mode': s}})
+                    for f, c, s in itertools.product(dtPs, correctors,
+                                                     safemodes)]
+        else:
+            raise ValueError('unknown integrator %r (choose from %s)'
+                             % (name, ', '.join(INTEGRATORS)))
+        for words, kwargs in grid:
+            s = copy.deepcopy(spec)
+            s.update({'integrator': name, 'dt': None, 'dtP': None,
+                      'whfast': {}})
+            s.update(kwargs)
+            out.append((' '.join((name,) + words), s))
+    return out
+
+def shoot(spec, track=None, every=1, substeps=acc.SUBSTEPS):
+    """
+    Run a scenario to tmax with the energy monitor.
+
+    Returns
+    -------
+    dict
+        'tengulf' (None if nothing was engulfed), 'afinal', 'engulfed'
+        (number of planets lost), 'tstop', 'dE', 'dL' (max relative
+        errors) and 'walltime' (s, integration and updates only).
+    """
+    run = scn.makesim(spec, track)
+    sim = run['sim']
+    mon = acc.start(sim)
+    ts = np.linspace(0., spec['tmax'], spec['Nup'])
+    walltime, tengulf, collided = 0., None, False
+    def update():
+        nonlocal walltime
+        start = time.perf_counter()
+        scn.update(run)
+        walltime += time.perf_counter() - start
+    for t in ts[1:]:
+        start, cost = time.perf_counter(), 0.
+        try:
+            cost = acc.integrate(mon, sim, t, substeps)
+        except rebound.Collision:
+            collided = True
+        walltime += time.perf_counter() - start - cost
+        if collided:
+            tengulf = sim.t
+            break
+        alive = run['alive'].sum()
+        acc.sample(mon, sim, update, every)
+        if tengulf is None and run['alive'].sum() < alive:
+            tengulf = sim.t
+    dE, dL = acc.summary(mon)
+    lost = int((~run['alive'][1:]).sum()) + collided
+    first = run['alive'][1] and not collided
+    return {'tengulf': tengulf, 'afinal': sim.particles[1].a if first else 0.,
+            'engulfed': lost, 'tstop': sim.t, 'dE': dE, 'dL': dL,
+            'walltime': walltime}
+
+def reference(results):
+    """
+    Return the index of the most accurate result among those that reached
+    the latest stop time.
+    """
+    tstop = max(r['tstop'] for r in results)
+    full = [i for i, r in enumerate(results)
+            if np.isclose(r['tstop'], tstop, rtol=1e-9)]
+    return min(full, key=lambda i: results[i]['dE'])
+
+def outcome(r, ref, tol=1e-2):
+    """
+    Compare a result's outcome with the reference's.
+
+    Returns
+    -------
+    tuple
+        (same, relative difference in t_engulf, in a_final); a difference
+        is nan where it is undefined (nothing engulfed, a_final = 0).
+    """
+    if (r['tengulf'] is None) != (ref['tengulf'] is None):
+        return False, np.nan, np.nan
+    dt = (np.nan if ref['tengulf'] is None
+          else abs(r['tengulf']/ref['tengulf'] - 1.))
+    da = np.nan if ref['afinal'] == 0. else abs(r['afinal']/ref['afinal'] - 1.)
+    if (r['afinal'] == 0.) != (ref['afinal'] == 0.):
+        return False, dt, np.nan
+    return not (dt > tol or da > tol), dt, da
+
+def pareto(results):
+    """
+    Return the mask of results on the Pareto front of wall time and dE.
+    """
+    cost = np.array([r['walltime'] for r in results])
+    err = np.array([r['dE'] for r in results])
+    dominated = [np.any((cost <= c) & (err <= e) & ((cost < c) | (err < e)))
+                 for c, e in zip(cost, err)]
+    return ~np.array(dominated, dtype=bool)
+
+def plot(labels, results, front, path, title=''):
+    """
+    Save the wall time vs max |dE| scatter with the Pareto front joined.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    cost = np.array([r['walltime'] for r in results])
+    err = np.array([max(r['dE'], 1e-17) for r in results]) # log axis
+    fig, ax = plt.subplots(figsize=(8, 6))
+    for name, marker in zip(INTEGRATORS, 'o^s'):
+        sel = [i for i, label in enumerate(labels)
+               if label.split()[0] == name]
+        if sel:
+            ax.scatter(cost[sel], err[sel], marker=marker, label=name)
+    order = np.flatnonzero(front)[np.argsort(cost[front])]
+    ax.step(cost[order], err[order], where='post', color='k', lw=0.8,
+            label='Pareto front')
+    for i, label in enumerate(labels):
+        ax.annotate(label.split(' ', 1)[-1], (cost[i], err[i]), fontsize=6,
+                    xytext=(3, 3), textcoords='offset points')
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('wall time / s')
+    ax.set_ylabel('max |dE/E0|')
+    ax.set_title(title)
+    ax.legend()
+    fig.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare integrators on a '
+                                     'scenario: outcome, energy error and '
+                                     'wall time.')
+    parser.add_argument('name', metavar='scenario',
+                        help='one of: %s' % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--tmax', type=float, default=None,
+                        help='integrate only to this sim time (yr)')
+    parser.add_argument('--a0', type=float, default=None)
+    parser.add_argument('--integrators', nargs='+', default=INTEGRATORS,
+                        choices=INTEGRATORS)
+    parser.add_argument('--dtP', type=float, nargs='+', default=[0.1, 0.05],
+                        help='timesteps as fractions of the inner period')
+    parser.add_argument('--corrector', type=int, nargs='+', default=[0, 11],
+                        help='WHFast symplectic corrector orders')
+    parser.add_argument('--safe-mode', type=int, nargs='+', default=[0, 1],
+                        choices=[0, 1])
+    parser.add_argument('--tol', type=float, default=1e-2,
+                        help='relative tolerance on t_engulf and a_final')
+    parser.add_argument('--every', type=int, default=1,
+                        help='record the errors every N updates')
+    parser.add_argument('--substeps', type=int, default=acc.SUBSTEPS,
+                        help='tidal power samples per update interval')
+    parser.add_argument('--plot', default=None,
+                        help='save the Pareto plot to this file')
+    parser.add_argument('--out', default=None,
+                        help='write the results table to this file')
+    args = parser.parse_args()
+
+    spec = scn.getspec(args.name, a0=args.a0)
+    if args.tmax is not None:           # keep the update interval
+        spec['Nup'] = max(int(spec['Nup']*args.tmax/spec['tmax']), 2)
+        spec['tmax'] = args.tmax
+    track = scn.gettrack(spec)
+    labels, results = [], []
+    for label, s in configs(spec, args.integrators, args.dtP,
+                            args.corrector, args.safe_mode):
+        print('running %s' % label, flush=True)
+        labels.append(label)
+        results.append(shoot(s, track, args.every, args.substeps))
+    front = pareto(results)
+    ref = results[reference(results)]
+    same = [outcome(r, ref, args.tol) for r in results]
+
+    lines = ['%-34s %12s %10s %9s %9s %10s %10s %3s'
+             % ('configuration', 't_engulf/yr', 'a_final/au', 'dt_engulf',
+                'da_final', 'max|dE|', 'walltime/s', 'PF')]
+    for label, r, (ok, dt, da), f in zip(labels, results, same, front):
+        lines.append('%-34s %12s %10.6f %9.2e %9.2e %10.3e %10.3f %3s'
+                     % (label, '-' if r['tengulf'] is None
+                        else '%.6e' % r['tengulf'], r['afinal'], dt, da,
+                        r['dE'], r['walltime'], '*' if f else ''))
+    if args.out is not None:
+        with open(args.out, 'w') as f: # will overwrite existing file
+            f.write('\n'.join(lines) + '\n')
+    if args.plot is not None:
+        plot(labels, results, front, args.plot,
+             '%s, t = %.3g yr' % (args.name, spec['tmax']))
+    print('________________________________')
+    print('Integrator shoot-out: %s to %.4e yr\n' % (args.name, spec['tmax']))
+    for line in lines:
+        print('    ' + line)
+    print('\n    Reference        : %s' % labels[results.index(ref)])
+    print('    Same outcome     : %d of %d configurations (tol %g)'
+          % (sum(ok for ok, _, _ in same), len(results), args.tol))
+    for label, (ok, _, _) in zip(labels, same):
+        if not ok:
+            print('    Differs          : %s' % label)
+    print('________________________________')
@@ -0,0 +1,329 @@
+"""
+Short "smoke" benchmarks that extrapolate to the production wall time.
+
+Each scenario is integrated over two short windows of its track, one at the
+start of the run (quiet RGB) and one at its end or the TRGB, whichever comes
+first. The measured cost per step and per parameter update is combined with
+the number of steps the full run takes to predict its wall time. The stated
+error is the 1-sigma spread of the measurement and extrapolation on this
+machine; it does not cover differences to the production node.
+
+usage: python tools/smoke.py [scenario ...] [--steps N] [--chunks N]
+                             [--updates N] [--a0 AU] [--setup N]
+"""
+import argparse
+import glob
+import os
+import time
+import numpy as np
+import psutil
+import rebound
+import scenarios as scn
+import track as trk
+
+def memory_usage_psutil():
+    process = psutil.Process(os.getpid())
+    mem = process.memory_info()[0] / float(2 ** 20)
+    return mem # return the memory usage in MB
+
+def hms(seconds):
+    h = seconds // 3600
+    remainder = seconds - h*3600
+    m = remainder // 60
+    s = remainder - m*60
+    return '%02d:%02d:%02d'%(h, m, s)
+
+def period(a, m):
+    return 2*np.pi*np.sqrt(a**3/trk.G/m)
+
+def window(spec, track, t, steps=200000, chunks=10, updates=200):
+    """
+    Measure the integration and parameter update cost at sim time t.
+
+    Parameters
+    ----------
+    spec : dict
+        Scenario from scenarios.getspec.
+    track : dict
+        Output of scenarios.gettrack.
+    t : float
+        Sim time at which the window starts.
+    steps : int
+        Approximate number of integrator steps to time.
+    chunks : int
+        Number of equal integrate() calls the steps are spread over; the
+        per-chunk costs give the statistical error.
+    updates : int
+        Number of parameter updates (plus recording) to time.
+
+    Returns
+    -------
+    dict
+        'step' (s per step, one entry per chunk), 'orbit' (steps per
+        inner orbit), 'x' (R/a of the closest survivor at the end of the
+        window), 'update' (s per update), 'setup' (s to build the
+        sim and its Interpolators), 'span' (sim time integrated) and 'cp'
+        (index of the closest surviving planet).
+    """
+    w0 = time.perf_counter()
+    run = scn.makesim(spec, track, t)
+    setup = time.perf_counter() - w0
+    sim = run['sim']
+    ps = sim.particles
+    P = ps[run['cp']].P
+    if sim.integrator == 'ias15':      # probe the adaptive step length
+        s0 = sim.steps_done
+        sim.integrate(sim.t + P)
+        chunk = P*steps/chunks/max(sim.steps_done - s0, 1)
+    else:
+        chunk = sim.dt*steps/chunks
+    costs = []
+    nsteps, span = 0, 0.
+    try:
+        for k in range(chunks):
+            s0, t0 = sim.steps_done, sim.t
+            w0 = time.perf_counter()
+            sim.integrate(sim.t + chunk, exact_finish_time=0)
+            costs.append((time.perf_counter() - w0)/(sim.steps_done - s0))
+            nsteps += sim.steps_done - s0
+            span += sim.t - t0
+    except rebound.Collision:
+        pass
+    if not costs:
+        raise RuntimeError('%s: planet engulfed at the start of the window'
+                           % spec['name'])
+    dtup = spec['tmax']/max(spec['Nup']-1, 1)
+    w0 = time.perf_counter()
+    for k in range(updates):
+        sim.t += dtup/updates           # walk the track without integrating
+        scn.update(run)
+        [p.a for p in ps[1:]]           # record
+        memory_usage_psutil()
+    cup = (time.perf_counter() - w0)/updates
+    return {'step': np.array(costs), 'orbit': nsteps/span*P,
+            'x': ps[0].r/ps[run['cp']].a, 'update': cup, 'setup': setup,
+            'span': span, 'cp': run['cp']}
+
+def predictsteps(spec, track, orbit=None, n=4097):
+    """
+    Predict the number of integrator steps of the full run.
+
+    Planets follow adiabatic mass loss, a(t) = a0 M(T0)/M(t), and are
+    engulfed once the stellar radius reaches them. Fixed-step integrators
+    take dt = dtP P of the closest survivor, set at each engulfment like
+    the drivers do; adaptive ones take orbit(R/a) steps per inner orbit.
+
+    Returns
+    -------
+    tuple
+        Number of steps taken while each planet is the closest survivor
+        (numpy.ndarray, planet 1 first) and the sim time at which the run
+        ends (tmax, or the first contact for runs that stop on collision).
+    """
+    ts = np.linspace(0., spec['tmax'], n)
+    if spec['evolve']:
+        M = np.interp(spec['T0']+ts, track['mtimes'], track['masses'])
+        R = np.interp(spec['T0']+ts, track['rtimes'], track['radii'])
+    else:
+        M = np.full(n, spec['M0'])
+        R = np.full(n, spec['R0'])
+    a = np.array([b['a'] for b in spec['bodies']])[:, None]*M[0]/M
+    if spec['collision'] is not None:   # run stops at the first contact
+        running = np.logical_and.accumulate((a > R).all(axis=0))
+        alive = np.repeat(running[None, :], len(a), axis=0)
+    else:                               # drivers never engulf the last one
+        alive = np.logical_and.accumulate(a > R, axis=1)
+        alive[-1] = True
+        running = np.ones(n, dtype=bool)
+    cp = np.argmax(alive, axis=0)       # closest survivor at each time
+    ainner = a[cp, np.arange(n)]
+    if spec['dt'] is not None:
+        rate = np.full(n, 1./spec['dt'])
+    elif spec['dtP'] is not None:
+        dt = np.zeros(n)
+        for k in np.unique(cp[running]):
+            first = np.argmax(cp == k)  # dt set when planet k becomes closest
+            dt[cp == k] = spec['dtP']*period(ainner[first], M[first])
+        rate = 1./np.where(dt > 0, dt, np.inf)
+    else:
+        rate = orbit(R/ainner)/period(ainner, M)
+    rate[~running] = 0.
+    tend = ts[running][-1] if running.any() else 0.
+    steps = (rate[1:] + rate[:-1])/2*np.diff(ts) # trapezoid rule
+    # plus one step to finish exactly at each update time
+    steps += running[1:]*np.diff(ts)*spec['Nup']/spec['tmax']
+    return np.bincount(cp[:-1], weights=steps, minlength=len(a)), tend
+
+def reference(spec):
+    """
+    Return recorded production wall times (s) for the scenario, if any.
+    """
+    if spec['ref'] is None:
+        return np.array([])
+    times = []
+    for fname in sorted(glob.glob(os.path.join(scn.ROOT, spec['ref']))):
+        data = np.loadtxt(fname, ndmin=2)
+        if spec['name'] == 'survey':   # one row per init_a
+            a0 = spec['bodies'][0]['a']
+            data = data[np.isclose(data[:, 0], a0)]
+        times.extend(data[:, 1])
+    return np.array(times)
+
+def smoke(spec, steps=200000, chunks=10, updates=200):
+    """
+    Run both windows of a scenario and predict its production wall time.
+
+    Returns
+    -------
+    dict
+        'predict' (s), 'error' (relative, 1 sigma), 'tend', 'steps' and
+        the two 'windows'.
+    """
+    track = scn.gettrack(spec)
+    tlate = spec['tmax']
+    if track is not None:
+        tlate = min(tlate, trk.trgb(track) - spec['T0'])
+    early = window(spec, track, 0., steps, chunks, updates)
+    # near-TRGB window, ending where the run or the track's RGB does
+    late = window(spec, track, max(tlate - 1.5*early['span'], 0.), steps,
+                  chunks, updates)
+    wins = [early, late]
+
+    # cost per step while each planet is the closest survivor: measured
+    # directly where a window saw that configuration, else the mean of both
+    # windows with their half-difference as the error
+    costs = [w['step'].mean() for w in wins]
+    stats = [w['step'].std()/np.sqrt(w['step'].size) for w in wins]
+    cstep = np.full(len(spec['bodies']), np.mean(costs))
+    estep = np.full(cstep.size, np.hypot(np.abs(costs[0] - costs[1])/2,
+                                         np.hypot(*stats)/2))
+    if early['cp'] != late['cp']:
+        for w, c, e in zip(wins, costs, stats):
+            cstep[w['cp']-1], estep[w['cp']-1] = c, e
+    # adaptive steps per orbit grow with the tidal force; fit a power law
+    # in R/a through both windows, bracketed by the mean of the two
+    (oe, xe), (ol, xl) = [(w['orbit'], w['x']) for w in wins]
+    slope = np.log(ol/oe)/np.log(xl/xe) if not np.isclose(xl, xe) else 0.
+    orbit = lambda x: oe*(x/xe)**slope
+    eorbit = 0.
+    if spec['dt'] is None and spec['dtP'] is None:
+        flat = predictsteps(spec, track, lambda x: (oe + ol)/2)[0].sum()
+        fit = predictsteps(spec, track, orbit)[0].sum()
+        eorbit = np.abs(fit - flat)/2/fit
+    cup = np.mean([w['update'] for w in wins])
+    eup = np.abs(early['update'] - late['update'])/2
+    steps, tend = predictsteps(spec, track, orbit)
+    nup = spec['Nup']*tend/spec['tmax']
+    tstep = np.sum(steps*cstep)
+    total = early['setup'] + tstep + nup*cup
+    error = np.sqrt(np.sum(steps*estep)**2 + (tstep*eorbit)**2
+                    + (nup*eup)**2)/total
+    return {'predict': total, 'error': error, 'tend': tend,
+            'steps': steps.sum(), 'windows': wins}
+
+def runtimes(spec, a0s, steps=50000, chunks=5, updates=100):
+    """
+    Predict the wall time of each grid point of a single-planet sweep.
+
+    Cheaper than smoke() per point: the step and update costs are measured
+    once, in an early window at the middle grid point, and only the step
+    count is predicted for every a0. Runs that stop on collision are
+    predicted to the adiabatic contact time, an upper bound.
+
+    Returns
+    -------
+    numpy.ndarray
+        Predicted wall time (s) per a0.
+    """
+    track = scn.gettrack(spec)
+    a0s = np.asarray(a0s, float)
+    mid = scn.getspec(spec['name'], a0=np.median(a0s))
+    w = window(mid, track, 0., steps, chunks, updates)
+    orbit = lambda x: w['orbit']
+    times = np.zeros(a0s.size)
+    for i, a0 in enumerate(a0s):
+        point = scn.getspec(spec['name'], a0=a0)
+        nsteps, tend = predictsteps(point, track, orbit)
+        times[i] = (w['setup'] + nsteps.sum()*w['step'].mean()
+                    + spec['Nup']*tend/spec['tmax']*w['update'])
+    return times
+
+def setup(spec, n=50):
+    """
+    Time the per-point setup of a sweep: makesim for every point against
+    clones of one scenarios.template.
+
+    Returns
+    -------
+    dict
+        Mean seconds per point for 'makesim' and 'clone', and the one-off
+        cost of the 'template'.
+    """
+    track = scn.gettrack(spec)
+    a0 = spec['bodies'][0]['a']
+    timer_start = time.perf_counter()
+    for i in range(n):
+        scn.makesim(spec, track)
+    cold = (time.perf_counter() - timer_start)/n
+    timer_start = time.perf_counter()
+    tmpl = scn.template(spec, track)
+    once = time.perf_counter() - timer_start
+    timer_start = time.perf_counter()
+    for i in range(n):
+        scn.clone(tmpl, a0=a0*(1 + 0.01*i))
+    warm = (time.perf_counter() - timer_start)/n
+    return {'makesim': cold, 'clone': warm, 'template': once}
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Predict production wall '
+                                     'times from short benchmark windows.')
+    parser.add_argument('names', nargs='*', default=list(scn.SCENARIOS),
+                        metavar='scenario',
+                        help='one of: %s (default: all)'
+                             % ', '.join(scn.SCENARIOS))
+    parser.add_argument('--steps', type=int, default=200000,
+                        help='integrator steps timed per window')
+    parser.add_argument('--chunks', type=int, default=10,
+                        help='integrate() calls per window')
+    parser.add_argument('--updates', type=int, default=200,
+                        help='parameter updates timed per window')
+    parser.add_argument('--a0', type=float, default=None,
+                        help='initial semimajor axis of the first planet')
+    parser.add_argument('--setup', type=int, default=None, metavar='N',
+                        help='only time the per-point sim setup over N '
+                             'points, makesim vs template clones')
+    args = parser.parse_args()
+
+    for name in args.names:
+        spec = scn.getspec(name, a0=args.a0)
+        if args.setup is not None:
+            res = setup(spec, args.setup)
+            print('________________________________')
+            print('Setup benchmark: %s, %d points\n' % (name, args.setup))
+            print('    makesim per point: %.3f ms' % (1e3*res['makesim']))
+            print('    clone per point  : %.3f ms' % (1e3*res['clone']))
+            print('    template (once)  : %.3f ms' % (1e3*res['template']))
+            print('________________________________')
+            continue
+        timer_start = time.perf_counter()
+        res = smoke(spec, args.steps, args.chunks, args.updates)
+        early, late = res['windows']
+        print('________________________________')
+        print('Smoke benchmark: %s\n' % name)
+        print('    Step cost (early): %.3e s' % early['step'].mean())
+        print('    Step cost (late) : %.3e s' % late['step'].mean())
+        print('    Update cost      : %.3e s' % np.mean(
+            [early['update'], late['update']]))
+        print('    Predicted steps  : %.3e' % res['steps'])
+        if res['tend'] < spec['tmax']:
+            print('    Run ends (contact): %.4e yr (upper bound)' % res['tend'])
+        print('    Predicted walltime: %s +/- %.0f%%'
+              % (hms(res['predict']), 100*res['error']))
+        ref = reference(spec)
+        if ref.size:
+            print('    Recorded walltime : %s +/- %ds (%d runs)'
+                  % (hms(ref.mean()), ref.std(), ref.size))
+        print('    Benchmark took    : %s'
+              % hms(time.perf_counter() - timer_start))
+        print('________________________________')
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Node-local scratch staging for a driver run.
+
+The drivers read input/ and write output/ relative to their working
+directory, which on the cluster is $PBS_O_WORKDIR on shared storage, so
+hundreds of concurrent jobs hit the network file system with small reads
+and writes. Staging runs the command in a private directory on node-local
+scratch instead:
+
+    1. the code is copied in read-only: the command's script, every
+       top-level *.py and *.sh of the working directory (the driver a
+       run.sh wrapper executes) and any --file; then the task's own files,
+       those named after one of its arguments (its checkpoint
+       <a0>au.bin/.rebx/.npz, output/<a0>au.txt, ...; the name must not
+       continue with a digit, so 1.7 does not claim 1.75au.txt); the
+       input directories are linked from a per-node copy, made once by
+       the first job on the node that needs it (keyed on the files'
+       names, sizes and mtimes);
+    2. the command runs there with PBS_O_WORKDIR pointing at it and
+       REBX_TOOLS at this tools directory (unless set), where the drivers
+       look for the tools they import instead of next to their own copy;
+    3. every file it created or changed is copied back to the working
+       directory in one pass (and the staged-in files it deleted are
+       removed there) when it exits, or after it has handled a TERM, INT,
+       USR1 or USR2 signal, which are forwarded to it.
+
+Other tasks' checkpoints, logs and outputs in the same working directory
+are never staged, so concurrent tasks cannot overwrite or delete each
+other's files.
+
+The scratch root is --scratch, $REBX_SCRATCH, $TMPDIR or /tmp, in that
+order. Submitted sweeps are staged with `submit.py --stage`.
+
+usage: python tools/stage.py [--scratch DIR] [--workdir DIR] [--input DIR]
+                             [--file PATH] [--keep] COMMAND [ARG ...]
+"""
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+SIGNALS = (signal.SIGTERM, signal.SIGINT, signal.SIGUSR1, signal.SIGUSR2)
+
+def scratchroot(scratch=None):
+    return (scratch or os.environ.get('REBX_SCRATCH')
+            or os.environ.get('TMPDIR') or tempfile.gettempdir())
+
+def snapshot(root):
+    """
+    Return {relative path: (size, mtime)} of the regular files below root,
+    not following links.
+    """
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames
+                       if not os.path.islink(os.path.join(dirpath, d))]
+        for fname in filenames:
+            path = os.path.join(dirpath, fname)
+            if os.path.islink(path):
+                continue
+            st = os.stat(path)
+            files[os.path.relpath(path, root)] = (st.st_size, st.st_mtime_ns)
+    return files
+
+def nodecopy(src, root):
+    """
+    Return a node-local copy of directory src below root, copying it only
+    if no job on this node has done so yet.
+    """
+    files = sorted(snapshot(src).items())
+    key = hashlib.sha256(repr((os.path.abspath(src), files)).encode())
+    dst = os.path.join(root, 'rebx-inputs', key.hexdigest()[:16])
+    if not os.path.isdir(dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix='.copy.', dir=os.path.dirname(dst))
+        shutil.copytree(src, os.path.join(tmp, 'data'))
+        try:
+            os.rename(os.path.join(tmp, 'data'), dst)
+        except OSError:                 # another job on the node was faster
+            pass
+        shutil.rmtree(tmp, ignore_errors=True)
+    return dst
+
+def scripts(workdir, command):
+    """
+    Return the paths relative to workdir of the code a command may run:
+    its script if that lies in workdir and every top-level *.py and *.sh.
+    """
+    workdir = os.path.abspath(workdir)
+    files = [fname for fname in os.listdir(workdir)
+             if fname.endswith(('.py', '.sh'))
+             and os.path.isfile(os.path.join(workdir, fname))]
+    script = os.path.abspath(os.path.join(workdir, command[0]))
+    if os.path.dirname(script) == workdir and os.path.isfile(script):
+        files.append(os.path.basename(script))
+    return sorted(set(files))
+
+def owned(workdir, command, inputs=('input',)):
+    """
+    Return the paths relative to workdir of the files a command owns:
+    every file outside the input directories whose name starts with one
+    of its arguments (not followed by a digit).
+    """
+    workdir = os.path.abspath(workdir)
+    files = []
+    names = [re.compile(re.escape(arg) + r'(?!\d)') for arg in command[1:]]
+    if not names:
+        return files
+    for dirpath, dirnames, filenames in os.walk(workdir):
+        if dirpath == workdir:
+            dirnames[:] = [d for d in dirnames if d not in inputs]
+        for fname in filenames:
+            if any(name.match(fname) for name in names):
+                files.append(os.path.relpath(os.path.join(dirpath, fname),
+                                             workdir))
+    return files
+
+def stagein(workdir, jobdir, root, inputs=('input',), files=(), code=()):
+    """
+    Fill jobdir with copies of files and read-only copies of code (paths
+    relative to workdir) and links to the node-local copies of its input
+    directories.
+    """
+    for rel in list(code) + list(files):
+        dst = os.path.join(jobdir, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(os.path.join(workdir, rel), dst)
+        if rel in code:
+            os.chmod(dst, os.stat(dst).st_mode & ~0o222)
+    for name in inputs:
+        src = os.path.join(workdir, name)
+        if os.path.isdir(src):
+            os.symlink(nodecopy(src, root), os.path.join(jobdir, name))
+
+def stageout(jobdir, workdir, before):
+    """
+    Copy every file created or changed in jobdir back to workdir, and
+    remove the staged-in files the command deleted (e.g. checkpoints).
+
+    Each file is written under a temporary name and renamed, so readers on
+    the shared side never see a partial file.
+
+    Returns
+    -------
+    int
+        Number of files copied.
+    """
+    n = 0
+    after = snapshot(jobdir)
+    for rel in before:
+        if rel not in after and os.path.exists(os.path.join(workdir, rel)):
+            os.remove(os.path.join(workdir, rel))
+    for rel, stat in sorted(after.items()):
+        if before.get(rel) == stat:
+            continue
+        dst = os.path.join(workdir, rel)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copy2(os.path.join(jobdir, rel), dst + '.stage')
+        os.replace(dst + '.stage', dst)
+        n += 1
+    return n
+
+def stage(command, workdir='.', scratch=None, inputs=('input',), keep=False,
+          files=()):
+    """
+    Run command staged on node-local scratch; return its exit status.
+
+    Only the scripts() of the command and the extra files (read-only) and
+    the files owned() by it are staged.
+    """
+    workdir = os.path.abspath(workdir)
+    root = scratchroot(scratch)
+    os.makedirs(root, exist_ok=True)
+    jobdir = tempfile.mkdtemp(prefix='stage.', dir=root)
+    code = sorted(set(scripts(workdir, command)) | set(files))
+    files = sorted(set(owned(workdir, command, inputs)) - set(code))
+    stagein(workdir, jobdir, root, inputs, files, code)
+    before = snapshot(jobdir)
+    env = dict(os.environ, PBS_O_WORKDIR=jobdir)
+    env.setdefault('REBX_TOOLS', TOOLS)
+    proc = subprocess.Popen(command, cwd=jobdir, env=env)
+    def forward(signum, frame):
+        proc.send_signal(signum)
+    handlers = {s: signal.signal(s, forward) for s in SIGNALS}
+    try:
+        code = proc.wait()
+    finally:
+        for s, handler in handlers.items():
+            signal.signal(s, handler)
+        n = stageout(jobdir, workdir, before)
+        print('stage: copied %d files from %s back to %s' % (n, jobdir,
+                                                             workdir),
+              file=sys.stderr)
+        if not keep:
+            shutil.rmtree(jobdir, ignore_errors=True)
+    return code
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a command staged on '
+                                     'node-local scratch.')
+    parser.add_argument('--scratch', default=None,
+                        help='node-local scratch root (default: '
+                             '$REBX_SCRATCH, $TMPDIR or /tmp)')
+    parser.add_argument('--workdir',
+                        default=os.environ.get('PBS_O_WORKDIR', '.'),
+                        help='shared working directory (default: '
+                             '$PBS_O_WORKDIR or .)')
+    parser.add_argument('--input', action='append', default=None,
+                        metavar='DIR',
+                        help='input directory to stage (default: input)')
+    parser.add_argument('--file', action='append', default=[],
+                        metavar='PATH',
+                        help='also stage this file read-only (relative '
+                             'to the workdir)')
+    parser.add_argument('--keep', action='store_true',
+                        help='keep the scratch directory')
+    parser.add_argument('command', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    if not args.command:
+        parser.error('no command to run')
+    sys.exit(stage(args.command, args.workdir, args.scratch,
+                   args.input or ['input'], args.keep, args.file))
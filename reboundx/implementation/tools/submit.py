@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Submit a parameter sweep as one scheduler job array.
+
+A sweep is a run script (e.g. jupiters/run.sh) and the list of arguments
+it is called with, one per grid point. The arguments are written to
+<workdir>/<name>.grid and tools/arraytask.sh picks line i of it for array
+index i (1-based), so a sweep is a single qsub or sbatch call whatever its
+size. Backends:
+
+    pbs    qsub -J 1-N (PBS Pro)
+    slurm  sbatch --array=1-N
+    local  run the tasks on this machine with a process pool
+
+With --fake the pbs and slurm commands are handed to a local stand-in for
+qsub/sbatch that expands the array and runs the tasks in order, which
+checks the whole index-to-grid-point mapping without a scheduler.
+
+With --bundle K grid points are packed into jobs of K cores each, so the
+queue wait and environment setup are paid once per bundle. Bundles are
+sized from the predicted wall time of each point (smoke.runtimes) to fill
+the requested walltime; array task i then runs 'submit.py work' on the
+points of bundle i through a K-process work queue.
+
+Sweeps with a scenario and an output pattern go through the result cache
+(tools/cache.py): points finished before with the same track, settings and
+code get their output copied into place and are not submitted again.
+
+Sweeps with a scenario also get their walltime and mem requests from the
+resource model (tools/resources.py) fitted to the results index, unless
+they are given on the command line; with --bundle only mem is predicted.
+
+With --stage every task runs through tools/stage.py: its inputs are read
+from a per-node copy and its outputs written to node-local scratch and
+copied back to the workdir when it ends, instead of going to the shared
+file system as it runs.
+
+Tasks that checkpoint on TERM/USR1/USR2 (tools/checkpoint.py) exit with
+checkpoint.RESUME; arraytask.sh requeues them (qrerun, scontrol requeue)
+and the local backend runs them again until they finish. A bundle
+forwards the signal to its points, waits for them and exits with RESUME
+if any of them checkpointed or never started, so the whole bundle is
+requeued; the points it finished are listed in <name>.done and skipped
+when it runs again.
+
+usage: python <sweep>.py [--backend pbs|slurm|local] [--fake] [--dry-run]
+                         [--nprocs N] [--mail ADDRESS]
+                         [--bundle K] [--walltime HH:MM:SS] [--mem MEM]
+                         [--scale F] [--no-cache] [--no-predict] [--stage]
+       python tools/submit.py work NAME SCRIPT ARG ...
+"""
+import argparse
+import multiprocessing
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import cache
+from checkpoint import RESUME, SIGNALS
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+TASK = os.path.join(TOOLS, 'arraytask.sh')
+STAGE = os.path.join(TOOLS, 'stage.py')
+BACKENDS = ('pbs', 'slurm', 'local')
+INDEX = {'pbs': 'PBS_ARRAY_INDEX', 'slurm': 'SLURM_ARRAY_TASK_ID',
+         'local': 'ARRAY_INDEX'}
+
+def job(name, script, args, workdir=None, ncpus=1, mem='1gb',
+        walltime='00:16:00', queue=None, mail=None, scenario=None,
+        output=None, code=None):
+    """
+    Describe a sweep.
+
+    Parameters
+    ----------
+    name : str
+        Job (array) name, also the name of the grid file.
+    script : str
+        Executable run once per grid point with its argument.
+    args : list of str
+        One argument per grid point, e.g. '{:.2f}'.format(a).
+    workdir : str
+        Directory the tasks run in (default: the script's).
+    ncpus, mem, walltime, queue : resources of each task, PBS style.
+    mail : str
+        Address notified when the array begins, ends or aborts.
+    scenario : str
+        Key of scenarios.SCENARIOS whose a0 the arguments are; needed to
+        predict runtimes for bundling and key the result cache.
+    output : str
+        Output file of a grid point relative to workdir, with {} for its
+        argument, e.g. 'output/{}au.txt'; enables the result cache.
+    code : list of str
+        Files making up the code version of the cache key (default:
+        the script); the tools modules they import, and scenarios.py with
+        a scenario, are added.
+
+    Returns
+    -------
+    dict
+        Sweep for submit().
+    """
+    script = os.path.abspath(script)
+    if workdir is None:
+        workdir = os.path.dirname(script)
+    code = [os.path.abspath(c) for c in (code or [script])]
+    if scenario is not None:
+        code.append(os.path.join(TOOLS, 'scenarios.py'))
+    code += [m for m in imports(code) if m not in code]
+    return {'name': name, 'script': script, 'args': [str(a) for a in args],
+            'workdir': os.path.abspath(workdir), 'ncpus': ncpus, 'mem': mem,
+            'walltime': walltime, 'queue': queue, 'mail': mail,
+            'scenario': scenario, 'output': output, 'stage': False,
+            'code': code}
+
+def imports(paths):
+    """
+    Return the tools modules the Python files among paths import, directly
+    or through each other.
+    """
+    found = []
+    todo = [p for p in paths if p.endswith('.py')]
+    while todo:
+        with open(todo.pop()) as f:
+            names = re.findall(r'^\s*(?:import|from)\s+(\w+)', f.read(),
+                               re.MULTILINE)
+        for name in names:
+            path = os.path.join(TOOLS, name + '.py')
+            if os.path.isfile(path) and path not in found:
+                found.append(path)
+                todo.append(path)
+    return sorted(found)
+
+def gridpath(job):
+    return os.path.join(job['workdir'], job['name'] + '.grid')
+
+def taskargv(job):
+    """
+    Return the argv of one array task, staged on node-local scratch if the
+    sweep asks for it (with the sweep's code files in the workdir).
+    """
+    wrapper = []
+    if job['stage']:
+        wrapper = [STAGE] + ['--file=' + os.path.relpath(c, job['workdir'])
+                             for c in job['code']
+                             if os.path.dirname(c) == job['workdir']]
+    return [TASK, gridpath(job), job['workdir']] + wrapper + [job['script']]
+
+def writegrid(job):
+    with open(gridpath(job), 'w') as f: # will overwrite existing file
+        for arg in job['args']:
+            f.write(arg + '\n')
+    return gridpath(job)
+
+def slurmmem(mem):
+    """
+    Convert a PBS memory request ('1gb', '500mb') to Slurm's ('1G', '500M').
+    """
+    m = re.fullmatch(r'(\d+)([kmgt]?)b?', mem.lower())
+    if m is None:
+        raise ValueError('cannot convert memory request %r' % mem)
+    return m.group(1) + m.group(2).upper()
+
+def seconds(walltime):
+    h, m, s = map(int, walltime.split(':'))
+    return 3600*h + 60*m + s
+
+def hms(seconds):
+    h = seconds // 3600
+    remainder = seconds - h*3600
+    m = remainder // 60
+    s = remainder - m*60
+    return '%02d:%02d:%02d'%(h, m, s)
+
+def scalemem(mem, k):
+    """
+    Return a PBS memory request k times as large ('1gb', 4 -> '4gb').
+    """
+    m = re.fullmatch(r'(\d+)([kmgt]?b?)', mem.lower())
+    if m is None:
+        raise ValueError('cannot scale memory request %r' % mem)
+    return '%d%s' % (k*int(m.group(1)), m.group(2))
+
+def predict(job):
+    """
+    Predict the wall time (s) of each grid point on this machine.
+    """
+    # imported here so that worker nodes only need the standard library
+    import scenarios as scn
+    import smoke
+    if job['scenario'] is None:
+        raise ValueError('%s: no scenario to predict runtimes from'
+                         % job['name'])
+    spec = scn.getspec(job['scenario'])
+    return smoke.runtimes(spec, [float(a) for a in job['args']])
+
+def resources(job):
+    """
+    Predict walltime and mem requests covering every grid point.
+
+    Returns
+    -------
+    tuple of str
+        PBS-style walltime and mem, e.g. ('00:16:00', '100mb').
+    """
+    import scenarios as scn
+    import resources
+    specs = [scn.getspec(job['scenario'], a0=float(a)) for a in job['args']]
+    return resources.request(specs)
+
+def cached(job):
+    """
+    Restore the grid points already in the result cache.
+
+    Returns
+    -------
+    tuple
+        The sweep reduced to the points still to run, and their
+        (arg, key, output) rows for cache.pending().
+    """
+    import scenarios as scn
+    cache.collect(job['workdir'])
+    args, rows = [], []
+    for arg in job['args']:
+        k = cache.key(scn.getspec(job['scenario'], a0=float(arg)), job['code'])
+        output = job['output'].format(arg)
+        if cache.lookup(k) is not None:
+            cache.restore(k, os.path.join(job['workdir'], output))
+        else:
+            args.append(arg)
+            rows.append((arg, k, output))
+    return dict(job, args=args), rows
+
+def pack(runtimes, k, walltime, fill=0.8):
+    """
+    Group grid points into bundles of k cores that fit the walltime.
+
+    Longest-processing-time first: points are taken in order of decreasing
+    runtime and each goes to the least loaded core of the first bundle
+    where it still finishes within fill*walltime. A point longer than that
+    gets a bundle of its own.
+
+    Returns
+    -------
+    list of list of int
+        Indices of the points in each bundle, longest first.
+    """
+    limit = fill*walltime
+    loads, bundles = [], []
+    for i in sorted(range(len(runtimes)), key=lambda i: -runtimes[i]):
+        for load, bundle in zip(loads, bundles):
+            core = load.index(min(load))
+            if load[core] + runtimes[i] <= limit:
+                load[core] += runtimes[i]
+                bundle.append(i)
+                break
+        else:
+            loads.append([runtimes[i]] + [0.]*(k-1))
+            bundles.append([i])
+    return bundles
+
+def bundled(job, bundles, k):
+    """
+    Return the sweep of bundles: task i runs 'submit.py work' on bundle i.
+    """
+    args = ['work %s.%d %s %s' % (job['name'], b+1, job['script'],
+                                  ' '.join(job['args'][i] for i in bundle))
+            for b, bundle in enumerate(bundles)]
+    return dict(job, script=os.path.join(TOOLS, 'submit.py'), args=args,
+                ncpus=k, mem=scalemem(job['mem'], k))
+
+def command(job, backend):
+    """
+    Return the argv of the single qsub or sbatch call submitting the sweep.
+    """
+    n = len(job['args'])
+    task = taskargv(job)
+    if backend == 'pbs':
+        rc = ['qsub',
+              '-j', 'oe',
+              '-l', 'select=1:ncpus=%d:mem=%s' % (job['ncpus'], job['mem']),
+              '-l', 'walltime=' + job['walltime'],
+              '-N', job['name']]
+        if n > 1:
+            rc += ['-J', '1-%d' % n]
+        else:                           # PBS Pro arrays need 2+ subjobs
+            rc += ['-v', 'PBS_ARRAY_INDEX=1']
+        if job['queue'] is not None:
+            rc += ['-q', job['queue']]
+        if job['mail'] is not None:
+            rc += ['-m', 'abe', '-M', job['mail']]
+        return rc + ['--'] + task
+    if backend == 'slurm':
+        rc = ['sbatch',
+              '--array=1-%d' % n,
+              '--cpus-per-task=%d' % job['ncpus'],
+              '--mem=' + slurmmem(job['mem']),
+              '--time=' + job['walltime'],
+              '--job-name=' + job['name'],
+              '--requeue',                # checkpointed tasks
+              '--output=' + os.path.join(job['workdir'], '%x.o%A.%a'),
+              '--chdir=' + job['workdir']]
+        if job['queue'] is not None:
+            rc += ['--partition=' + job['queue']]
+        if job['mail'] is not None:
+            rc += ['--mail-type=BEGIN,END,FAIL', '--mail-user=' + job['mail']]
+        return rc + task
+    raise ValueError('no scheduler command for backend %r' % backend)
+
+def work(name, script, args, workdir='.', nprocs=None):
+    """
+    Run the grid points of one bundle through a local work queue.
+
+    Each point writes its outputs as usual and its log to <name>.o<i>.
+    nprocs defaults to the cores the scheduler granted. A TERM, USR1 or
+    USR2 is forwarded to the running points and no new ones are started;
+    the bundle never reruns a checkpointed point itself (it is inside the
+    allocation being stopped), it returns RESUME for it and for the points
+    not started, and the scheduler requeues the bundle.
+
+    Returns
+    -------
+    list of int
+        Exit status of each point, in grid order (0 for those finished in
+        an earlier run of the bundle).
+    """
+    if nprocs is None:
+        nprocs = int(os.environ.get('NCPUS',
+                                    os.environ.get('SLURM_CPUS_PER_TASK', 1)))
+    sweep = job(name, script, args, workdir)
+    writegrid(sweep)
+    donefile = os.path.join(sweep['workdir'], name + '.done')
+    codes = {}
+    if os.path.exists(donefile):        # finished before a requeue
+        with open(donefile) as f:
+            codes = {int(line): 0 for line in f if line.strip()}
+    pending = [i for i in range(1, len(args)+1) if i not in codes]
+    running, stop = {}, []
+    def forward(signum, frame):
+        stop.append(signum)
+        for proc, log in running.values():
+            os.killpg(proc.pid, signum)
+    handlers = {s: signal.signal(s, forward) for s in SIGNALS}
+    try:
+        while running or (pending and not stop):
+            while pending and len(running) < nprocs and not stop:
+                i = pending.pop(0)
+                log = open(os.path.join(sweep['workdir'],
+                                        '%s.o%d' % (name, i)), 'a')
+                env = dict(os.environ, ARRAY_INDEX=str(i))
+                proc = subprocess.Popen(taskargv(sweep), env=env, stdout=log,
+                                        stderr=subprocess.STDOUT,
+                                        start_new_session=True) # own group
+                running[i] = (proc, log)
+            for i, (proc, log) in list(running.items()):
+                if proc.poll() is None:
+                    continue
+                log.close()
+                del running[i]
+                codes[i] = proc.returncode
+                if proc.returncode == 0:
+                    with open(donefile, 'a') as f:
+                        f.write('%d\n' % i)
+            time.sleep(0.1)
+    finally:
+        for s, handler in handlers.items():
+            signal.signal(s, handler)
+    for i in pending:                   # stopped before they started
+        codes[i] = RESUME
+    if RESUME not in codes.values() and os.path.exists(donefile):
+        os.remove(donefile)             # bundle complete
+    return [codes[i] for i in range(1, len(args)+1)]
+
+def runtask(task, index, var='ARRAY_INDEX', stdout=None, rerun=True):
+    """
+    Run array task argv for one (1-based) index, again for as long as it
+    exits with checkpoint.RESUME if rerun (local backend and fake
+    scheduler only, never inside an allocation).
+    """
+    env = dict(os.environ)
+    env[var] = str(index)
+    while True:
+        code = subprocess.run(task, env=env, stdout=stdout,
+                              stderr=subprocess.STDOUT).returncode
+        if code != RESUME or not rerun:
+            return code
+
+def _runlocal(item):
+    job, index = item
+    log = os.path.join(job['workdir'], '%s.o%d' % (job['name'], index))
+    with open(log, 'w') as f:
+        return runtask(taskargv(job), index, stdout=f)
+
+def local(job, nprocs=1):
+    """
+    Run all tasks of the sweep on this machine, nprocs at a time.
+
+    Returns
+    -------
+    list of int
+        Exit status of each task, in grid order.
+    """
+    items = [(job, i+1) for i in range(len(job['args']))]
+    if nprocs > 1:
+        with multiprocessing.Pool(nprocs) as pool:
+            return pool.map(_runlocal, items, chunksize=1)
+    return [_runlocal(item) for item in items]
+
+def fake(rc, **kwargs):
+    """
+    Local stand-in for qsub and sbatch, called like subprocess.run.
+
+    Parses the array range and task argv out of a command() and runs
+    every task in order with the scheduler's index variable set. Returns
+    a CompletedProcess whose stdout is the (fake) job ID, or the task's
+    return code if one fails.
+    """
+    if rc[0] == 'qsub':
+        var = INDEX['pbs']
+        task = rc[rc.index('--')+1:]
+        opts = rc[:rc.index('--')]
+        first, last = 1, 1
+        if '-J' in opts:
+            first, last = map(int, opts[opts.index('-J')+1].split('-'))
+    elif rc[0] == 'sbatch':
+        var = INDEX['slurm']
+        k = next(i for i, a in enumerate(rc[1:], 1) if not a.startswith('--'))
+        opts, task = rc[:k], rc[k:]
+        array = next(a for a in opts if a.startswith('--array='))
+        first, last = map(int, array.split('=')[1].split('-'))
+    else:
+        raise ValueError('fake scheduler: unknown command %r' % rc[0])
+    for index in range(first, last+1):
+        code = runtask(task, index, var)
+        if code != 0:
+            return subprocess.CompletedProcess(rc, code, stdout='')
+    return subprocess.CompletedProcess(rc, 0, stdout='0[].fake\n')
+
+def submit(job, backend='pbs', run=subprocess.run, nprocs=1, dry=False):
+    """
+    Submit the sweep in one scheduler transaction.
+
+    Parameters
+    ----------
+    backend : str
+        One of BACKENDS.
+    run : callable
+        Executes the scheduler command; fake() to test without one.
+    nprocs : int
+        Worker processes of the local backend.
+    dry : bool
+        Write the grid file and return the command without running it.
+
+    Returns
+    -------
+    subprocess.CompletedProcess, list or None
+        Result of the qsub or sbatch call, or the local exit statuses.
+    """
+    if backend not in BACKENDS:
+        raise ValueError('unknown backend %r (choose from %s)'
+                         % (backend, ', '.join(BACKENDS)))
+    if not job['args']:
+        raise ValueError('%s: empty sweep' % job['name'])
+    writegrid(job)
+    if backend == 'local':
+        if dry:
+            print('%d tasks of %s in %s' % (len(job['args']), job['script'],
+                                            job['workdir']))
+            return None
+        return local(job, nprocs)
+    rc = command(job, backend)
+    print(' '.join(rc))
+    if dry:
+        return None
+    return run(rc, text=True)
+
+def cli(job, argv=None):
+    """
+    Submit a sweep with the backend options of the command line.
+    """
+    parser = argparse.ArgumentParser(description='Submit %d grid points of '
+                                     '%s as one job array.'
+                                     % (len(job['args']), job['name']))
+    parser.add_argument('--backend', choices=BACKENDS, default='pbs')
+    parser.add_argument('--fake', action='store_true',
+                        help='run the array locally through a fake '
+                             'qsub/sbatch')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the submission without running it')
+    parser.add_argument('--nprocs', type=int,
+                        default=int(os.environ.get('NCPUS', 1)),
+                        help='worker processes of the local backend')
+    parser.add_argument('--mail', default=job['mail'],
+                        help='address for begin/end/abort notifications')
+    parser.add_argument('--bundle', type=int, default=None, metavar='K',
+                        help='pack grid points into jobs of K cores')
+    parser.add_argument('--walltime', default=None,
+                        help='walltime of each job (HH:MM:SS; default: '
+                             'predicted, else %s)' % job['walltime'])
+    parser.add_argument('--mem', default=None,
+                        help='memory of each task (default: predicted, else '
+                             '%s)' % job['mem'])
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='runtime on the cluster relative to this '
+                             'machine, for bundling')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='run every grid point, cached or not')
+    parser.add_argument('--no-predict', action='store_true',
+                        help='keep the sweep\'s default walltime and mem')
+    parser.add_argument('--stage', action='store_true',
+                        help='run each task from node-local scratch '
+                             '(tools/stage.py)')
+    args = parser.parse_args(argv)
+    job = dict(job, mail=args.mail, stage=args.stage)
+    rows = []
+    if job['scenario'] is not None and job['output'] is not None \
+            and not args.no_cache:
+        n = len(job['args'])
+        job, rows = cached(job)
+        print('%d of %d grid points cached' % (n - len(job['args']), n))
+        if not job['args']:
+            return
+    if job['scenario'] is not None and not args.no_predict \
+            and (args.walltime is None or args.mem is None):
+        try:
+            walltime, mem = resources(job)
+            if args.bundle is None:
+                job['walltime'] = walltime
+            job['mem'] = mem
+            print('predicted resources: walltime=%s mem=%s'
+                  % (job['walltime'], job['mem']))
+        except Exception as error: # no index yet, or too few runs in it
+            print('warning: no resource prediction (%s); using walltime=%s '
+                  'mem=%s' % (error, job['walltime'], job['mem']))
+    job['walltime'] = args.walltime or job['walltime']
+    job['mem'] = args.mem or job['mem']
+    if args.bundle is not None:
+        runtimes = args.scale*predict(job)
+        bundles = pack(runtimes, args.bundle, seconds(job['walltime']))
+        for b, bundle in enumerate(bundles):
+            print('bundle %d: %d points, predicted %s core time'
+                  % (b+1, len(bundle), hms(sum(runtimes[bundle]))))
+        job = bundled(job, bundles, args.bundle)
+    if rows and not args.dry_run:
+        cache.pending(job['workdir'], job['name'], rows)
+    res = submit(job, args.backend, fake if args.fake else subprocess.run,
+                 args.nprocs, args.dry_run)
+    if rows and not args.dry_run:
+        cache.collect(job['workdir'])   # local and fake runs are done
+    if isinstance(res, list):
+        failed = [job['args'][i] for i, code in enumerate(res) if code != 0]
+        if failed:
+            sys.exit('failed grid points: %s' % ', '.join(failed))
+    elif res is not None and res.returncode != 0:
+        sys.exit(res.returncode)
+
+# bundle worker, run by arraytask.sh on the compute node
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or sys.argv[1] != 'work':
+        sys.exit('usage: python submit.py work NAME SCRIPT ARG ...')
+    codes = work(sys.argv[2], sys.argv[3], sys.argv[4:])
+    sys.exit(RESUME if RESUME in codes else max(codes))
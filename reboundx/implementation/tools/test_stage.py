@@ -0,0 +1,88 @@
+"""
+Tests of tools/stage.py with a run.sh-style wrapper, as submitted by
+`submit.py --stage` for jupiters.
+
+usage: python -m unittest tools/test_stage.py
+"""
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import stage
+
+RUNSH = '''#!/usr/bin/bash
+
+cd $PBS_O_WORKDIR
+exec %s driver.py $1
+''' % sys.executable
+
+DRIVER = '''import os
+import sys
+pwd = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.environ.get('REBX_TOOLS',
+                                  os.path.join(os.path.dirname(pwd), 'tools')))
+import checkpoint                               # a tools module
+os.makedirs('output', exist_ok=True)
+with open('output/{}au.txt'.format(sys.argv[1]), 'w') as f:
+    f.write(open('input/m.txt').read())
+os.remove('{}au.npz'.format(sys.argv[1]))      # checkpoint cleared
+'''
+
+def write(path, text, mode=0o644):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    os.chmod(path, mode)
+
+class TestStage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.workdir = os.path.join(self.tmp.name, 'work')
+        self.scratch = os.path.join(self.tmp.name, 'scratch')
+        write(os.path.join(self.workdir, 'run.sh'), RUNSH, 0o755)
+        write(os.path.join(self.workdir, 'driver.py'), DRIVER)
+        write(os.path.join(self.workdir, 'input', 'm.txt'), 'mass\n')
+        for arg in ('1.70', '1.75'):
+            write(os.path.join(self.workdir, arg + 'au.npz'), 'chk\n')
+            write(os.path.join(self.workdir, 'output', arg + 'au.txt'),
+                  'old\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, rel):
+        with open(os.path.join(self.workdir, rel)) as f:
+            return f.read()
+
+    def test_wrapper_runs_staged_driver(self):
+        run = os.path.join(self.workdir, 'run.sh')
+        code = stage.stage([run, '1.70'], self.workdir, self.scratch)
+        self.assertEqual(code, 0)
+        self.assertEqual(self.read('output/1.70au.txt'), 'mass\n')
+        self.assertFalse(os.path.exists(os.path.join(self.workdir,
+                                                     '1.70au.npz')))
+
+    def test_other_tasks_untouched(self):
+        run = os.path.join(self.workdir, 'run.sh')
+        stage.stage([run, '1.70'], self.workdir, self.scratch)
+        self.assertEqual(self.read('output/1.75au.txt'), 'old\n')
+        self.assertEqual(self.read('1.75au.npz'), 'chk\n')
+
+    def test_code_staged_read_only(self):
+        run = os.path.join(self.workdir, 'run.sh')
+        self.assertEqual(stage.scripts(self.workdir, [run, '1.70']),
+                         ['driver.py', 'run.sh'])
+        jobdir = os.path.join(self.tmp.name, 'job')
+        os.makedirs(jobdir)
+        stage.stagein(self.workdir, jobdir, self.scratch,
+                      code=['driver.py', 'run.sh'])
+        mode = os.stat(os.path.join(jobdir, 'driver.py')).st_mode
+        self.assertFalse(mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+        self.assertEqual(stage.owned(self.workdir, [run, '1.7']), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import bisect
+import os
+import numpy as np
+import reboundx
+
+G = 4*np.pi**2                          # units of AU, yr, and Msun
+SCHEMES = ('linear', 'pchip', 'spline')  # interpolation schemes, fastest first
+
+def loadtrack(indir='input'):
+    """
+    Load a MESA stellar track and precalculate the REBOUNDx inputs.
+
+    Vectorized version of the conversion block repeated in every driver.
+
+    Parameters
+    ----------
+    indir : str
+        Directory containing the two-column m.txt, r.txt and l.txt files
+        (time / yr, value in solar units).
+
+    Returns
+    -------
+    dict
+        Times and values for the stellar mass (Msun), radius (AU) and
+        tidal time lag tau (Eq. 2) keyed 'mtimes', 'masses', 'rtimes',
+        'radii', 'ltimes' and 'taus'.
+    """
+    data = np.loadtxt(os.path.join(indir, 'm.txt')) # return (N, 2) array
+    mtimes = data[:, 0]                 # return only 1st col
+    masses = data[:, 1]                 # return only 2nd col
+    data = np.loadtxt(os.path.join(indir, 'r.txt'))
+    rtimes = data[:, 0]
+    Rsuns = data[:, 1]                  # data in Rsun units
+    data = np.loadtxt(os.path.join(indir, 'l.txt'))
+    ltimes = data[:, 0]
+    Lsuns = data[:, 1]                  # data in Lsun units
+
+    # conversions and precalculations
+    radii = Rsuns * 0.00465047          # 215 Rsun ~ 1 AU
+    watts = Lsuns * 3.828e26            # IAU Resolution B3 conversion
+    lumins = (watts*((6.7e-12)**2)*(5e-31))/((3.2e-8)**3) # W to sim units
+    t_fs = np.cbrt(masses*radii**2/lumins) # precalculate t_f (Eq. 1)
+    taus = 2.*radii**3/G/masses/t_fs    # precalc tau (Eq. 2)
+    return {'mtimes': mtimes, 'masses': masses,
+            'rtimes': rtimes, 'radii': radii,
+            'ltimes': ltimes, 'taus': taus}
+
+class Interpolator:
+    """
+    Piecewise linear or monotone cubic Hermite interpolation of a track.
+
+    Drop-in for reboundx.Interpolator, whose only scheme is the natural
+    cubic spline: interpolate(rebx, t=t) takes the same arguments (rebx is
+    unused) and, like the spline, extrapolates with the first or last
+    piece. 'pchip' uses the Fritsch-Carlson slopes, so the interpolant is
+    monotone wherever the knots are and never overshoots them, e.g. a mass
+    that only decreases. t may also be an array.
+    """
+
+    def __init__(self, rebx, times, values, interpolation='pchip'):
+        x = np.asarray(times, dtype=float)
+        y = np.asarray(values, dtype=float)
+        h = np.diff(x)
+        delta = np.diff(y)/h
+        if interpolation == 'linear':
+            c1, c2, c3 = delta, np.zeros_like(h), np.zeros_like(h)
+        elif interpolation == 'pchip':
+            d = pchipslopes(h, delta)
+            c1 = d[:-1]
+            c2 = (3*delta - 2*d[:-1] - d[1:])/h
+            c3 = (d[:-1] + d[1:] - 2*delta)/h**2
+        else:
+            raise ValueError('unknown interpolation %r (linear or pchip)'
+                             % interpolation)
+        self.interpolation = interpolation
+        self.times = x
+        self.coeffs = np.array([y[:-1], c1, c2, c3])
+        self._x = x.tolist()            # scalar queries: bisect on lists
+        self._c = self.coeffs.T.tolist()
+
+    def interpolate(self, rebx=None, t=0.):
+        if isinstance(t, (int, float)):
+            i = min(max(bisect.bisect_right(self._x, t) - 1, 0),
+                    len(self._c) - 1)
+            c0, c1, c2, c3 = self._c[i]
+            dt = t - self._x[i]
+            return ((c3*dt + c2)*dt + c1)*dt + c0
+        t = np.asarray(t, dtype=float)
+        i = np.clip(np.searchsorted(self.times, t, 'right') - 1, 0,
+                    len(self.times) - 2)
+        dt = t - self.times[i]
+        c0, c1, c2, c3 = self.coeffs[:, i]
+        return ((c3*dt + c2)*dt + c1)*dt + c0
+
+def pchipslopes(h, delta):
+    """
+    Knot slopes of the monotone cubic Hermite interpolant (Fritsch &
+    Carlson 1980, weighted harmonic mean as in Fritsch & Butland 1984) from
+    the interval widths h and secant slopes delta.
+    """
+    d = np.zeros(len(h) + 1)
+    w1 = 2*h[1:] + h[:-1]
+    w2 = h[1:] + 2*h[:-1]
+    same = delta[:-1]*delta[1:] > 0     # zero slope at extrema and flats
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = (w1 + w2)/(w1/delta[:-1] + w2/delta[1:])
+    d[1:-1] = np.where(same, mean, 0.)
+    d[0], d[-1] = endslope(h[0], h[1], delta[0], delta[1]), \
+        endslope(h[-1], h[-2], delta[-1], delta[-2])
+    return d
+
+def endslope(h0, h1, delta0, delta1):
+    """
+    Shape-preserving one-sided three-point slope at an end knot.
+    """
+    d = ((2*h0 + h1)*delta0 - h0*delta1)/(h0 + h1)
+    if np.sign(d) != np.sign(delta0):
+        return 0.
+    if np.sign(delta0) != np.sign(delta1) and abs(d) > abs(3*delta0):
+        return 3*delta0
+    return d
+
+def interpolator(rebx, times, values, scheme='spline'):
+    """
+    Return a reboundx.Interpolator ('spline') or an Interpolator ('linear',
+    'pchip') of values over times.
+    """
+    if scheme == 'spline':
+        return reboundx.Interpolator(rebx, times, values, 'spline')
+    if scheme not in SCHEMES:
+        raise ValueError('unknown interpolation scheme %r (choose from %s)'
+                         % (scheme, ', '.join(SCHEMES)))
+    return Interpolator(rebx, times, values, scheme)
+
+def interpolators(rebx, track, scheme='spline'):
+    """
+    Create the Interpolator objects for a loaded track.
+
+    Parameters
+    ----------
+    scheme : str
+        One of SCHEMES: 'spline' (REBOUNDx natural cubic spline, the
+        drivers' choice), 'pchip' (monotone cubic Hermite, no overshoot)
+        or 'linear'.
+
+    Returns
+    -------
+    tuple
+        Stellar mass, radius and tau interpolators, in that order.
+    """
+    starmass = interpolator(rebx, track['mtimes'], track['masses'], scheme)
+    starradius = interpolator(rebx, track['rtimes'], track['radii'], scheme)
+    startau = interpolator(rebx, track['ltimes'], track['taus'], scheme)
+    return starmass, starradius, startau
+
+def trgb(track):
+    """
+    Return the age of the tip of the red giant branch (maximum radius).
+    """
+    return track['rtimes'][np.argmax(track['radii'])]
@@ -0,0 +1,67 @@
+"""
+Batched parameter changes for WHFast and MERCURIUS in unsafe mode.
+
+With safe_mode = 1 (REBOUND's default) WHFast synchronizes and converts
+between inertial and Jacobi coordinates at every step, which is what makes
+changing masses, radii and positions between steps safe; with the
+symplectic corrector it also applies the corrector every step. safe_mode
+= 0 skips all of that and keeps the Jacobi coordinates from step to step,
+so the driver has to synchronize before it touches the particles and tell
+the integrator to rebuild its coordinates afterwards. jupiters.py did this
+by hand; a session does it for every driver:
+
+    unsafe.enable(sim)                  # once, after the setup
+    for t in ts:
+        sim.integrate(t)
+        with unsafe.session(sim):       # synchronize
+            ps[0].m = starmass.interpolate(rebx, t=t0+sim.t)
+            ps[0].r = starradius.interpolate(rebx, t=t0+sim.t)
+            sim.move_to_com()
+        # coordinates recalculated at the start of the next step
+
+Outside safe mode a session costs one synchronization per update instead
+of one per step; in safe mode or with other integrators it does nothing
+extra, so drivers can use it unconditionally.
+"""
+import contextlib
+
+INTEGRATORS = ('whfast', 'mercurius')
+
+def settings(sim):
+    """
+    Return the integrator settings struct (ri_whfast or ri_mercurius) of
+    sim, or None for integrators without an unsafe mode.
+    """
+    if sim.integrator == 'whfast':
+        return sim.ri_whfast
+    if sim.integrator == 'mercurius':
+        return sim.ri_mercurius
+    return None
+
+def enable(sim):
+    """
+    Switch sim's WHFast or MERCURIUS integrator to safe_mode = 0.
+    """
+    ri = settings(sim)
+    if ri is not None:
+        ri.safe_mode = 0
+
+@contextlib.contextmanager
+def session(sim):
+    """
+    Context for changing particles and parameters between steps.
+
+    Synchronizes on entry (a no-op if sim.integrate already did) and flags
+    the coordinates for recalculation on exit, also if the block raises,
+    so the next step starts from the modified particles.
+    """
+    ri = settings(sim)
+    if ri is not None:
+        sim.integrator_synchronize()
+    try:
+        yield sim
+    finally:
+        if ri is not None:
+            ri.recalculate_coordinates_this_timestep = 1
+            if sim.integrator == 'mercurius':  # switching radii scale with m
+                ri.recalculate_dcrit_this_timestep = 1
@@ -0,0 +1,270 @@
+"""
+Persistent warm worker: removes the per-job interpreter and library
+startup cost.
+
+A short job spends seconds before its first step on conda activation,
+importing numpy, rebound, reboundx and psutil, loading the MESA track and
+building interpolators. The daemon pays this once: it stays up with the
+libraries imported and the tracks and Interpolators built
+(scenarios.template), and watches a queue directory for scenario
+descriptions (JSON). Every job is forked from the daemon, so it starts
+from that pre-initialized state (copy-on-write) and only builds its own
+sim. Results go to done/<job>.json, and the a(t) file goes where
+the job asks for it in the drivers' format.
+
+The queue defaults to implementation/queue and can be moved with
+$REBX_QUEUE. Jobs are claimed by an atomic rename, so several daemons, e.g.
+one per node on a shared file system, can serve the same queue. A claimed
+job is named after its daemon (run/<job>@<host>.<pid>.json); a daemon
+starting on a host requeues the jobs of dead daemons of that host. A job
+that cannot be set up (unknown scenario, bad override, missing track) is
+failed with an error result instead of taking the daemon down.
+
+usage: python tools/warm.py serve [--nprocs N] [--preload SCENARIO ...]
+       python tools/warm.py run [scenario] [--a0 AU] [--tmax T]
+                                [--output FILE] [--wait]
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+QUEUE = os.environ.get('REBX_QUEUE',
+                       os.path.join(os.path.dirname(TOOLS), 'queue'))
+
+def queuedirs(queue=QUEUE):
+    """
+    Return the new/, run/ and done/ subdirectories of a queue, creating them.
+    """
+    dirs = [os.path.join(queue, sub) for sub in ('new', 'run', 'done')]
+    for d in dirs:
+        os.makedirs(d, exist_ok=True)
+    return dirs
+
+def submit(name, a0=None, output=None, queue=QUEUE, **overrides):
+    """
+    Queue a scenario point for the warm workers.
+
+    Parameters
+    ----------
+    name : str
+        Key of scenarios.SCENARIOS.
+    a0 : float
+        Initial semimajor axis of the first planet.
+    output : str
+        Write the semiaxis vs time here, like the drivers' <a0>au.txt.
+    **overrides
+        Any other scenario setting, e.g. tmax.
+
+    Returns
+    -------
+    str
+        Job id, the name of its result done/<id>.json.
+    """
+    new = queuedirs(queue)[0]
+    jobid = '%.6f-%s' % (time.time(), uuid.uuid4().hex[:8]) # FIFO by name
+    job = {'name': name, 'a0': a0, 'overrides': overrides,
+           'output': output and os.path.abspath(output),
+           'submitted': time.time()}
+    tmp = os.path.join(new, '.' + jobid)
+    with open(tmp, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp, os.path.join(new, jobid + '.json'))
+    return jobid
+
+def wait(jobid, queue=QUEUE, poll=0.1, timeout=None):
+    """
+    Block until job jobid has finished and return its result dict.
+    """
+    path = os.path.join(queue, 'done', jobid + '.json')
+    start = time.time()
+    while not os.path.exists(path):
+        if timeout is not None and time.time() - start > timeout:
+            raise TimeoutError('job %s not done after %g s' % (jobid, timeout))
+        time.sleep(poll)
+    with open(path) as f:
+        return json.load(f)
+
+def finish(done, jobid, res):
+    """
+    Write the result of a job atomically to done/<jobid>.json.
+    """
+    tmp = os.path.join(done, '.' + jobid)
+    with open(tmp, 'w') as f:
+        json.dump(res, f)
+    os.replace(tmp, os.path.join(done, jobid + '.json'))
+
+def requeue(queue=QUEUE, host=None):
+    """
+    Move the jobs claimed by dead daemons of this host back to new/.
+
+    Returns
+    -------
+    list of str
+        Ids of the requeued jobs.
+    """
+    new, run, done = queuedirs(queue)
+    host = host or socket.gethostname()
+    out = []
+    for fname in os.listdir(run):
+        if not fname.endswith('.json'):
+            continue
+        jobid, _, owner = fname[:-len('.json')].rpartition('@')
+        ohost, _, pid = owner.rpartition('.')
+        if ohost != host:
+            continue
+        try:
+            os.kill(int(pid), 0)
+            continue                    # its daemon is still serving it
+        except ProcessLookupError:
+            pass
+        except PermissionError:         # alive, another user's
+            continue
+        try:
+            os.replace(os.path.join(run, fname),
+                       os.path.join(new, jobid + '.json'))
+        except FileNotFoundError:       # requeued by another daemon
+            continue
+        out.append(jobid)
+    return out
+
+def runjob(job, tmpls):
+    """
+    Run one queued job in a forked child; return its result dict.
+    """
+    import scenarios as scn
+    started = time.time()
+    spec = scn.getspec(job['name'], a0=job['a0'], **job['overrides'])
+    if spec['input'] not in tmpls:
+        tmpls[spec['input']] = scn.template(spec, scn.gettrack(spec))
+    tmpl = tmpls[spec['input']]
+    res = scn.runpoint(spec, tmpl['track'], tmpl['interps'])
+    if job['output'] is not None:
+        os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+        with open(job['output'], 'w') as f: # will overwrite existing file
+            for t, a in zip(res['ts'], res['a']):
+                f.write('%.16E\t%.16E\n' % (t, a))
+    return {'engulfed': res['engulfed'], 'tstop': res['tstop'],
+            'walltime': res['walltime'], 'startup': started - job['submitted'],
+            'pid': os.getpid()}
+
+def serve(queue=QUEUE, nprocs=1, preload=(), poll=0.1):
+    """
+    Serve the queue until SIGTERM or SIGINT, running up to nprocs jobs at
+    once. Running jobs are finished before exiting.
+    """
+    import numpy, rebound, reboundx, psutil # the startup cost being saved
+    import scenarios as scn
+    new, run, done = queuedirs(queue)
+    owner = '@%s.%d' % (socket.gethostname(), os.getpid())
+    for jobid in requeue(queue):
+        print('requeued %s of a dead daemon' % jobid, flush=True)
+    tmpls = {}                          # track and Interpolators per track
+    for name in preload:
+        spec = scn.getspec(name)
+        tmpls[spec['input']] = scn.template(spec, scn.gettrack(spec))
+    stopping = []
+    def stop(signum, frame):
+        stopping.append(signum)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    children = {}
+    print('warm worker %d: serving %s with %d processes'
+          % (os.getpid(), queue, nprocs), flush=True)
+    while not stopping or children:
+        while children:                 # reap finished jobs
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            jobid = children.pop(pid)
+            if not os.path.exists(os.path.join(done, jobid + '.json')):
+                finish(done, jobid, {'error': 'exit status %d' % status})
+            os.remove(os.path.join(run, jobid + owner + '.json'))
+        jobs = [] if stopping else sorted(f for f in os.listdir(new)
+                                          if f.endswith('.json'))
+        for fname in jobs[:nprocs - len(children)]:
+            jobid = fname[:-len('.json')]
+            claimed = os.path.join(run, jobid + owner + '.json')
+            try:                        # claim, unless another daemon did
+                os.replace(os.path.join(new, fname), claimed)
+            except FileNotFoundError:
+                continue
+            try:                        # a bad job must not stop the daemon
+                with open(claimed) as f:
+                    job = json.load(f)
+                spec = scn.getspec(job['name'], **job['overrides'])
+                if spec['input'] not in tmpls: # build once, in the parent
+                    tmpls[spec['input']] = scn.template(spec,
+                                                        scn.gettrack(spec))
+            except Exception as error:
+                finish(done, jobid, {'error': repr(error)})
+                os.remove(claimed)
+                continue
+            pid = os.fork()
+            if pid == 0:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                try:
+                    res = runjob(job, tmpls)
+                except Exception as error:
+                    res = {'error': repr(error)}
+                finish(done, jobid, res)
+                os._exit(0)
+            children[pid] = jobid
+        time.sleep(poll)
+
+# command line interface
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Warm worker daemon for '
+                                     'short scenario runs (queue: %s).'
+                                     % QUEUE)
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('serve', help='run the daemon')
+    p.add_argument('--nprocs', type=int,
+                   default=int(os.environ.get('NCPUS', 1)),
+                   help='concurrent jobs')
+    p.add_argument('--preload', nargs='*', default=[], metavar='SCENARIO',
+                   help='load these scenarios\' tracks at startup')
+    p = sub.add_parser('run', help='queue a scenario point')
+    p.add_argument('name', nargs='?', default='survey', metavar='scenario')
+    p.add_argument('--a0', type=float, default=None)
+    p.add_argument('--tmax', type=float, default=None,
+                   help='integrate only to this sim time (yr)')
+    p.add_argument('--output', default=None,
+                   help='write the semiaxis vs time here')
+    p.add_argument('--wait', action='store_true',
+                   help='wait for the result and print it')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        sys.path.insert(0, TOOLS)
+        serve(QUEUE, args.nprocs, args.preload)
+        sys.exit(0)
+    overrides = {}
+    if args.tmax is not None:           # keep the update interval
+        sys.path.insert(0, TOOLS)
+        import scenarios as scn
+        spec = scn.getspec(args.name)
+        overrides['Nup'] = max(int(spec['Nup']*args.tmax/spec['tmax']), 2)
+        overrides['tmax'] = args.tmax
+    timer_start = time.perf_counter()
+    jobid = submit(args.name, args.a0, args.output, **overrides)
+    if not args.wait:
+        print(jobid)
+        sys.exit(0)
+    res = wait(jobid)
+    if 'error' in res:
+        sys.exit('job %s failed: %s' % (jobid, res['error']))
+    print('________________________________')
+    print('Warm run: %s, job %s\n' % (args.name, jobid))
+    print('    Outcome          : %s at t = %.4e yr'
+          % ('engulfed' if res['engulfed'] else 'survived', res['tstop']))
+    print('    Startup          : %.3f s' % res['startup'])
+    print('    Simulation       : %.2f s' % res['walltime'])
+    print('    Walltime Used    : %.2f s' % (time.perf_counter() - timer_start))
+    print('________________________________')